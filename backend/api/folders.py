@@ -1,7 +1,8 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from sqlalchemy import func, distinct
-from models import get_db, Photo, Folder
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, distinct, select
+from models import get_db, get_async_db, Photo, Folder
 import os
 from typing import Dict, List, Any
 import logging
@@ -73,14 +74,62 @@ def build_folder_tree(photos: List[Photo]) -> List[Dict[str, Any]]:
     
     return roots
 
+def build_tree_from_folders(folders: List[Folder]) -> List[Dict[str, Any]]:
+    """Build the folder tree from Folder rows and the totals the scanner keeps on them"""
+    photos_path = os.path.normpath(os.getenv("PHOTOS_PATH", "/photos"))
+    folder_data = {}
+    
+    for folder in folders:
+        # Folders without any photos below them are left out, as in build_folder_tree
+        if not folder.recursive_photo_count:
+            continue
+        # Node ids are absolute directory paths, matching Photo.filepath
+        path = photos_path if folder.path == '.' else os.path.join(photos_path, folder.path)
+        folder_data[folder.id] = {
+            'id': path,
+            'path': path,
+            'name': folder.name,
+            'type': 'directory',
+            'parent': folder.parent_id,
+            'children': [],
+            'photoCount': folder.photo_count or 0,
+            'recursivePhotoCount': folder.recursive_photo_count
+        }
+    
+    roots = []
+    for node in folder_data.values():
+        parent = folder_data.get(node['parent'])
+        node['parent'] = parent['id'] if parent else None
+        if parent:
+            parent['children'].append(node)
+        else:
+            roots.append(node)
+    
+    def sort_tree(node):
+        node['children'].sort(key=lambda x: x['name'].lower())
+        for child in node['children']:
+            sort_tree(child)
+    
+    for root in roots:
+        sort_tree(root)
+    
+    return roots
+
 @router.get("/tree")
-async def get_folder_tree(db: Session = Depends(get_db)):
+async def get_folder_tree(db: AsyncSession = Depends(get_async_db)):
     """Get the complete folder tree structure"""
     try:
+        folders = (await db.scalars(select(Folder))).all()
+        
+        # Totals are filled in by the scanner; until the first scan that
+        # computes them, fall back to deriving the tree from photo paths
+        if folders and all(folder.recursive_photo_count is not None for folder in folders):
+            return {"nodes": build_tree_from_folders(folders)}
+        
         # Get all photos with their file paths
-        photos = db.query(Photo).filter(
+        photos = (await db.scalars(select(Photo).where(
             Photo.is_deleted == False
-        ).all()
+        ))).all()
         
         if not photos:
             return {"nodes": []}
@@ -96,7 +145,7 @@ async def get_folder_tree(db: Session = Depends(get_db)):
 async def get_folder_photos(
     folder_path: str,
     recursive: bool = True,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get all photos in a specific folder (recursively by default)"""
     try:
@@ -106,16 +155,16 @@ async def get_folder_photos(
         
         if recursive:
             # Query photos in this folder and all subfolders
-            photos = db.query(Photo).filter(
+            photos = (await db.scalars(select(Photo).where(
                 Photo.is_deleted == False,
                 Photo.filepath.like(f"{folder_path}/%")
-            ).order_by(Photo.filepath).all()
+            ).order_by(Photo.filepath))).all()
         else:
             # Query photos in this specific folder only
-            photos = db.query(Photo).filter(
+            photos = (await db.scalars(select(Photo).where(
                 Photo.is_deleted == False,
                 func.substr(Photo.filepath, 1, func.length(Photo.filepath) - func.length(Photo.filename) - 1) == folder_path
-            ).all()
+            ))).all()
         
         return {
             "folder": folder_path,
@@ -128,10 +177,7 @@ async def get_folder_photos(
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/{folder_id}/children")
-async def get_folder_children(
-    folder_id: str,
-    db: Session = Depends(get_db)
-):
+async def get_folder_children(folder_id: str):
     """Get child folders for lazy loading"""
     try:
         # This would be used for lazy loading in the tree
@@ -142,6 +188,6 @@ async def get_folder_children(
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/scan")
-async def scan_directory(db: Session = Depends(get_db)):
+def scan_directory(db: Session = Depends(get_db)):
     # TODO: Implement directory scanning
     return {"message": "Scan initiated"}
\ No newline at end of file
@@ -1,7 +1,8 @@
 from fastapi import APIRouter, Depends, Query, HTTPException
 from sqlalchemy.orm import Session
-from sqlalchemy import desc
-from models import get_db, Job, JobStatus
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import desc, select
+from models import get_db, get_async_db, Job, JobStatus
 from typing import Optional
 from datetime import datetime, timedelta
 import logging
@@ -13,24 +14,24 @@ logger = logging.getLogger(__name__)
 async def list_jobs(
     status: Optional[str] = Query(None),
     include_completed: bool = Query(True),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    query = db.query(Job)
+    query = select(Job)
     
     if status:
-        query = query.filter(Job.status == JobStatus[status.upper()])
+        query = query.where(Job.status == JobStatus[status.upper()])
     elif not include_completed:
         # Only show active jobs
-        query = query.filter(Job.status.in_([JobStatus.PENDING, JobStatus.RUNNING]))
+        query = query.where(Job.status.in_([JobStatus.PENDING, JobStatus.RUNNING]))
     else:
         # Show active jobs and recently completed ones (last 24 hours)
         cutoff_time = datetime.utcnow() - timedelta(hours=24)
-        query = query.filter(
+        query = query.where(
             (Job.status.in_([JobStatus.PENDING, JobStatus.RUNNING])) |
             (Job.created_at >= cutoff_time)
         )
     
-    jobs = query.order_by(desc(Job.created_at)).limit(50).all()
+    jobs = (await db.scalars(query.order_by(desc(Job.created_at)).limit(50))).all()
     
     return [{
         "id": job.id,
@@ -47,8 +48,8 @@ async def list_jobs(
     } for job in jobs]
 
 @router.get("/{job_id}")
-async def get_job(job_id: int, db: Session = Depends(get_db)):
-    job = db.query(Job).filter(Job.id == job_id).first()
+async def get_job(job_id: int, db: AsyncSession = Depends(get_async_db)):
+    job = await db.get(Job, job_id)
     if not job:
         raise HTTPException(status_code=404, detail="Job not found")
     
@@ -66,7 +67,7 @@ async def get_job(job_id: int, db: Session = Depends(get_db)):
     }
 
 @router.post("/{job_id}/cancel")
-async def cancel_job(job_id: int, db: Session = Depends(get_db)):
+def cancel_job(job_id: int, db: Session = Depends(get_db)):
     """Cancel a running or pending job"""
     job = db.query(Job).filter(Job.id == job_id).first()
     
@@ -1,10 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException, Query, BackgroundTasks, Body
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func, text
 from typing import Optional, List
-from models import get_db, Photo
+from models import get_db, get_async_db, Photo
 from schemas.photo import PhotoResponse, PhotoList
 from services.photo_service import PhotoService
 from services.scanner import DirectoryScanner
+from services.thumbnail_formats import thumbnail_urls
 import logging
 
 logger = logging.getLogger(__name__)
@@ -16,18 +19,18 @@ async def list_photos(
     per_page: int = Query(100, ge=1, le=500),  # Increased default and max
     sort: str = Query("created_at", regex="^(created_at|date_taken|filename|size|rating)$"),
     order: str = Query("desc", regex="^(asc|desc)$"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     from sqlalchemy import desc as sql_desc, asc as sql_asc
     from models import Thumbnail
     
     # Only get photos that have at least one thumbnail
     # Use a subquery to avoid DISTINCT on JSON columns
-    subquery = db.query(Thumbnail.photo_id).filter(
+    subquery = select(Thumbnail.photo_id).where(
         Thumbnail.size == "400"
-    ).subquery()
+    )
     
-    query = db.query(Photo).filter(
+    query = select(Photo).where(
         Photo.is_deleted == False,
         Photo.id.in_(subquery)
     )
@@ -43,11 +46,11 @@ async def list_photos(
         query = query.order_by(nullslast(sql_asc(sort_column)), sql_asc(Photo.id))
     
     # Get total count
-    total = query.count()
+    total = await db.scalar(select(func.count()).select_from(query.order_by(None).subquery()))
     
     # Apply pagination
     offset = (page - 1) * per_page
-    photos = query.offset(offset).limit(per_page).all()
+    photos = (await db.scalars(query.offset(offset).limit(per_page))).all()
     
     # Convert to simple dict format to avoid ORM issues
     photo_list = []
@@ -67,11 +70,7 @@ async def list_photos(
             "is_favorite": photo.is_favorite,
             "rotation_version": photo.rotation_version or 0,
             "final_rotation": photo.final_rotation or 0,
-            "thumbnails": {
-                "150": f"/api/v1/thumbnails/{photo.id}/150",
-                "400": f"/api/v1/thumbnails/{photo.id}/400",
-                "1200": f"/api/v1/thumbnails/{photo.id}/1200"
-            }
+            "thumbnails": thumbnail_urls(photo.id, photo.rotation_version)
         }
         photo_list.append(photo_dict)
     
@@ -86,25 +85,25 @@ async def list_photos(
     }
 
 @router.get("/count")
-async def get_photo_count(db: Session = Depends(get_db)):
+async def get_photo_count(db: AsyncSession = Depends(get_async_db)):
     """Get count of photos with thumbnails"""
     from models import Thumbnail
     
     # Count photos that have thumbnails
-    subquery = db.query(Thumbnail.photo_id).filter(
+    subquery = select(Thumbnail.photo_id).where(
         Thumbnail.size == "400"
-    ).distinct().subquery()
+    ).distinct()
     
-    count = db.query(Photo).filter(
+    count = await db.scalar(select(func.count(Photo.id)).where(
         Photo.is_deleted == False,
         Photo.id.in_(subquery)
-    ).count()
+    ))
     
     # Also get the latest photo's created_at for reference
-    latest_photo = db.query(Photo).filter(
+    latest_photo = await db.scalar(select(Photo).where(
         Photo.is_deleted == False,
         Photo.id.in_(subquery)
-    ).order_by(Photo.created_at.desc()).first()
+    ).order_by(Photo.created_at.desc()).limit(1))
     
     return {
         "count": count,
@@ -115,18 +114,18 @@ async def get_photo_count(db: Session = Depends(get_db)):
 async def get_recent_photos(
     since: Optional[str] = Query(None, description="ISO timestamp to get photos created after"),
     limit: int = Query(50, ge=1, le=200),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get photos added since a specific timestamp"""
     from datetime import datetime
     from models import Thumbnail
     
     # Only get photos that have thumbnails
-    subquery = db.query(Thumbnail.photo_id).filter(
+    subquery = select(Thumbnail.photo_id).where(
         Thumbnail.size == "400"
-    ).subquery()
+    )
     
-    query = db.query(Photo).filter(
+    query = select(Photo).where(
         Photo.is_deleted == False,
         Photo.id.in_(subquery)
     )
@@ -135,12 +134,12 @@ async def get_recent_photos(
     if since:
         try:
             since_dt = datetime.fromisoformat(since.replace('Z', '+00:00'))
-            query = query.filter(Photo.created_at > since_dt)
+            query = query.where(Photo.created_at > since_dt)
         except ValueError:
             raise HTTPException(status_code=400, detail="Invalid timestamp format")
     
     # Order by created_at desc to get newest first
-    photos = query.order_by(Photo.created_at.desc()).limit(limit).all()
+    photos = (await db.scalars(query.order_by(Photo.created_at.desc()).limit(limit))).all()
     
     # Convert to response format
     photo_list = []
@@ -160,11 +159,7 @@ async def get_recent_photos(
             "rotation_version": photo.rotation_version or 0,
             "final_rotation": photo.final_rotation or 0,
             "created_at": photo.created_at.isoformat() if photo.created_at else None,
-            "thumbnails": {
-                "150": f"/api/v1/thumbnails/{photo.id}/150",
-                "400": f"/api/v1/thumbnails/{photo.id}/400",
-                "1200": f"/api/v1/thumbnails/{photo.id}/1200"
-            }
+            "thumbnails": thumbnail_urls(photo.id, photo.rotation_version)
         }
         photo_list.append(photo_dict)
     
@@ -174,48 +169,48 @@ async def get_recent_photos(
     }
 
 @router.get("/years")
-async def get_photo_years(db: Session = Depends(get_db)):
+async def get_photo_years(db: AsyncSession = Depends(get_async_db)):
     """Get list of years with photo counts and preview photos"""
     from sqlalchemy import extract, func, desc as sql_desc, and_
     from models import Thumbnail
     
     # Get photos with thumbnails
-    subquery = db.query(Thumbnail.photo_id).filter(
+    subquery = select(Thumbnail.photo_id).where(
         Thumbnail.size == "400"
-    ).subquery()
+    )
     
     # Query for years
-    results = db.query(
+    results = (await db.execute(select(
         extract('year', func.coalesce(Photo.date_taken, Photo.created_at)).label('year'),
         func.count(Photo.id).label('count')
-    ).filter(
+    ).where(
         Photo.is_deleted == False,
         Photo.id.in_(subquery)
     ).group_by(
         extract('year', func.coalesce(Photo.date_taken, Photo.created_at))
     ).order_by(
         sql_desc('year')
-    ).all()
+    ))).all()
     
     years_data = []
     for r in results:
         year = int(r.year)
         
         # Get a favorite photo for this year, or the first photo if no favorites
-        preview_photo = db.query(Photo).filter(
+        preview_photo = await db.scalar(select(Photo).where(
             Photo.is_deleted == False,
             Photo.id.in_(subquery),
             extract('year', func.coalesce(Photo.date_taken, Photo.created_at)) == year,
             Photo.is_favorite == True
-        ).first()
+        ).limit(1))
         
         if not preview_photo:
             # If no favorite, get the first photo of the year
-            preview_photo = db.query(Photo).filter(
+            preview_photo = await db.scalar(select(Photo).where(
                 Photo.is_deleted == False,
                 Photo.id.in_(subquery),
                 extract('year', func.coalesce(Photo.date_taken, Photo.created_at)) == year
-            ).order_by(func.coalesce(Photo.date_taken, Photo.created_at).desc()).first()
+            ).order_by(func.coalesce(Photo.date_taken, Photo.created_at).desc()).limit(1))
         
         years_data.append({
             "year": year,
@@ -228,7 +223,7 @@ async def get_photo_years(db: Session = Depends(get_db)):
 @router.get("/year/{year}")
 async def get_photos_by_year(
     year: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get all photos for a specific year"""
     from sqlalchemy import extract, func
@@ -236,17 +231,17 @@ async def get_photos_by_year(
     from datetime import datetime
     
     # Get photos with thumbnails for the year
-    subquery = db.query(Thumbnail.photo_id).filter(
+    subquery = select(Thumbnail.photo_id).where(
         Thumbnail.size == "400"
-    ).subquery()
+    )
     
-    photos = db.query(Photo).filter(
+    photos = (await db.scalars(select(Photo).where(
         Photo.is_deleted == False,
         Photo.id.in_(subquery),
         extract('year', func.coalesce(Photo.date_taken, Photo.created_at)) == year
     ).order_by(
         func.coalesce(Photo.date_taken, Photo.created_at)
-    ).all()
+    ))).all()
     
     return {
         "year": year,
@@ -258,7 +253,7 @@ async def get_photos_by_year(
 async def get_photos_by_month(
     year: int,
     month: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get photos for a specific year and month"""
     from sqlalchemy import extract, func
@@ -268,18 +263,18 @@ async def get_photos_by_month(
         raise HTTPException(status_code=400, detail="Month must be between 1 and 12")
     
     # Get photos with thumbnails for the year/month
-    subquery = db.query(Thumbnail.photo_id).filter(
+    subquery = select(Thumbnail.photo_id).where(
         Thumbnail.size == "400"
-    ).subquery()
+    )
     
-    photos = db.query(Photo).filter(
+    photos = (await db.scalars(select(Photo).where(
         Photo.is_deleted == False,
         Photo.id.in_(subquery),
         extract('year', func.coalesce(Photo.date_taken, Photo.created_at)) == year,
         extract('month', func.coalesce(Photo.date_taken, Photo.created_at)) == month
     ).order_by(
         func.coalesce(Photo.date_taken, Photo.created_at)
-    ).all()
+    ))).all()
     
     return {
         "year": year,
@@ -289,9 +284,9 @@ async def get_photos_by_month(
     }
 
 @router.get("/{photo_id}")
-async def get_photo(photo_id: int, db: Session = Depends(get_db)):
+async def get_photo(photo_id: int, db: AsyncSession = Depends(get_async_db)):
     """Get a single photo by ID"""
-    photo = db.query(Photo).filter(Photo.id == photo_id).first()
+    photo = await db.get(Photo, photo_id)
     if not photo:
         raise HTTPException(status_code=404, detail="Photo not found")
     
@@ -310,15 +305,11 @@ async def get_photo(photo_id: int, db: Session = Depends(get_db)):
         "is_favorite": photo.is_favorite,
         "rotation_version": photo.rotation_version or 0,
         "final_rotation": photo.final_rotation or 0,
-        "thumbnails": {
-            "150": f"/api/v1/thumbnails/{photo.id}/150",
-            "400": f"/api/v1/thumbnails/{photo.id}/400",
-            "1200": f"/api/v1/thumbnails/{photo.id}/1200"
-        }
+        "thumbnails": thumbnail_urls(photo.id, photo.rotation_version)
     }
 
 @router.patch("/{photo_id}/favorite")
-async def toggle_favorite(photo_id: int, db: Session = Depends(get_db)):
+def toggle_favorite(photo_id: int, db: Session = Depends(get_db)):
     """Toggle favorite status for a photo"""
     photo = db.query(Photo).filter(Photo.id == photo_id).first()
     if not photo:
@@ -334,7 +325,7 @@ async def toggle_favorite(photo_id: int, db: Session = Depends(get_db)):
     }
 
 @router.post("/import")
-async def import_photos(
+def import_photos(
     background_tasks: BackgroundTasks,
     request: dict = Body({"scan_type": "incremental"}),
     db: Session = Depends(get_db)
@@ -351,19 +342,19 @@ async def import_photos(
     }
 
 @router.get("/duplicates")
-async def find_duplicates(db: Session = Depends(get_db)):
+async def find_duplicates(db: AsyncSession = Depends(get_async_db)):
     # Find photos with duplicate hashes
-    duplicates = db.execute("""
+    duplicates = (await db.execute(text("""
         SELECT file_hash, COUNT(*) as count, array_agg(id) as photo_ids
         FROM photos
         WHERE is_deleted = false
         GROUP BY file_hash
         HAVING COUNT(*) > 1
-    """).fetchall()
+    """))).fetchall()
     
     result = []
     for dup in duplicates:
-        photos = db.query(Photo).filter(Photo.id.in_(dup.photo_ids)).all()
+        photos = (await db.scalars(select(Photo).where(Photo.id.in_(dup.photo_ids)))).all()
         result.append({
             "hash": dup.file_hash,
             "count": dup.count,
@@ -378,7 +369,7 @@ class RotationUpdate(BaseModel):
     rotation: int
 
 @router.patch("/{photo_id}/rotation")
-async def update_photo_rotation(
+def update_photo_rotation(
     photo_id: int,
     rotation_data: RotationUpdate,
     db: Session = Depends(get_db)
@@ -1,6 +1,8 @@
 from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from models import get_db, Photo, Job, JobStatus
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func
+from models import get_async_db, Photo, Job, JobStatus
+from services.full_image_cache import full_image_cache
 import os
 import shutil
 
@@ -18,18 +20,17 @@ async def health_check():
     }
 
 @router.get("/stats")
-async def get_stats(db: Session = Depends(get_db)):
-    total_photos = db.query(Photo).count()
-    total_size = db.query(Photo).with_entities(Photo.file_size).all()
-    total_size_bytes = sum(size[0] for size in total_size) if total_size else 0
+async def get_stats(db: AsyncSession = Depends(get_async_db)):
+    total_photos = await db.scalar(select(func.count(Photo.id)))
+    total_size_bytes = await db.scalar(select(func.coalesce(func.sum(Photo.file_size), 0)))
     
     # Get disk usage
     stat = shutil.disk_usage("/")
     
     # Count active jobs (PENDING or RUNNING)
-    active_jobs = db.query(Job).filter(
+    active_jobs = await db.scalar(select(func.count(Job.id)).where(
         Job.status.in_([JobStatus.PENDING, JobStatus.RUNNING])
-    ).count()
+    ))
     
     return {
         "total_photos": total_photos,
@@ -40,5 +41,6 @@ async def get_stats(db: Session = Depends(get_db)):
             "percentage": (stat.used / stat.total) * 100
         },
         "active_jobs": active_jobs,
+        "full_image_cache": full_image_cache.stats(),
         "version": "0.1.0"
     }
\ No newline at end of file
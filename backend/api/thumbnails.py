@@ -1,9 +1,23 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Header
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import FileResponse, Response
 from sqlalchemy.orm import Session
-from models import get_db, Thumbnail, Photo
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from typing import Dict, List, Optional, Tuple
+from email.utils import parsedate_to_datetime
+from functools import lru_cache
+from models import get_db, get_async_db, Thumbnail, Photo
+from models.database import SessionLocal
+from services.thumbnail_formats import FORMATS, negotiate_formats, thumbnail_filename
+from services.image_loader import open_raw
+from services.image_executor import run_image_work
+from services.full_image_cache import full_image_cache
 import os
 import io
+import json
+import struct
+import hashlib
 from PIL import Image, ImageOps
 import pillow_heif
 
@@ -12,20 +26,232 @@ pillow_heif.register_heif_opener()
 
 router = APIRouter()
 
+# Most thumbnails one batch request may ask for (a full grid page)
+THUMBNAIL_BATCH_MAX = 500
+
+RAW_EXTENSIONS = ['.nef', '.cr2', '.cr3', '.arw', '.dng', '.raf', '.orf']
+
+def _etag(*parts) -> str:
+    """Strong ETag from cheap, stable inputs (ids, versions, mtimes), never from file contents"""
+    return '"' + '-'.join(str(part) for part in parts) + '"'
+
+def _not_modified(etag: str, mtime: Optional[float], if_none_match: Optional[str],
+                  if_modified_since: Optional[str], headers: dict) -> Optional[Response]:
+    """
+    A 304 if the client's cached copy is current, else None. If-None-Match
+    takes precedence; If-Modified-Since is only used without it, and only
+    when the response is the file at mtime (pass None otherwise).
+    """
+    if if_none_match is not None:
+        tags = [tag.strip() for tag in if_none_match.split(',')]
+        # Weak comparison: a W/ prefix added by a proxy still matches
+        matched = '*' in tags or etag in (tag[2:] if tag.startswith('W/') else tag for tag in tags)
+    elif if_modified_since is not None and mtime is not None:
+        try:
+            matched = int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            matched = False
+    else:
+        matched = False
+    if not matched:
+        return None
+    return Response(status_code=304, headers=headers)
+
+def _find_thumbnail(thumbnails_path: str, photo_id: int, size: str, rotation_version: int, formats):
+    """(filepath, format, stat) of the first generated variant in formats, or None"""
+    for fmt in formats:
+        filepath = os.path.join(thumbnails_path, thumbnail_filename(photo_id, size, rotation_version, fmt))
+        try:
+            return filepath, fmt, os.stat(filepath)
+        except OSError:
+            continue
+    return None
+
+# Blocking work below runs off the event loop: image decode/encode on the
+# bounded image executor, plain file I/O in the default threadpool.
+
+def _render_full_image(full_path: str, file_ext: str, file_hash: Optional[str], user_rotation: Optional[int],
+                       pil_format: str, **save_options) -> bytes:
+    """Decode, orient and re-encode a full-size image for the browser"""
+    if file_ext in RAW_EXTENSIONS:
+        # The embedded JPEG if there is one, else the cached intermediate,
+        # demosaicing at full size only the first time
+        img = open_raw(full_path, file_hash, half_size=False)
+    else:
+        # HEIC/HEIF (pillow-heif is registered), TIFF and browser formats
+        img = Image.open(full_path)
+    
+    with img:
+        # Apply EXIF orientation if present
+        try:
+            img = ImageOps.exif_transpose(img) or img
+        except Exception:
+            pass
+        
+        # Apply user rotation if present
+        if user_rotation:
+            img = img.rotate(-user_rotation, expand=True)
+        
+        # Convert to RGB if necessary
+        if img.mode in ('RGBA', 'LA'):
+            background = Image.new('RGB', img.size, (255, 255, 255))
+            background.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
+            img = background
+        elif img.mode not in ('RGB', 'L'):
+            img = img.convert('RGB')
+        
+        buffer = io.BytesIO()
+        img.save(buffer, pil_format, **save_options)
+        return buffer.getvalue()
+
+def _generate_thumbnail(photo_id: int, size: str):
+    """On-demand generation, with a sync session of its own in the executor worker"""
+    from services.thumbnail_service import ThumbnailService
+    
+    db = SessionLocal()
+    try:
+        return ThumbnailService(db).generate_single_thumbnail(photo_id, size)
+    finally:
+        db.close()
+
+@lru_cache(maxsize=None)
+def _placeholder(dimension: int) -> bytes:
+    """A plain gray JPEG, encoded once per size"""
+    placeholder = Image.new('RGB', (dimension, dimension), color=(60, 60, 60))
+    buffer = io.BytesIO()
+    placeholder.save(buffer, 'JPEG', quality=85)
+    return buffer.getvalue()
+
+def _find_thumbnails(thumbnails_path: str, photo_ids: List[int], size: str, rotation_versions: Dict[int, int],
+                     formats) -> Tuple[list, List[int]]:
+    """_find_thumbnail for each of a batch's ids: ([(photo_id, variant)], missing ids)"""
+    found = []
+    missing = []
+    for photo_id in photo_ids:
+        variant = _find_thumbnail(thumbnails_path, photo_id, size, rotation_versions[photo_id], formats) \
+            if photo_id in rotation_versions else None
+        if variant:
+            found.append((photo_id, variant))
+        else:
+            missing.append(photo_id)
+    return found, missing
+
+def _read_files(found) -> Tuple[List[Tuple[int, str, bytes]], List[int]]:
+    """Contents of the batch's thumbnails: ([(photo_id, format, data)], unreadable ids)"""
+    contents = []
+    unreadable = []
+    for photo_id, (filepath, fmt, _) in found:
+        try:
+            with open(filepath, 'rb') as f:
+                contents.append((photo_id, fmt, f.read()))
+        except OSError:
+            unreadable.append(photo_id)
+    return contents, unreadable
+
+@router.get("/batch/{size}")
+async def get_thumbnail_batch(
+    size: str,
+    ids: str,  # Comma-separated photo ids, e.g. one grid page
+    v: Optional[str] = None,  # Comma-separated rotation versions matching ids
+    accept: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Many thumbnails in one response, so a grid's first paint is one request per
+    page rather than one per tile. The body is length-prefixed: a 4-byte
+    big-endian index length, a JSON index
+        {"size": "400", "items": [{"id", "v", "type", "offset", "length"}], "missing": [ids]}
+    and then the images back to back, offsets counting from the end of the
+    index. Missing thumbnails (not generated yet) are left for per-tile URLs.
+    
+    With versions from a list payload the database isn't touched, and a
+    complete batch is immutable like the versioned per-tile URLs.
+    """
+    if size not in ["150", "400", "1200"]:
+        raise HTTPException(status_code=400, detail="Invalid thumbnail size")
+    try:
+        photo_ids = [int(photo_id) for photo_id in ids.split(',') if photo_id]
+        versions = [int(version) for version in v.split(',')] if v else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids and v must be comma-separated integers")
+    if not photo_ids or len(photo_ids) > THUMBNAIL_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"Between 1 and {THUMBNAIL_BATCH_MAX} ids are required")
+    
+    client_versions = versions is not None and len(versions) == len(photo_ids)
+    if client_versions:
+        rotation_versions = dict(zip(photo_ids, versions))
+    else:
+        # One query for the whole page instead of one per tile
+        rotation_versions = {
+            photo_id: rotation_version or 0
+            for photo_id, rotation_version in await db.execute(
+                select(Photo.id, Photo.rotation_version).where(Photo.id.in_(photo_ids))
+            )
+        }
+    
+    formats = negotiate_formats(accept)
+    thumbnails_path = os.getenv("THUMBNAILS_PATH", "/app/thumbnails")
+    # Up to a stat per format for each of hundreds of ids, so off the event loop
+    found, missing = await run_in_threadpool(
+        _find_thumbnails, thumbnails_path, photo_ids, size, rotation_versions, formats
+    )
+    
+    # ETag from the same cheap inputs as the per-tile ETags, never the image bytes
+    keys = [f"{photo_id}-{rotation_versions[photo_id]}-{fmt}-{stat.st_mtime_ns:x}" for photo_id, (_, fmt, stat) in found]
+    digest = hashlib.md5('|'.join(keys + [f"missing-{photo_id}" for photo_id in missing]).encode()).hexdigest()
+    etag = _etag('batch', size, digest)
+    
+    is_development = os.getenv("NODE_ENV") == "development" or os.getenv("ENVIRONMENT") == "development"
+    if is_development or missing or not client_versions:
+        # Missing thumbnails will appear, and unversioned requests can change
+        cache_control = "no-cache, must-revalidate"
+    else:
+        cache_control = "public, max-age=31536000, immutable"
+    headers = {"Cache-Control": cache_control, "ETag": etag, "Vary": "Accept"}
+    
+    not_modified = _not_modified(etag, None, if_none_match, None, headers)
+    if not_modified:
+        return not_modified
+    
+    contents, unreadable = await run_in_threadpool(_read_files, found)
+    missing.extend(unreadable)
+    items = []
+    chunks = []
+    offset = 0
+    for photo_id, fmt, data in contents:
+        items.append({
+            'id': photo_id,
+            'v': rotation_versions[photo_id],
+            'type': FORMATS[fmt]['media_type'],
+            'offset': offset,
+            'length': len(data)
+        })
+        chunks.append(data)
+        offset += len(data)
+    
+    index = json.dumps({'size': size, 'items': items, 'missing': missing}).encode()
+    content = b''.join([struct.pack('>I', len(index)), index] + chunks)
+    return Response(content=content, media_type="application/vnd.bokeh.thumbnail-batch", headers=headers)
+
 @router.get("/{photo_id}/full")
 async def get_full_image(
     photo_id: int,
-    db: Session = Depends(get_db)
+    if_none_match: Optional[str] = Header(None),
+    if_modified_since: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get the full-size image, converting if necessary for browser display"""
-    photo = db.query(Photo).filter(Photo.id == photo_id).first()
+    photo = await db.get(Photo, photo_id)
     if not photo:
         raise HTTPException(status_code=404, detail="Photo not found")
     
     # Construct full path - filepath already contains /photos prefix
     full_path = photo.filepath if photo.filepath.startswith('/') else os.path.join("/photos", photo.filepath)
     
-    if not os.path.exists(full_path):
+    try:
+        source_stat = await run_in_threadpool(os.stat, full_path)
+    except OSError:
         raise HTTPException(status_code=404, detail="Photo file not found")
     
     # Check if file needs conversion for browser display
@@ -35,141 +261,86 @@ async def get_full_image(
     logger = logging.getLogger(__name__)
     logger.info(f"Full image request for photo {photo_id}, ext: {file_ext}, path: {full_path}")
     
+    # Converted images are cached on disk, keyed by rotation version and source mtime.
+    # The same inputs make the ETag, so revalidation needs no image work at all.
+    rotation_version = photo.rotation_version or 0
+    mtime_ns = source_stat.st_mtime_ns
+    conversion_etag = _etag(photo_id, 'full', f"v{rotation_version}", f"{mtime_ns:x}")
+    
     # For HEIC/HEIF, TIF/TIFF files and other formats that browsers can't display, convert to JPEG
-    if file_ext in ['.heic', '.heif', '.tif', '.tiff', '.nef', '.cr2', '.cr3', '.arw', '.dng', '.raf', '.orf']:
+    if file_ext in ['.heic', '.heif', '.tif', '.tiff'] + RAW_EXTENSIONS:
+        is_development = os.getenv("NODE_ENV") == "development" or os.getenv("ENVIRONMENT") == "development"
+        if is_development:
+            headers = {
+                "Cache-Control": "no-cache, no-store, must-revalidate",
+                "Pragma": "no-cache",
+                "Expires": "0",
+                "ETag": conversion_etag
+            }
+        else:
+            headers = {
+                "Cache-Control": "public, max-age=86400, must-revalidate",
+                "ETag": conversion_etag
+            }
+        
+        # Rotations change the image but not the source mtime, so only the ETag decides
+        not_modified = _not_modified(conversion_etag, None, if_none_match, if_modified_since, headers)
+        if not_modified:
+            return not_modified
+        
+        cached = await run_in_threadpool(full_image_cache.get, photo_id, rotation_version, mtime_ns, 'jpg')
+        if cached:
+            return FileResponse(cached, media_type="image/jpeg", headers=headers)
+        
         logger.info(f"Converting {file_ext} to JPEG for browser display")
         try:
-            # Handle HEIC/HEIF files (pillow-heif should already be registered)
-            if file_ext in ['.heic', '.heif']:
-                # pillow-heif registers automatically, so PIL can open these
-                logger.info(f"Opening HEIC/HEIF file with PIL")
-                img = Image.open(full_path)
-            # Try to handle RAW files with rawpy if available
-            elif file_ext in ['.nef', '.cr2', '.cr3', '.arw', '.dng', '.raf', '.orf']:
-                try:
-                    import rawpy
-                    # io is already imported at top of file
-                    with rawpy.imread(full_path) as raw:
-                        # Try to extract the embedded JPEG thumbnail first (much faster and consistent)
-                        try:
-                            thumb = raw.extract_thumb()
-                            if thumb.format == rawpy.ThumbFormat.JPEG:
-                                # Use the embedded JPEG thumbnail
-                                img = Image.open(io.BytesIO(thumb.data))
-                            else:
-                                # No JPEG thumbnail, process the RAW data
-                                rgb = raw.postprocess(use_camera_wb=True, half_size=False)
-                                img = Image.fromarray(rgb)
-                        except Exception:
-                            # Fallback to full RAW processing
-                            rgb = raw.postprocess(use_camera_wb=True, half_size=False)
-                            img = Image.fromarray(rgb)
-                except (ImportError, Exception):
-                    # Fall back to regular PIL if rawpy fails
-                    img = Image.open(full_path)
-            else:
-                # Open TIF/TIFF and other image files
-                img = Image.open(full_path)
-            
-            with img:
-                # Apply EXIF orientation if present
-                try:
-                    img = ImageOps.exif_transpose(img) or img
-                except Exception:
-                    pass
-                
-                # Apply user rotation if present
-                if photo.user_rotation and photo.user_rotation != 0:
-                    img = img.rotate(-photo.user_rotation, expand=True)
-                
-                # Convert to RGB if necessary
-                if img.mode in ('RGBA', 'LA'):
-                    background = Image.new('RGB', img.size, (255, 255, 255))
-                    background.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
-                    img = background
-                elif img.mode not in ('RGB', 'L'):
-                    img = img.convert('RGB')
-                
-                # Save to bytes buffer
-                buffer = io.BytesIO()
-                img.save(buffer, 'JPEG', quality=95, optimize=True, progressive=True)
-                buffer.seek(0)
-                
-                # Add proper cache headers
-                import hashlib
-                content = buffer.getvalue()
-                etag = hashlib.md5(content).hexdigest()
-                
-                return Response(
-                    content=content,
-                    media_type="image/jpeg",
-                    headers={
-                        "Cache-Control": "no-cache, no-store, must-revalidate" if (os.getenv("NODE_ENV") == "development" or os.getenv("ENVIRONMENT") == "development") else "public, max-age=86400, must-revalidate",
-                        "Pragma": "no-cache" if (os.getenv("NODE_ENV") == "development" or os.getenv("ENVIRONMENT") == "development") else None,
-                        "Expires": "0" if (os.getenv("NODE_ENV") == "development" or os.getenv("ENVIRONMENT") == "development") else None,
-                        "ETag": f'"{etag}"'
-                    } | {k: v for k, v in {"Pragma": "no-cache" if (os.getenv("NODE_ENV") == "development" or os.getenv("ENVIRONMENT") == "development") else None}.items() if v is not None}
-                )
+            content = await run_image_work(
+                _render_full_image, full_path, file_ext, photo.file_hash, photo.user_rotation,
+                'JPEG', quality=95, optimize=True, progressive=True
+            )
+            await run_in_threadpool(full_image_cache.put, photo_id, rotation_version, mtime_ns, 'jpg', content)
+            return Response(content=content, media_type="image/jpeg", headers=headers)
         except Exception as e:
             # If conversion fails, try to return the original
             logger.error(f"Failed to convert {file_ext} file: {str(e)}")
             # Add proper cache headers
-            import hashlib
-            stat = os.stat(full_path)
-            etag_source = f"{full_path}-{stat.st_size}-{stat.st_mtime}"
-            etag = hashlib.md5(etag_source.encode()).hexdigest()
+            etag = _etag(photo_id, 'original', f"{source_stat.st_mtime_ns:x}", f"{source_stat.st_size:x}")
             
             return FileResponse(
                 full_path,
                 media_type=photo.mime_type or "image/jpeg",
                 headers={
                     "Cache-Control": "no-cache, no-store, must-revalidate" if (os.getenv("NODE_ENV") == "development" or os.getenv("ENVIRONMENT") == "development") else "public, max-age=86400, must-revalidate",
-                    "ETag": f'"{etag}"'
+                    "ETag": etag
                 }
             )
     else:
         # For supported formats, check if user rotation is applied
         if photo.user_rotation and photo.user_rotation != 0:
+            # Keep original format if possible
+            format = 'JPEG' if file_ext in ['.jpg', '.jpeg'] else 'PNG'
+            extension = 'jpg' if format == 'JPEG' else 'png'
+            headers = {
+                "Cache-Control": "public, max-age=86400, must-revalidate",  # 1 day cache
+                "ETag": conversion_etag
+            }
+            
+            not_modified = _not_modified(conversion_etag, None, if_none_match, if_modified_since, headers)
+            if not_modified:
+                return not_modified
+            
+            cached = await run_in_threadpool(full_image_cache.get, photo_id, rotation_version, mtime_ns, extension)
+            if cached:
+                return FileResponse(cached, media_type=photo.mime_type or "image/jpeg", headers=headers)
+            
             # Need to apply rotation even for supported formats
             try:
-                with Image.open(full_path) as img:
-                    # Apply EXIF orientation if present
-                    try:
-                        img = ImageOps.exif_transpose(img) or img
-                    except Exception:
-                        pass
-                    
-                    # Apply user rotation
-                    img = img.rotate(-photo.user_rotation, expand=True)
-                    
-                    # Convert to RGB if necessary
-                    if img.mode in ('RGBA', 'LA'):
-                        background = Image.new('RGB', img.size, (255, 255, 255))
-                        background.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
-                        img = background
-                    elif img.mode not in ('RGB', 'L'):
-                        img = img.convert('RGB')
-                    
-                    # Save to bytes buffer
-                    buffer = io.BytesIO()
-                    # Keep original format if possible
-                    format = 'JPEG' if file_ext in ['.jpg', '.jpeg'] else 'PNG'
-                    img.save(buffer, format, quality=95, optimize=True)
-                    buffer.seek(0)
-                    
-                    # Add proper cache headers
-                    import hashlib
-                    content = buffer.getvalue()
-                    etag = hashlib.md5(content).hexdigest()
-                    
-                    return Response(
-                        content=content,
-                        media_type=photo.mime_type or "image/jpeg",
-                        headers={
-                            "Cache-Control": "public, max-age=86400, must-revalidate",  # 1 day cache
-                            "ETag": f'"{etag}"'
-                        }
-                    )
+                content = await run_image_work(
+                    _render_full_image, full_path, file_ext, photo.file_hash, photo.user_rotation,
+                    format, quality=95, optimize=True
+                )
+                await run_in_threadpool(full_image_cache.put, photo_id, rotation_version, mtime_ns, extension, content)
+                return Response(content=content, media_type=photo.mime_type or "image/jpeg", headers=headers)
             except Exception:
                 # If processing fails, return original
                 return FileResponse(
@@ -179,60 +350,79 @@ async def get_full_image(
         else:
             # No rotation needed, return original file
             # Add proper cache headers
-            import hashlib
-            stat = os.stat(full_path)
-            etag_source = f"{full_path}-{stat.st_size}-{stat.st_mtime}"
-            etag = hashlib.md5(etag_source.encode()).hexdigest()
+            etag = _etag(photo_id, 'original', f"{source_stat.st_mtime_ns:x}", f"{source_stat.st_size:x}")
+            headers = {
+                "Cache-Control": "no-cache, no-store, must-revalidate" if (os.getenv("NODE_ENV") == "development" or os.getenv("ENVIRONMENT") == "development") else "public, max-age=86400, must-revalidate",
+                "ETag": etag
+            }
             
-            return FileResponse(
-                full_path,
-                media_type=photo.mime_type or "image/jpeg",
-                headers={
-                    "Cache-Control": "no-cache, no-store, must-revalidate" if (os.getenv("NODE_ENV") == "development" or os.getenv("ENVIRONMENT") == "development") else "public, max-age=86400, must-revalidate",
-                    "ETag": f'"{etag}"'
-                }
-            )
+            not_modified = _not_modified(etag, source_stat.st_mtime, if_none_match, if_modified_since, headers)
+            if not_modified:
+                return not_modified
+            
+            return FileResponse(full_path, media_type=photo.mime_type or "image/jpeg", headers=headers)
 
 @router.get("/{photo_id}/{size}")
 async def get_thumbnail(
     photo_id: int,
     size: str,
-    format: str = "webp",
+    format: Optional[str] = None,  # Preferred format; otherwise chosen from Accept
     v: str = None,  # Version parameter for cache busting
-    db: Session = Depends(get_db)
+    accept: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
+    if_modified_since: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db)
 ):
     import os
-    import hashlib
+    
+    # Best format this client accepts, falling back to JPEG, which always exists.
+    # Every response varies on Accept so caches keep one copy per format.
+    formats = negotiate_formats(accept, format)
     
     # Validate size
     if size not in ["150", "400", "1200"]:
         raise HTTPException(status_code=400, detail="Invalid thumbnail size")
     
+    thumbnails_path = os.getenv("THUMBNAILS_PATH", "/app/thumbnails")
+    is_development = os.getenv("NODE_ENV") == "development" or os.getenv("ENVIRONMENT") == "development"
+    
+    # Fast path: a versioned URL from a list payload names the file directly, so
+    # no database lookup. The file for a version never changes orientation (a
+    # rotation bumps the version), so it can be cached as immutable.
+    if v is not None and v.isdigit():
+        found = await run_in_threadpool(_find_thumbnail, thumbnails_path, photo_id, size, int(v), formats)
+        if found:
+            filepath, fmt, stat = found
+            etag = _etag(photo_id, size, f"v{int(v)}", fmt, f"{stat.st_mtime_ns:x}")
+            headers = {
+                "Cache-Control": "no-cache, must-revalidate" if is_development else "public, max-age=31536000, immutable",
+                "ETag": etag,
+                "Vary": "Accept"
+            }
+            not_modified = _not_modified(etag, stat.st_mtime, if_none_match, if_modified_since, headers)
+            if not_modified:
+                return not_modified
+            return FileResponse(filepath, media_type=FORMATS[fmt]['media_type'], headers=headers, stat_result=stat)
+    
+    # Miss (not generated yet, or an unversioned URL): look up the current version
     # Get photo to check rotation version
-    photo = db.query(Photo).filter(Photo.id == photo_id).first()
+    photo = await db.get(Photo, photo_id)
     if not photo:
         raise HTTPException(status_code=404, detail="Photo not found")
     
-    # Build versioned filename
+    # Build versioned filename for the best variant that has been generated
     rotation_version = photo.rotation_version or 0
-    thumbnails_path = os.getenv("THUMBNAILS_PATH", "/app/thumbnails")
-    versioned_filename = f"{photo_id}_{size}_v{rotation_version}.jpg"
-    versioned_filepath = os.path.join(thumbnails_path, versioned_filename)
+    found = await run_in_threadpool(_find_thumbnail, thumbnails_path, photo_id, size, rotation_version, formats)
     
     # Check if versioned thumbnail exists
-    if os.path.exists(versioned_filepath):
+    if found:
+        versioned_filepath, fmt, stat = found
+        media_type = FORMATS[fmt]['media_type']
         # Serve the versioned thumbnail with proper cache headers
         # Use strong caching but allow revalidation on hard refresh
-        media_type = "image/jpeg"
-        
-        # Get file stats for ETag
-        stat = os.stat(versioned_filepath)
-        # Create ETag from file path, size, and mtime
-        etag_source = f"{versioned_filepath}-{stat.st_size}-{stat.st_mtime}"
-        etag = hashlib.md5(etag_source.encode()).hexdigest()
         
-        # Check if we're in development mode
-        is_development = os.getenv("NODE_ENV") == "development" or os.getenv("ENVIRONMENT") == "development"
+        # ETag from photo, size, rotation version, format and the file's mtime
+        etag = _etag(photo_id, size, f"v{rotation_version}", fmt, f"{stat.st_mtime_ns:x}")
         
         if is_development:
             # Aggressive no-cache for development
@@ -240,67 +430,81 @@ async def get_thumbnail(
                 "Cache-Control": "no-cache, no-store, must-revalidate",
                 "Pragma": "no-cache",
                 "Expires": "0",
-                "ETag": f'"{etag}"'
+                "ETag": etag,
+                "Vary": "Accept"
             }
         else:
             # Production caching
             headers = {
                 "Cache-Control": "public, max-age=2592000, must-revalidate",  # 30 days cache
-                "ETag": f'"{etag}"'
+                "ETag": etag,
+                "Vary": "Accept"
             }
-        return FileResponse(versioned_filepath, media_type=media_type, headers=headers)
+        
+        not_modified = _not_modified(etag, stat.st_mtime, if_none_match, if_modified_since, headers)
+        if not_modified:
+            return not_modified
+        return FileResponse(versioned_filepath, media_type=media_type, headers=headers, stat_result=stat)
     
     # Fallback to old naming convention for backward compatibility
     old_filename = f"{photo_id}_{size}.jpg"
     old_filepath = os.path.join(thumbnails_path, old_filename)
     
-    if os.path.exists(old_filepath):
+    try:
+        stat = await run_in_threadpool(os.stat, old_filepath)
+    except OSError:
+        stat = None
+    
+    if stat:
         # Serve old thumbnail with proper cache headers
         media_type = "image/jpeg"
         
-        # Get file stats for ETag
-        stat = os.stat(old_filepath)
-        etag_source = f"{old_filepath}-{stat.st_size}-{stat.st_mtime}"
-        etag = hashlib.md5(etag_source.encode()).hexdigest()
-        
-        # Check if we're in development mode
-        is_development = os.getenv("NODE_ENV") == "development" or os.getenv("ENVIRONMENT") == "development"
+        # File stats for ETag
+        etag = _etag(photo_id, size, 'jpeg', f"{stat.st_mtime_ns:x}")
         
         if is_development:
             headers = {
                 "Cache-Control": "no-cache, no-store, must-revalidate",
                 "Pragma": "no-cache",
                 "Expires": "0",
-                "ETag": f'"{etag}"'
+                "ETag": etag,
+                "Vary": "Accept"
             }
         else:
             headers = {
                 "Cache-Control": "public, max-age=3600, must-revalidate",  # 1 hour cache
-                "ETag": f'"{etag}"'
+                "ETag": etag,
+                "Vary": "Accept"
             }
-        return FileResponse(old_filepath, media_type=media_type, headers=headers)
+        
+        not_modified = _not_modified(etag, stat.st_mtime, if_none_match, if_modified_since, headers)
+        if not_modified:
+            return not_modified
+        return FileResponse(old_filepath, media_type=media_type, headers=headers, stat_result=stat)
     
     # Generate thumbnail on the fly if it doesn't exist
     # This ensures photos appear immediately even before background processing
-    from services.thumbnail_service import ThumbnailService
-    
     try:
-        service = ThumbnailService(db)
         # Generate just the requested size, not all sizes
-        generated = service.generate_single_thumbnail(photo_id, size)
+        generated = await run_image_work(_generate_thumbnail, photo_id, size)
         if generated and size in generated:
-            thumbnail_path = generated[size]['filepath']
-            if os.path.exists(thumbnail_path):
-                media_type = "image/jpeg"
-                stat = os.stat(thumbnail_path)
-                etag_source = f"{thumbnail_path}-{stat.st_size}-{stat.st_mtime}"
-                etag = hashlib.md5(etag_source.encode()).hexdigest()
+            fmt = next(fmt for fmt in formats if fmt in generated[size])
+            thumbnail_path = generated[size][fmt]['filepath']
+            try:
+                stat = await run_in_threadpool(os.stat, thumbnail_path)
+            except OSError:
+                stat = None
+            if stat:
+                media_type = FORMATS[fmt]['media_type']
+                # Same ETag the versioned path gives this file on the next request
+                etag = _etag(photo_id, size, f"v{rotation_version}", fmt, f"{stat.st_mtime_ns:x}")
                 
                 headers = {
                     "Cache-Control": "no-cache, must-revalidate",  # Short cache for on-the-fly generated
-                    "ETag": f'"{etag}"'
+                    "ETag": etag,
+                    "Vary": "Accept"
                 }
-                return FileResponse(thumbnail_path, media_type=media_type, headers=headers)
+                return FileResponse(thumbnail_path, media_type=media_type, headers=headers, stat_result=stat)
     except Exception as e:
         # Log but don't fail - return placeholder instead
         import logging
@@ -309,20 +513,11 @@ async def get_thumbnail(
     
     # Return a placeholder image if all else fails
     # Create a simple gray placeholder
-    from PIL import Image
-    import io
-    
     size_map = {"150": 150, "400": 400, "1200": 1200}
     dimension = size_map.get(size, 400)
     
-    # Create a gray placeholder with text
-    placeholder = Image.new('RGB', (dimension, dimension), color=(60, 60, 60))
-    buffer = io.BytesIO()
-    placeholder.save(buffer, 'JPEG', quality=85)
-    buffer.seek(0)
-    
     return Response(
-        content=buffer.getvalue(),
+        content=_placeholder(dimension),
         media_type="image/jpeg",
         headers={
             "Cache-Control": "no-cache, no-store",  # Don't cache placeholders
@@ -336,7 +531,7 @@ class RegenerateRequest(BaseModel):
     force: bool = False
 
 @router.post("/regenerate/{photo_id}")
-async def regenerate_photo_thumbnails(
+def regenerate_photo_thumbnails(
     photo_id: int,
     db: Session = Depends(get_db)
 ):
@@ -363,7 +558,7 @@ async def regenerate_photo_thumbnails(
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/regenerate")
-async def regenerate_thumbnails(
+def regenerate_thumbnails(
     request: RegenerateRequest,
     db: Session = Depends(get_db)
 ):
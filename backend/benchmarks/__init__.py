@@ -0,0 +1 @@
+# Standalone benchmarks, run from the backend directory: python -m benchmarks.<name>
\ No newline at end of file
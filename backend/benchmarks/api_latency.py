@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Measure grid request latency on a running API, idle and while full-size
+conversions are in flight, to check that image work doesn't block other
+requests.
+
+Usage (from the backend directory, with the API running):
+    python -m benchmarks.api_latency --url http://localhost:8000
+    python -m benchmarks.api_latency --full-ids 12,40 --conversions 4 --rounds 20
+
+Each round loads a grid page the way the frontend does: the photo list, then
+its 400px thumbnails concurrently. The rounds run once on an idle API and
+once with --conversions full-size requests for HEIC/TIFF/RAW photos kept in
+flight. Start the API with FULL_IMAGE_CACHE_MB=0 so every conversion decodes
+and encodes instead of hitting the cache. When image work blocks the event
+loop, grid p95 under conversion approaches the conversion time; when it is
+off the loop, it stays close to idle.
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Served converted to JPEG by GET /thumbnails/{id}/full
+CONVERTED_EXTENSIONS = ('.heic', '.heif', '.tif', '.tiff', '.nef', '.cr2', '.cr3', '.arw', '.dng', '.raf', '.orf')
+
+def percentile(values, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+async def find_converted(client, pages: int = 10):
+    """Ids of photos the API converts for display, from the first pages of the list"""
+    ids = []
+    for page in range(1, pages + 1):
+        response = await client.get('/api/v1/photos', params={'page': page, 'per_page': 500})
+        response.raise_for_status()
+        photos = response.json()['data']
+        ids += [photo['id'] for photo in photos if photo['filename'].lower().endswith(CONVERTED_EXTENSIONS)]
+        if len(photos) < 500:
+            break
+    return ids
+
+async def load_grid(client, per_page: int, thumbnails: int):
+    """One grid page; returns (latency of every request in ms, whole page in ms)"""
+    latencies = []
+
+    async def timed_get(url, **kwargs):
+        start = time.perf_counter()
+        response = await client.get(url, **kwargs)
+        response.raise_for_status()
+        latencies.append((time.perf_counter() - start) * 1000)
+        return response
+
+    start = time.perf_counter()
+    response = await timed_get('/api/v1/photos', params={'page': 1, 'per_page': per_page})
+    photos = response.json()['data'][:thumbnails]
+    await asyncio.gather(*(timed_get(photo['thumbnails']['400']) for photo in photos))
+    return latencies, (time.perf_counter() - start) * 1000
+
+async def convert_until(client, photo_ids, durations, stop: asyncio.Event):
+    """Request full-size conversions back to back until stopped"""
+    i = 0
+    while not stop.is_set():
+        start = time.perf_counter()
+        response = await client.get(f'/api/v1/thumbnails/{photo_ids[i % len(photo_ids)]}/full')
+        response.raise_for_status()
+        durations.append((time.perf_counter() - start) * 1000)
+        i += 1
+
+async def measure(client, rounds: int, per_page: int, thumbnails: int):
+    latencies = []
+    grids = []
+    for _ in range(rounds):
+        request_latencies, grid_ms = await load_grid(client, per_page, thumbnails)
+        latencies += request_latencies
+        grids.append(grid_ms)
+    return latencies, grids
+
+async def run(args):
+    import httpx
+
+    # Idle connections are dropped before uvicorn's 5s keep-alive closes them under us
+    limits = httpx.Limits(max_connections=args.thumbnails + args.conversions + 4, keepalive_expiry=2)
+    async with httpx.AsyncClient(base_url=args.url, timeout=300, limits=limits) as client:
+        full_ids = [int(i) for i in args.full_ids.split(',')] if args.full_ids else await find_converted(client)
+        if not full_ids:
+            sys.exit('No HEIC/TIFF/RAW photos found; pass --full-ids')
+
+        await load_grid(client, args.per_page, args.thumbnails)  # Warm up connections and caches
+        results = {'idle': await measure(client, args.rounds, args.per_page, args.thumbnails)}
+
+        stop = asyncio.Event()
+        durations = []
+        converters = [
+            asyncio.create_task(convert_until(client, full_ids[i:] + full_ids[:i], durations, stop))
+            for i in range(args.conversions)
+        ]
+        await asyncio.sleep(0.2)  # Let the conversions get going
+        results['converting'] = await measure(client, args.rounds, args.per_page, args.thumbnails)
+        stop.set()
+        await asyncio.gather(*converters)
+
+    print(f"{'phase':<12} {'requests':>9} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9} {'grid ms':>9}")
+    for phase, (latencies, grids) in results.items():
+        print(f"{phase:<12} {len(latencies):>9} {percentile(latencies, 0.5):9.1f} "
+              f"{percentile(latencies, 0.95):9.1f} {max(latencies):9.1f} {sum(grids) / len(grids):9.1f}")
+    print(f"\n{len(durations)} full-size conversions, mean {sum(durations) / len(durations):.0f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://localhost:8000', help='API base URL')
+    parser.add_argument('--full-ids', help='comma-separated photo ids to convert (default: HEIC/TIFF/RAW in the library)')
+    parser.add_argument('--conversions', type=int, default=2, help='full-size requests kept in flight')
+    parser.add_argument('--rounds', type=int, default=10, help='grid pages loaded per phase')
+    parser.add_argument('--per-page', type=int, default=100, help='photos per list request')
+    parser.add_argument('--thumbnails', type=int, default=40, help='thumbnails fetched per grid page')
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
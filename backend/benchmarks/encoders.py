@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Compare thumbnail encoder profiles: encode time, bytes and SSIM against the
+unencoded rendition, averaged over a sample set, for every thumbnail size.
+
+Usage (from the backend directory):
+    python -m benchmarks.encoders --files 8 --megapixels 24
+    python -m benchmarks.encoders --dir /path/to/photos --formats jpeg,webp,avif
+
+Every profile in services.thumbnail_formats.ENCODER_PROFILES is measured at
+every size, along with the settings used before profiles existed
+('legacy-95' from the batch worker, 'legacy-85' from ThumbnailService), so
+the row marked * is what each size ships with. Use real photos with --dir
+for numbers worth deciding on; the synthetic images are multi-scale noise,
+which keeps detail at every thumbnail size the way photos do.
+"""
+import io
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+LEGACY_PROFILES = {
+    'legacy-95': {'jpeg': {'quality': 95, 'optimize': True, 'progressive': True}},
+    'legacy-85': {'jpeg': {'quality': 85, 'optimize': True}}
+}
+
+def build_library(path: str, files: int, megapixels: float):
+    """Write 1/f noise: every octave from coarse shapes down to pixel-level grain"""
+    import numpy as np
+    from PIL import Image
+
+    height = int((megapixels * 1_000_000 / 1.5) ** 0.5)
+    width = int(height * 1.5)
+    rng = np.random.default_rng(0)
+    for i in range(files):
+        pixels = np.zeros((height, width, 3), dtype=np.float32)
+        octave = 4
+        while octave <= width:
+            layer = rng.normal(0, 1, (max(2, octave * height // width), octave, 3)).astype(np.float32)
+            channels = [Image.fromarray(layer[:, :, c], 'F').resize((width, height), Image.BICUBIC) for c in range(3)]
+            pixels += np.stack([np.asarray(channel) for channel in channels], axis=-1) * (64 / octave ** 0.5)
+            octave *= 4
+        img = Image.fromarray(np.clip(pixels + 128, 0, 255).astype(np.uint8))
+        img.save(os.path.join(path, f"IMG_{i:05d}.jpg"), quality=92)
+
+def ssim(reference, candidate) -> float:
+    """Mean SSIM of the luma channels over 7x7 windows"""
+    import numpy as np
+
+    def windowed_mean(a, k=7):
+        # Box filter via a 2D cumulative sum, valid region only
+        c = np.pad(a, ((1, 0), (1, 0))).cumsum(0).cumsum(1)
+        return (c[k:, k:] - c[:-k, k:] - c[k:, :-k] + c[:-k, :-k]) / (k * k)
+
+    x = np.asarray(reference.convert('L'), dtype=np.float64)
+    y = np.asarray(candidate.convert('L'), dtype=np.float64)
+    c1, c2 = (0.01 * 255) ** 2, (0.03 * 255) ** 2
+    mx, my = windowed_mean(x), windowed_mean(y)
+    vx = windowed_mean(x * x) - mx * mx
+    vy = windowed_mean(y * y) - my * my
+    cov = windowed_mean(x * y) - mx * my
+    score = ((2 * mx * my + c1) * (2 * cov + c2)) / ((mx * mx + my * my + c1) * (vx + vy + c2))
+    return float(score.mean())
+
+def renditions(paths):
+    """{size: [rendition, ...]} through the same open/orient/ladder path as the worker"""
+    from PIL import ImageOps
+    from services.image_loader import open_image
+    from services.thumbnail_ladder import render_ladder
+
+    sizes = {'150': (150, 150), '400': (400, 400), '1200': (1200, 1200)}
+    rendered = {size: [] for size in sizes}
+    for path in paths:
+        try:
+            img = open_image(path, max(max(box) for box in sizes.values()))
+        except Exception as e:
+            print(f"skipping {os.path.basename(path)}: {e}")
+            continue
+        with img:
+            img = ImageOps.exif_transpose(img) or img
+            if img.mode not in ('RGB', 'L'):
+                img = img.convert('RGB')
+            for size, thumbnail in render_ladder(img, sizes):
+                rendered[size].append(thumbnail.copy() if thumbnail is img else thumbnail)
+    return rendered
+
+def measure(images, fmt: str, options: dict, repeat: int):
+    """(ms per encode, mean bytes, mean SSIM) for one profile over a set of renditions"""
+    from PIL import Image
+
+    pil_format = {'jpeg': 'JPEG', 'webp': 'WEBP', 'avif': 'AVIF'}[fmt]
+    elapsed = 0.0
+    total_bytes = 0
+    total_ssim = 0.0
+    images[0].save(io.BytesIO(), pil_format, **options)  # Warm up the encoder
+    for img in images:
+        for _ in range(repeat):
+            buffer = io.BytesIO()
+            start = time.perf_counter()
+            img.save(buffer, pil_format, **options)
+            elapsed += time.perf_counter() - start
+        total_bytes += buffer.tell()
+        buffer.seek(0)
+        with Image.open(buffer) as decoded:
+            total_ssim += ssim(img, decoded)
+    return elapsed / (len(images) * repeat) * 1000, total_bytes / len(images), total_ssim / len(images)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--files', type=int, default=6, help='number of synthetic photos')
+    parser.add_argument('--megapixels', type=float, default=24, help='size of each synthetic photo')
+    parser.add_argument('--dir', help='benchmark existing photos in this directory instead')
+    parser.add_argument('--formats', default='jpeg,webp', help='comma-separated formats to compare')
+    parser.add_argument('--repeat', type=int, default=3, help='encodes per image, for steadier timings')
+    args = parser.parse_args()
+
+    formats = args.formats.split(',')
+    if 'avif' in formats:
+        import pillow_heif
+        pillow_heif.register_avif_opener()
+    from services.thumbnail_formats import ENCODER_PROFILES, SIZE_PROFILES
+
+    workdir = args.dir or tempfile.mkdtemp(prefix='bokeh-encoder-bench-')
+    try:
+        if not args.dir:
+            build_library(workdir, args.files, args.megapixels)
+        paths = sorted(os.path.join(workdir, name) for name in os.listdir(workdir))
+        rendered = renditions(paths)
+
+        profiles = {**LEGACY_PROFILES, **ENCODER_PROFILES}
+        print(f"{'size':<6} {'format':<6} {'profile':<12} {'encode ms':>10} {'KB':>8} {'SSIM':>8}")
+        for size, images in rendered.items():
+            if not images:
+                continue
+            for fmt in formats:
+                for name, profile in profiles.items():
+                    if fmt not in profile:
+                        continue
+                    ms, size_bytes, score = measure(images, fmt, profile[fmt], args.repeat)
+                    marker = '*' if SIZE_PROFILES.get(size) == name else ' '
+                    print(f"{size:<6} {fmt:<6} {name + marker:<12} {ms:10.2f} {size_bytes / 1024:8.1f} {score:8.4f}")
+    finally:
+        if not args.dir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
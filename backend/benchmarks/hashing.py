@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Compare content-hashing throughput on a synthetic photo library.
+
+Usage (from the backend directory):
+    python -m benchmarks.hashing --files 40 --size-mb 25
+
+The library is freshly written, so files are usually served from the page
+cache and the numbers show hashing cost rather than disk speed.
+"""
+import os
+import sys
+import time
+import shutil
+import hashlib
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.hashing import hash_file, fingerprint_file, ALGORITHMS, XXHASH_AVAILABLE
+
+def legacy_sha256(filepath: str) -> str:
+    """The scanner's original 4 KB chunked SHA-256, kept as the baseline"""
+    hash_sha256 = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for chunk in iter(lambda: f.read(4096), b""):
+            hash_sha256.update(chunk)
+    return hash_sha256.hexdigest()
+
+def build_library(path: str, files: int, size_mb: float):
+    size = int(size_mb * 1024 * 1024)
+    block = os.urandom(1024 * 1024)
+    for i in range(files):
+        with open(os.path.join(path, f"IMG_{i:05d}.CR2"), "wb") as f:
+            written = 0
+            while written < size:
+                chunk = block[:size - written]
+                f.write(chunk)
+                written += len(chunk)
+            # Make every file unique
+            f.write(i.to_bytes(8, 'little'))
+
+def run(label: str, func, paths, total_bytes: int):
+    start = time.perf_counter()
+    for path in paths:
+        func(path)
+    elapsed = time.perf_counter() - start
+    mb_per_s = total_bytes / (1024 * 1024) / elapsed if elapsed else float('inf')
+    print(f"{label:<28} {elapsed:8.3f} s {mb_per_s:10.1f} MB/s {len(paths) / elapsed:10.1f} files/s")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--files', type=int, default=20, help='number of synthetic files')
+    parser.add_argument('--size-mb', type=float, default=25, help='size of each file in MB')
+    parser.add_argument('--dir', help='directory for the synthetic library (default: a temp dir)')
+    args = parser.parse_args()
+
+    workdir = args.dir or tempfile.mkdtemp(prefix='bokeh-hash-bench-')
+    os.makedirs(workdir, exist_ok=True)
+    try:
+        build_library(workdir, args.files, args.size_mb)
+        paths = sorted(os.path.join(workdir, name) for name in os.listdir(workdir))
+        total_bytes = sum(os.path.getsize(p) for p in paths)
+        print(f"{len(paths)} files, {total_bytes / (1024 * 1024):.0f} MB in {workdir}\n")
+
+        # Warm the page cache so the first measurement isn't penalised
+        for path in paths:
+            legacy_sha256(path)
+
+        run("sha256 4KB chunks (legacy)", legacy_sha256, paths, total_bytes)
+        for algorithm in ALGORITHMS:
+            if algorithm == 'xxh3_128' and not XXHASH_AVAILABLE:
+                print(f"{algorithm:<28} skipped (pip install xxhash)")
+                continue
+            for reader in ('buffered', 'mmap'):
+                run(f"{algorithm} {reader}", lambda p: hash_file(p, algorithm, reader), paths, total_bytes)
+        run("fingerprint (head/tail)", fingerprint_file, paths, total_bytes)
+    finally:
+        if not args.dir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Compare thumbnail generation with full-resolution and reduced-resolution
+decoding: per-photo time and peak RSS.
+
+Usage (from the backend directory):
+    python -m benchmarks.thumbnails --files 8 --megapixels 45
+    python -m benchmarks.thumbnails --dir /path/to/photos
+
+Each mode runs in a fresh process so its peak RSS isn't inherited from the
+other. Output goes to memory; only decoding and resizing are measured.
+
+The second table renders the JPEGs through ThumbnailWorker with the thread
+and process engines (THUMBNAIL_EXECUTOR) to show how each scales with
+--workers.
+"""
+import io
+import os
+import sys
+import time
+import shutil
+import resource
+import argparse
+import tempfile
+import multiprocessing
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SIZES = {'150': (150, 150), '400': (400, 400), '1200': (1200, 1200)}
+
+def build_library(path: str, files: int, megapixels: float, formats):
+    """Write noisy gradients, which compress roughly like real photos"""
+    import numpy as np
+    from PIL import Image
+
+    height = int((megapixels * 1_000_000 / 1.5) ** 0.5)
+    width = int(height * 1.5)
+    rng = np.random.default_rng(0)
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    for i in range(files):
+        base = (x * 0.6 + y * 0.4 + i * 7) % 256
+        pixels = np.stack([base, base[:, ::-1], 255 - base], axis=-1)
+        pixels += rng.normal(0, 8, pixels.shape).astype(np.float32)
+        img = Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+        for fmt in formats:
+            ext = 'jpg' if fmt == 'jpeg' else fmt
+            img.save(os.path.join(path, f"IMG_{i:05d}.{ext}"), quality=92)
+
+def render(filepath: str):
+    """The ThumbnailWorker pipeline: open, orient, convert, then every size"""
+    from PIL import ImageOps
+    from services.image_loader import open_image
+    from services.thumbnail_ladder import render_ladder
+
+    img = open_image(filepath, max(max(d) for d in SIZES.values()))
+    with img:
+        img = ImageOps.exif_transpose(img) or img
+        if img.mode not in ('RGB', 'L'):
+            img = img.convert('RGB')
+        for _, thumbnail in render_ladder(img, SIZES):
+            thumbnail.save(io.BytesIO(), 'JPEG', quality=85)
+
+def measure(paths, reduced: bool):
+    """Runs in a child process; returns (seconds per photo, peak RSS in MB)"""
+    import services.image_loader as image_loader
+    image_loader.REDUCED_DECODE = reduced
+
+    render(paths[0])  # Warm imports and codecs
+    start = time.perf_counter()
+    for path in paths:
+        render(path)
+    elapsed = (time.perf_counter() - start) / len(paths)
+    return elapsed, peak_rss_mb()
+
+def peak_rss_mb() -> float:
+    # VmHWM starts afresh at exec; ru_maxrss would include the parent's peak
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KB on Linux
+
+def measure_engine(paths, engine: str, workers: int, thumbnails_path: str) -> float:
+    """Photos per second through thumbnail_executor, writing real thumbnail files"""
+    os.environ['THUMBNAILS_PATH'] = thumbnails_path
+    import services.thumbnail_render as thumbnail_render
+    thumbnail_render.THUMBNAIL_EXECUTOR = engine
+    thumbnail_render.MAX_THUMBNAIL_WORKERS = workers
+
+    render, executor_context = thumbnail_render.thumbnail_executor()
+    with executor_context as executor:
+        # Warm up: starts the processes and loads codecs in each
+        list(executor.map(render, [(0, paths[0])] * workers))
+        start = time.perf_counter()
+        results = list(executor.map(render, [(i, path) for i, path in enumerate(paths)]))
+        elapsed = time.perf_counter() - start
+    failed = [r['error'] for r in results if not r['success']]
+    if failed:
+        print(f"  {len(failed)} failed: {failed[0]}")
+    return len(paths) / elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--files', type=int, default=6, help='number of synthetic photos per format')
+    parser.add_argument('--megapixels', type=float, default=45, help='size of each synthetic photo')
+    parser.add_argument('--formats', default='jpeg,png', help='comma-separated synthetic formats')
+    parser.add_argument('--dir', help='benchmark existing photos in this directory instead')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 4, help='workers for the engine comparison')
+    args = parser.parse_args()
+
+    workdir = args.dir or tempfile.mkdtemp(prefix='bokeh-thumb-bench-')
+    try:
+        if not args.dir:
+            build_library(workdir, args.files, args.megapixels, args.formats.split(','))
+        paths = sorted(os.path.join(workdir, name) for name in os.listdir(workdir))
+
+        by_ext = {}
+        for path in paths:
+            by_ext.setdefault(os.path.splitext(path)[1].lower(), []).append(path)
+
+        context = multiprocessing.get_context('spawn')
+        print(f"{'format':<8} {'decode':<8} {'ms/photo':>10} {'peak RSS MB':>12}")
+        for ext, group in sorted(by_ext.items()):
+            for reduced in (False, True):
+                with context.Pool(1) as pool:
+                    elapsed, peak_mb = pool.apply(measure, (group, reduced))
+                label = 'reduced' if reduced else 'full'
+                print(f"{ext:<8} {label:<8} {elapsed * 1000:10.1f} {peak_mb:12.0f}")
+
+        jpegs = by_ext.get('.jpg', []) + by_ext.get('.jpeg', [])
+        if jpegs:
+            thumbnails_path = tempfile.mkdtemp(prefix='bokeh-thumb-out-')
+            try:
+                print(f"\n{'engine':<8} {'workers':>8} {'photos/s':>10}")
+                for engine in ('thread', 'process'):
+                    for workers in sorted({1, args.workers}):
+                        rate = measure_engine(jpegs, engine, workers, thumbnails_path)
+                        print(f"{engine:<8} {workers:>8} {rate:10.2f}")
+            finally:
+                shutil.rmtree(thumbnails_path, ignore_errors=True)
+    finally:
+        if not args.dir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
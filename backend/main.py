@@ -1,10 +1,13 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
+import asyncio
 import logging
 
 from api import auth, photos, folders, system, jobs, thumbnails
-from models.database import engine, Base
+from models.database import engine, async_engine, Base
+from services.load_monitor import request_stats, publish_request_stats
+from services.image_executor import shutdown_image_executor
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -15,9 +18,14 @@ async def lifespan(app: FastAPI):
     logger.info("Starting up application...")
     # Create database tables
     Base.metadata.create_all(bind=engine)
+    # Let thumbnail workers see how busy the API is
+    load_publisher = asyncio.create_task(publish_request_stats())
     yield
     # Shutdown
     logger.info("Shutting down application...")
+    load_publisher.cancel()
+    shutdown_image_executor()
+    await async_engine.dispose()
 
 app = FastAPI(
     title="Photo Management API",
@@ -34,6 +42,16 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def track_request_load(request: Request, call_next):
+    if not request_stats.tracks(request.url.path):
+        return await call_next(request)
+    started = request_stats.started()
+    try:
+        return await call_next(request)
+    finally:
+        request_stats.finished(started)
+
 # Include routers
 app.include_router(auth.router, prefix="/api/v1/auth", tags=["Authentication"])
 app.include_router(photos.router, prefix="/api/v1/photos", tags=["Photos"])
@@ -0,0 +1,3 @@
+-- Add the cheap head/tail content fingerprint used to avoid re-hashing touched files
+ALTER TABLE file_states
+ADD COLUMN IF NOT EXISTS fingerprint VARCHAR(32);
\ No newline at end of file
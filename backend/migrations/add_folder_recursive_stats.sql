@@ -0,0 +1,4 @@
+-- Add recursive folder totals maintained by the scanner
+ALTER TABLE folders
+ADD COLUMN IF NOT EXISTS recursive_photo_count INTEGER,
+ADD COLUMN IF NOT EXISTS recursive_total_size BIGINT;
\ No newline at end of file
@@ -0,0 +1,4 @@
+-- Add directory scan state used to prune unchanged subtrees on rescans
+ALTER TABLE folders
+ADD COLUMN IF NOT EXISTS dir_mtime_ns BIGINT,
+ADD COLUMN IF NOT EXISTS subdirs JSON;
\ No newline at end of file
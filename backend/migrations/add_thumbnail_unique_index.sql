@@ -0,0 +1,10 @@
+-- Remove duplicate thumbnail rows, keeping the most recent for each rendition
+DELETE FROM thumbnails a
+USING thumbnails b
+WHERE a.photo_id = b.photo_id
+  AND a.size = b.size
+  AND a.format = b.format
+  AND a.id < b.id;
+
+-- One row per (photo, size, format); also serves lookups by photo_id
+CREATE UNIQUE INDEX IF NOT EXISTS idx_thumbnails_photo_size_format ON thumbnails(photo_id, size, format);
\ No newline at end of file
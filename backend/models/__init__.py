@@ -1,8 +1,9 @@
-from .database import Base, engine, get_db
+from .database import Base, engine, get_db, async_engine, get_async_db
 from .photo import Photo
 from .user import User
 from .folder import Folder
 from .job import Job, JobType, JobStatus
 from .thumbnail import Thumbnail
+from .file_state import FileState
 
-__all__ = ['Base', 'engine', 'get_db', 'Photo', 'User', 'Folder', 'Job', 'JobType', 'JobStatus', 'Thumbnail']
\ No newline at end of file
+__all__ = ['Base', 'engine', 'get_db', 'async_engine', 'get_async_db', 'Photo', 'User', 'Folder', 'Job', 'JobType', 'JobStatus', 'Thumbnail', 'FileState']
\ No newline at end of file
@@ -0,0 +1,18 @@
+from sqlalchemy import Column, Integer, String, BigInteger, ForeignKey, DateTime
+from sqlalchemy.sql import func
+from .database import Base
+
+# Manifest of the last-seen stat for every scanned file. Incremental scans
+# compare (size, mtime_ns, inode) against it to skip unchanged files.
+class FileState(Base):
+    __tablename__ = "file_states"
+
+    id = Column(Integer, primary_key=True, index=True)
+    path = Column(String(1000), nullable=False, unique=True, index=True)
+    size = Column(BigInteger, nullable=False)
+    mtime_ns = Column(BigInteger, nullable=False)
+    inode = Column(BigInteger, nullable=False)
+    fingerprint = Column(String(32), nullable=True)  # Size + head/tail sample, see services.hashing
+    file_hash = Column(String(64), nullable=True)
+    photo_id = Column(Integer, ForeignKey("photos.id", ondelete="SET NULL"), nullable=True)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, BigInteger, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, BigInteger, ForeignKey, DateTime, JSON
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from .database import Base
@@ -12,6 +12,12 @@ class Folder(Base):
     parent_id = Column(Integer, ForeignKey("folders.id"), nullable=True)
     photo_count = Column(Integer, default=0)
     total_size = Column(BigInteger, default=0)
+    # Totals including all subfolders, recomputed at the end of each scan
+    recursive_photo_count = Column(Integer, nullable=True)
+    recursive_total_size = Column(BigInteger, nullable=True)
+    # Directory state from the last scan, used to prune unchanged subtrees
+    dir_mtime_ns = Column(BigInteger, nullable=True)
+    subdirs = Column(JSON, nullable=True)  # Child directory names at the last listing
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
 
@@ -1,10 +1,14 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from .database import Base
 
 class Thumbnail(Base):
     __tablename__ = "thumbnails"
+    # One row per rendition; also the photo_id index, and the upsert conflict target
+    __table_args__ = (
+        Index("idx_thumbnails_photo_size_format", "photo_id", "size", "format", unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     photo_id = Column(Integer, ForeignKey("photos.id", ondelete="CASCADE"), nullable=False)
@@ -0,0 +1,116 @@
+import os
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator
+
+logger = logging.getLogger(__name__)
+
+# Eviction frees down to this fraction of the limit so it doesn't run on every write
+DISK_CACHE_LOW_WATER = 0.9
+
+@contextmanager
+def atomic_path(path: str) -> Iterator[str]:
+    """
+    Yield a temporary path to write instead of path. It replaces path when the
+    block succeeds, so concurrent readers never see a partial file, and is
+    deleted when it fails. Names end in .tmp, which eviction skips.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        yield temp_path
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+class DiskLRU:
+    """
+    A directory of cache files bounded to max_bytes (0 disables it). File
+    mtimes record last use; when the directory outgrows the limit the least
+    recently used files are deleted. Several processes may write to the same
+    directory; counters are per process.
+    """
+
+    def __init__(self, path: str, max_bytes: int, name: str = 'Disk cache'):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._size = None  # Bytes on disk, counted on first write
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def touch(self, filepath: str) -> bool:
+        """Mark a cache file recently used; False if it doesn't exist"""
+        try:
+            os.utime(filepath)
+        except OSError:
+            self.misses += 1
+            return False
+        self.hits += 1
+        return True
+
+    def added(self, size: int):
+        """Account for a file just written to the directory, evicting if over the limit"""
+        with self._lock:
+            if self._size is None:
+                self._size = self._disk_usage()
+            else:
+                self._size += size
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def removed(self, size: int):
+        with self._lock:
+            if self._size is not None:
+                self._size -= size
+
+    def _disk_usage(self) -> int:
+        try:
+            return sum(entry.stat().st_size for entry in os.scandir(self.path) if entry.is_file())
+        except OSError:
+            return 0
+
+    def _evict(self):
+        """Delete least recently used files until under the low-water mark"""
+        # Re-read the directory: other processes write to it too
+        entries = []
+        for entry in os.scandir(self.path):
+            if entry.is_file() and not entry.name.endswith('.tmp'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        entries.sort()
+        self._size = sum(size for _, size, _ in entries)
+
+        target = self.max_bytes * DISK_CACHE_LOW_WATER
+        for _, size, path in entries:
+            if self._size <= target:
+                break
+            try:
+                os.remove(path)
+                self._size -= size
+                self.evictions += 1
+            except OSError:
+                pass
+        logger.info(f"{self.name} evicted down to {self._size / 1024 / 1024:.0f} MB")
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else None,
+            'evictions': self.evictions,
+            'size': self._size,
+            'max_size': self.max_bytes
+        }
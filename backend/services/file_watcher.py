@@ -0,0 +1,219 @@
+import os
+import time
+import logging
+import threading
+from typing import Dict, List, Optional
+from watchdog.events import FileSystemEventHandler
+from watchdog.observers import Observer
+from models import get_db, Job, JobType, JobStatus
+from services.scanner import DirectoryScanner, SUPPORTED_EXTENSIONS, create_scan_pool
+
+logger = logging.getLogger(__name__)
+
+# 'auto' picks polling for network/virtual mounts that don't deliver inotify events
+WATCHER_MODE = os.getenv('WATCHER_MODE', 'auto')  # auto, events or polling
+# A batch is flushed once no new events arrived for this long...
+WATCHER_DEBOUNCE_SECONDS = float(os.getenv('WATCHER_DEBOUNCE_SECONDS', '3'))
+# ...or when it reaches this many files...
+WATCHER_MAX_BATCH = int(os.getenv('WATCHER_MAX_BATCH', '500'))
+# ...or when its oldest event has waited this long during a continuous burst
+WATCHER_MAX_DELAY_SECONDS = float(os.getenv('WATCHER_MAX_DELAY_SECONDS', '30'))
+# Files modified more recently than this are held back; they may still be copying
+WATCHER_SETTLE_SECONDS = float(os.getenv('WATCHER_SETTLE_SECONDS', '2'))
+# Polling mode: interval between incremental (directory-mtime pruned) rescans
+WATCHER_POLL_INTERVAL = float(os.getenv('WATCHER_POLL_INTERVAL', '60'))
+
+# Filesystems where inotify events for changes made elsewhere (another host,
+# the Docker Desktop host) never arrive
+POLLING_FILESYSTEMS = {
+    'nfs', 'nfs4', 'cifs', 'smb3', 'smbfs', '9p', 'virtiofs',
+    'fuse', 'fuseblk', 'fuse.sshfs', 'fuse.rclone', 'fakeowner', 'grpcfuse'
+}
+
+def is_supported_path(path: str) -> bool:
+    return os.path.splitext(path)[1].lower() in SUPPORTED_EXTENSIONS
+
+def mount_fstype(path: str) -> Optional[str]:
+    """Filesystem type of the mount containing path, from /proc/mounts"""
+    path = os.path.realpath(path)
+    best_mount, best_type = '', None
+    try:
+        with open('/proc/mounts') as mounts:
+            for line in mounts:
+                fields = line.split()
+                if len(fields) < 3:
+                    continue
+                mount_point = fields[1].replace('\\040', ' ')
+                if (path == mount_point or path.startswith(mount_point.rstrip('/') + '/')) \
+                        and len(mount_point) > len(best_mount):
+                    best_mount, best_type = mount_point, fields[2]
+    except OSError:
+        return None
+    return best_type
+
+class _ChangeHandler(FileSystemEventHandler):
+    """Forwards created/modified/moved-in paths to the watcher"""
+
+    def __init__(self, watcher: 'LibraryWatcher'):
+        self.watcher = watcher
+
+    def on_created(self, event):
+        self.watcher.add(event.src_path, event.is_directory)
+
+    def on_modified(self, event):
+        if not event.is_directory:
+            self.watcher.add(event.src_path, False)
+
+    def on_moved(self, event):
+        self.watcher.add(event.dest_path, event.is_directory)
+
+class LibraryWatcher:
+    """
+    Continuous ingestion for PHOTOS_PATH. Filesystem events are collected and
+    debounced into batches (a camera card dump becomes a handful of scans
+    rather than thousands); each batch runs through DirectoryScanner with only
+    the changed paths, which also queues their thumbnails.
+
+    On mounts without inotify the watcher falls back to polling, running the
+    same incremental scan as the scheduled rescan. Unchanged directories are
+    pruned by mtime, so a poll costs roughly one stat per directory.
+    """
+
+    def __init__(self, photos_path: str = None, mode: str = None):
+        self.photos_path = photos_path or os.getenv("PHOTOS_PATH", "/photos")
+        self.mode = self._resolve_mode(mode or WATCHER_MODE)
+        self._pending: Dict[str, float] = {}  # path -> monotonic time of last event
+        self._first_event = None
+        self._last_event = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._pool = None
+        self._poll_job_id = None  # One job row reused by every poll that finds changes
+
+    def _resolve_mode(self, mode: str) -> str:
+        if mode != 'auto':
+            return mode
+        fstype = mount_fstype(self.photos_path)
+        if fstype in POLLING_FILESYSTEMS:
+            logger.info(f"{self.photos_path} is on {fstype}, which doesn't deliver inotify events; using polling")
+            return 'polling'
+        return 'events'
+
+    def add(self, path: str, is_directory: bool = False):
+        """Record a changed path. Directories that appear are expanded when the batch is taken."""
+        if not is_directory and not is_supported_path(path):
+            return
+        now = time.monotonic()
+        with self._lock:
+            if not self._pending:
+                self._first_event = now
+            self._pending[path] = now
+            self._last_event = now
+
+    def stop(self):
+        self._stop.set()
+
+    def run(self):
+        """Block and ingest changes until stop() is called"""
+        logger.info(f"Watching {self.photos_path} ({self.mode} mode)")
+        # One long-lived pool keeps small batches from paying worker startup each time
+        self._pool = create_scan_pool()
+        try:
+            if self.mode == 'polling':
+                self._run_polling()
+            else:
+                self._run_events()
+        finally:
+            self._pool.shutdown()
+
+    def _run_events(self):
+        observer = Observer()
+        observer.schedule(_ChangeHandler(self), self.photos_path, recursive=True)
+        observer.start()
+        try:
+            while not self._stop.wait(0.5):
+                batch = self._take_batch()
+                if batch:
+                    self._ingest(batch)
+        finally:
+            observer.stop()
+            observer.join()
+
+    def _run_polling(self):
+        while not self._stop.is_set():
+            self._scan(scan_type="incremental")
+            self._stop.wait(WATCHER_POLL_INTERVAL)
+
+    def _take_batch(self) -> List[str]:
+        """Return the next debounced batch of files, or [] if it isn't time yet"""
+        now = time.monotonic()
+        with self._lock:
+            if not self._pending:
+                return []
+            quiet = now - self._last_event >= WATCHER_DEBOUNCE_SECONDS
+            overdue = now - self._first_event >= WATCHER_MAX_DELAY_SECONDS
+            full = len(self._pending) >= WATCHER_MAX_BATCH
+            if not (quiet or overdue or full):
+                return []
+            taken = list(self._pending)[:WATCHER_MAX_BATCH]
+            for path in taken:
+                del self._pending[path]
+            self._first_event = now if self._pending else None
+
+        candidates = []
+        for path in taken:
+            if os.path.isdir(path):
+                for root, _, files in os.walk(path):
+                    candidates.extend(os.path.join(root, f) for f in files if is_supported_path(f))
+            else:
+                candidates.append(path)
+        
+        # Files in a directory that is still being copied in settle like any other
+        batch = []
+        held_back = []
+        wall_now = time.time()
+        for path in candidates:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue  # Deleted or moved away again before we got to it
+            if wall_now - stat.st_mtime < WATCHER_SETTLE_SECONDS:
+                held_back.append(path)
+            else:
+                batch.append(path)
+
+        for path in held_back:
+            self.add(path)
+        return batch
+
+    def _ingest(self, paths: List[str]):
+        logger.info(f"Ingesting {len(paths)} changed files")
+        self._scan(scan_type="watch", paths=paths)
+
+    def _scan(self, scan_type: str, paths: List[str] = None):
+        db = next(get_db())
+        try:
+            if paths is None:
+                # Polling: don't stack a rescan on top of a scan that is still running
+                active_scan = db.query(Job).filter(
+                    Job.type == JobType.DIRECTORY_SCAN,
+                    Job.status.in_([JobStatus.PENDING, JobStatus.RUNNING])
+                ).first()
+                if active_scan:
+                    logger.debug(f"Directory scan job {active_scan.id} is still active, skipping poll")
+                    return
+            scanner = DirectoryScanner(db, pool=self._pool)
+            if paths is None:
+                # Most polls find nothing; they shouldn't leave a job behind each time
+                if not scanner.has_changes():
+                    logger.debug("No directory changes since the last poll")
+                    return
+                job_id = self._poll_job_id and scanner.reset_scan_job(self._poll_job_id, scan_type)
+                self._poll_job_id = job_id = job_id or scanner.create_scan_job(scan_type)
+            else:
+                job_id = scanner.create_scan_job(scan_type)
+            scanner.scan_directory(job_id, scan_type, paths=paths)
+        except Exception as e:
+            logger.error(f"Watcher scan failed: {str(e)}")
+        finally:
+            db.close()
\ No newline at end of file
@@ -0,0 +1,64 @@
+import os
+import logging
+from typing import Optional
+from services.disk_cache import DiskLRU, atomic_path
+
+logger = logging.getLogger(__name__)
+
+# Converted full-size renditions (HEIC/TIFF/RAW to JPEG, user-rotated photos)
+FULL_IMAGE_CACHE_PATH = os.getenv(
+    'FULL_IMAGE_CACHE_PATH', os.path.join(os.getenv("THUMBNAILS_PATH", "/app/thumbnails"), "full")
+)
+FULL_IMAGE_CACHE_MB = int(os.getenv('FULL_IMAGE_CACHE_MB', '2048'))  # 0 disables the cache
+
+class FullImageCache(DiskLRU):
+    """
+    Size-bounded disk cache of converted full-size images, keyed by
+    (photo_id, rotation_version, source mtime) so a rotation or an edited
+    original is a new entry. Least recently used files are evicted once it
+    outgrows FULL_IMAGE_CACHE_MB.
+    """
+
+    def __init__(self, path: str = FULL_IMAGE_CACHE_PATH, max_bytes: int = FULL_IMAGE_CACHE_MB * 1024 * 1024):
+        super().__init__(path, max_bytes, 'Full image cache')
+
+    def _filepath(self, photo_id: int, rotation_version: int, mtime_ns: int, extension: str) -> str:
+        return os.path.join(self.path, f"{photo_id}_v{rotation_version or 0}_{mtime_ns}.{extension}")
+
+    def get(self, photo_id: int, rotation_version: int, mtime_ns: int, extension: str) -> Optional[str]:
+        """Path of the cached rendition, or None; a hit marks the entry recently used"""
+        if not self.enabled:
+            return None
+        filepath = self._filepath(photo_id, rotation_version, mtime_ns, extension)
+        return filepath if self.touch(filepath) else None
+
+    def put(self, photo_id: int, rotation_version: int, mtime_ns: int, extension: str, content: bytes) -> Optional[str]:
+        """Store a rendition, replacing older ones for the photo. Returns its path, or None."""
+        if not self.enabled or len(content) > self.max_bytes:
+            return None
+        filepath = self._filepath(photo_id, rotation_version, mtime_ns, extension)
+        try:
+            with atomic_path(filepath) as temp_path:
+                with open(temp_path, 'wb') as f:
+                    f.write(content)
+        except OSError as e:
+            logger.warning(f"Failed to cache full image for photo {photo_id}: {e}")
+            return None
+
+        self._remove_stale(photo_id, os.path.basename(filepath))
+        self.added(len(content))
+        return filepath
+
+    def _remove_stale(self, photo_id: int, keep: str):
+        # Renditions for an earlier rotation or an older original are never requested again
+        prefix = f"{photo_id}_v"
+        for entry in os.scandir(self.path):
+            if entry.name.startswith(prefix) and entry.name != keep and not entry.name.endswith('.tmp'):
+                try:
+                    size = entry.stat().st_size
+                    os.remove(entry.path)
+                    self.removed(size)
+                except OSError:
+                    pass
+
+full_image_cache = FullImageCache()
@@ -0,0 +1,127 @@
+import os
+import mmap
+import hashlib
+import logging
+from typing import Tuple
+
+# xxhash is optional - only needed for HASH_ALGORITHM=xxh3_128
+try:
+    import xxhash
+    XXHASH_AVAILABLE = True
+except ImportError:
+    XXHASH_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Content hash used for Photo.file_hash and duplicate detection. Changing it on an
+# existing library means new hashes no longer match stored ones, so run a full
+# scan afterwards.
+HASH_ALGORITHM = os.getenv('HASH_ALGORITHM', 'sha256')  # sha256, blake2b or xxh3_128
+# 'buffered' reads into a reused buffer; 'mmap' maps large files instead
+HASH_READER = os.getenv('HASH_READER', 'buffered')
+HASH_BUFFER_SIZE = int(os.getenv('HASH_BUFFER_SIZE', str(1024 * 1024)))  # 1 MiB
+HASH_MMAP_THRESHOLD = int(os.getenv('HASH_MMAP_THRESHOLD', str(4 * 1024 * 1024)))  # 4 MiB
+# Bytes sampled from each end of the file for the prefilter fingerprint
+FINGERPRINT_SAMPLE_SIZE = int(os.getenv('FINGERPRINT_SAMPLE_SIZE', str(64 * 1024)))  # 64 KiB
+
+ALGORITHMS = ['sha256', 'blake2b', 'xxh3_128']
+
+def new_hasher(algorithm: str = None):
+    algorithm = algorithm or HASH_ALGORITHM
+    if algorithm == 'sha256':
+        return hashlib.sha256()
+    if algorithm == 'blake2b':
+        # 32-byte digest keeps the hex form at 64 chars, same as SHA-256
+        return hashlib.blake2b(digest_size=32)
+    if algorithm == 'xxh3_128':
+        if not XXHASH_AVAILABLE:
+            raise ValueError("HASH_ALGORITHM=xxh3_128 requires the xxhash package")
+        return xxhash.xxh3_128()
+    raise ValueError(f"Unsupported hash algorithm: {algorithm}")
+
+def hash_file(filepath: str, algorithm: str = None, reader: str = None) -> str:
+    """Full content hash of a file"""
+    hasher = new_hasher(algorithm)
+    reader = reader or HASH_READER
+
+    with open(filepath, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if reader == 'mmap' and size >= HASH_MMAP_THRESHOLD:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                hasher.update(mapped)
+        else:
+            # Read into one reused buffer to avoid allocating a bytes object per chunk
+            buffer = bytearray(HASH_BUFFER_SIZE)
+            view = memoryview(buffer)
+            while True:
+                n = f.readinto(buffer)
+                if not n:
+                    break
+                hasher.update(view[:n])
+
+    return hasher.hexdigest()
+
+def hash_file_sampled(filepath: str, keep: int = 0, algorithm: str = None, reader: str = None) -> Tuple[str, str, bytes]:
+    """
+    Stream a file once and return (file_hash, fingerprint, data), where data is
+    its first `keep` bytes. The fingerprint comes from the same pass and equals
+    fingerprint_file() for the file.
+    """
+    hasher = new_hasher(algorithm)
+    reader = reader or HASH_READER
+    head_size = max(keep, FINGERPRINT_SAMPLE_SIZE)
+
+    with open(filepath, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if reader == 'mmap' and size >= HASH_MMAP_THRESHOLD:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                hasher.update(mapped)
+                head = mapped[:head_size]
+                tail = mapped[-FINGERPRINT_SAMPLE_SIZE:]
+        else:
+            head = bytearray()
+            tail = b''
+            buffer = bytearray(HASH_BUFFER_SIZE)
+            view = memoryview(buffer)
+            while True:
+                n = f.readinto(buffer)
+                if not n:
+                    break
+                hasher.update(view[:n])
+                if len(head) < head_size:
+                    head += view[:min(n, head_size - len(head))]
+                # Keep the last FINGERPRINT_SAMPLE_SIZE bytes seen so far
+                if n >= FINGERPRINT_SAMPLE_SIZE:
+                    tail = bytes(view[n - FINGERPRINT_SAMPLE_SIZE:n])
+                else:
+                    tail = (tail + bytes(view[:n]))[-FINGERPRINT_SAMPLE_SIZE:]
+            head = bytes(head)
+
+    # Same tail window as fingerprint_file: never overlaps the head sample
+    tail_length = size - max(size - FINGERPRINT_SAMPLE_SIZE, FINGERPRINT_SAMPLE_SIZE)
+    fingerprint = _fingerprint(size, head[:FINGERPRINT_SAMPLE_SIZE], tail[-tail_length:] if tail_length > 0 else b'')
+    return hasher.hexdigest(), fingerprint, head[:keep]
+
+def _fingerprint(size: int, head: bytes, tail: bytes) -> str:
+    hasher = hashlib.blake2b(digest_size=16)
+    hasher.update(size.to_bytes(8, 'little'))
+    hasher.update(head)
+    hasher.update(tail)
+    return hasher.hexdigest()
+
+def fingerprint_file(filepath: str, size: int = None) -> str:
+    """
+    Cheap change-detection fingerprint: file size plus a sample from the head and
+    tail of the file. Reads at most 2 * FINGERPRINT_SAMPLE_SIZE bytes. Not a
+    substitute for hash_file - two files can share a fingerprint.
+    """
+    with open(filepath, "rb") as f:
+        if size is None:
+            size = os.fstat(f.fileno()).st_size
+        head = f.read(FINGERPRINT_SAMPLE_SIZE)
+        tail = b''
+        if size > FINGERPRINT_SAMPLE_SIZE:
+            f.seek(max(size - FINGERPRINT_SAMPLE_SIZE, FINGERPRINT_SAMPLE_SIZE))
+            tail = f.read(FINGERPRINT_SAMPLE_SIZE)
+
+    return _fingerprint(size, head, tail)
\ No newline at end of file
@@ -0,0 +1,35 @@
+import os
+import asyncio
+import logging
+import functools
+from services.worker_pools import SharedPool
+
+logger = logging.getLogger(__name__)
+
+# CPU-bound image work in the API (HEIC/TIFF/RAW conversion, on-demand
+# thumbnails) runs here, never on the event loop. 'process' (the default) is
+# needed to keep the loop responsive: Pillow holds the GIL for the whole of a
+# progressive or optimised JPEG encode, seconds for a full-size image, which
+# stalls every request in the process when run in a thread. 'thread' uses less
+# memory and suits libraries of camera JPEGs.
+IMAGE_EXECUTOR = os.getenv('IMAGE_EXECUTOR', 'process')
+# Conversions run at most this many at a time; further requests queue here
+# instead of taking threads or CPU from grid requests
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', '2'))
+
+_pool = SharedPool('image', IMAGE_WORKERS, processes=IMAGE_EXECUTOR == 'process')
+
+def image_executor():
+    """The shared executor, started on first use and replaced if a worker process died"""
+    return _pool.get()
+
+async def run_image_work(func, *args, **kwargs):
+    """
+    Await func(*args, **kwargs) on the image executor. With processes, func must
+    be a module-level function and its arguments and result picklable.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(image_executor(), functools.partial(func, *args, **kwargs))
+
+def shutdown_image_executor():
+    _pool.shutdown()
@@ -0,0 +1,133 @@
+import io
+import os
+import math
+import logging
+from typing import Tuple
+from PIL import Image
+import pillow_heif
+from services.disk_cache import DiskLRU, atomic_path
+
+# Register HEIF opener with PIL
+pillow_heif.register_heif_opener()
+
+# Try to import rawpy for RAW file support
+try:
+    import rawpy
+    RAWPY_AVAILABLE = True
+except ImportError:
+    RAWPY_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+RAW_EXTENSIONS = {'.cr3', '.cr2', '.nef', '.arw', '.dng', '.raf', '.orf'}
+
+# Set to false to decode originals at full resolution (for comparison)
+REDUCED_DECODE = os.getenv('REDUCED_DECODE', 'true').lower() == 'true'
+# Long edge of the JPEG kept for RAWs without an embedded preview, so later
+# regenerations and full-view conversions don't demosaic again (0 disables)
+RAW_INTERMEDIATE_SIZE = int(os.getenv('RAW_INTERMEDIATE_SIZE', '2048'))
+# Intermediates are a cache: least recently used ones go once they outgrow this (0 disables them)
+RAW_INTERMEDIATE_CACHE_MB = int(os.getenv('RAW_INTERMEDIATE_CACHE_MB', '4096'))
+
+raw_intermediates = DiskLRU(
+    os.path.join(os.getenv("THUMBNAILS_PATH", "/app/thumbnails"), "intermediates"),
+    RAW_INTERMEDIATE_CACHE_MB * 1024 * 1024, 'RAW intermediate cache'
+)
+
+def raw_intermediate_path(file_hash: str) -> str:
+    return os.path.join(raw_intermediates.path, f"{file_hash}.jpg")
+
+def fitted_size(size: Tuple[int, int], max_size: int) -> Tuple[int, int]:
+    """Size of an image of `size` once fitted inside a max_size x max_size box"""
+    scale = min(max_size / max(size), 1.0)
+    return max(1, math.ceil(size[0] * scale)), max(1, math.ceil(size[1] * scale))
+
+def open_image(filepath: str, max_size: int = None, file_hash: str = None) -> Image.Image:
+    """
+    Open a photo for resizing. With max_size, the image is decoded at the
+    smallest scale that still covers a max_size box: JPEGs (including the
+    previews embedded in RAW files) via draft(), which has libjpeg scale by
+    1/2, 1/4 or 1/8 while decoding; other formats are loaded and immediately
+    shrunk with reduce() so rotation, conversion and copies work on the
+    small image. With file_hash, RAWs are opened through their cached
+    intermediate (see open_raw).
+    """
+    if os.path.splitext(filepath)[1].lower() in RAW_EXTENSIONS and RAWPY_AVAILABLE:
+        img = open_raw(filepath, file_hash)
+    else:
+        img = Image.open(filepath)
+
+    if max_size and REDUCED_DECODE:
+        img = reduce_on_load(img, max_size)
+    return img
+
+def reduce_on_load(img: Image.Image, max_size: int) -> Image.Image:
+    target = fitted_size(img.size, max_size)
+    if img.format == 'JPEG':
+        # Must run before the first load(); draft keeps both sides >= target
+        img.draft(None, target)
+        return img
+
+    # Load first: oriented TIFFs are transposed (and change size) while loading
+    img.load()
+    target = fitted_size(img.size, max_size)
+    factor = min(img.width // target[0], img.height // target[1])
+    # reduce() has no palette, bilevel or 16-bit support; those are rarely large
+    if factor < 2 or img.mode in ('P', '1', 'I;16'):
+        return img
+    exif = img.getexif()
+    reduced = img.reduce(factor)
+    # TIFF keeps EXIF in its tag directory, which the reduced copy doesn't have
+    if exif:
+        reduced.info['exif'] = exif.tobytes()
+    img.close()
+    return reduced
+
+def open_raw(filepath: str, file_hash: str = None, half_size: bool = True) -> Image.Image:
+    """
+    Use the camera's embedded JPEG when there is one, else demosaic (at half
+    size unless asked otherwise). With file_hash, a demosaiced RAW is kept as
+    a RAW_INTERMEDIATE_SIZE JPEG and opened from there from then on.
+    """
+    if not RAWPY_AVAILABLE:
+        return Image.open(filepath)
+
+    intermediate = raw_intermediate_path(file_hash) \
+        if file_hash and RAW_INTERMEDIATE_SIZE and raw_intermediates.enabled else None
+    if intermediate and raw_intermediates.touch(intermediate):
+        try:
+            img = Image.open(intermediate)
+            logger.debug(f"Using cached intermediate for {filepath}")
+            return img
+        except OSError:
+            pass  # Evicted by another process since; decode again
+
+    try:
+        with rawpy.imread(filepath) as raw:
+            try:
+                thumb = raw.extract_thumb()
+                if thumb.format == rawpy.ThumbFormat.JPEG:
+                    logger.debug(f"Using embedded JPEG thumbnail for {filepath}")
+                    return Image.open(io.BytesIO(thumb.data))
+            except Exception as e:
+                logger.debug(f"No embedded thumbnail, processing RAW: {e}")
+            logger.debug(f"Processing RAW data for {filepath}")
+            img = Image.fromarray(raw.postprocess(use_camera_wb=True, half_size=half_size))
+    except Exception as e:
+        logger.warning(f"Failed to process RAW file {filepath} with rawpy: {e}, falling back to PIL")
+        return Image.open(filepath)
+
+    if intermediate:
+        _write_intermediate(img, intermediate)
+    return img
+
+def _write_intermediate(img: Image.Image, path: str):
+    """Save a high-quality reduced copy; already upright, as rawpy applies the RAW's orientation"""
+    try:
+        intermediate = img.copy()
+        intermediate.thumbnail((RAW_INTERMEDIATE_SIZE, RAW_INTERMEDIATE_SIZE), Image.Resampling.LANCZOS)
+        with atomic_path(path) as temp_path:
+            intermediate.save(temp_path, 'JPEG', quality=92, subsampling=0)
+        raw_intermediates.added(os.path.getsize(path))
+    except Exception as e:
+        logger.warning(f"Failed to write RAW intermediate {path}: {e}")
\ No newline at end of file
@@ -0,0 +1,224 @@
+import io
+import os
+import time
+import logging
+from datetime import datetime
+from typing import BinaryIO, Dict, Optional, Tuple, Union
+from PIL import Image, ImageOps
+from PIL.ExifTags import TAGS
+import magic
+import pillow_heif
+from services.hashing import hash_file_sampled, fingerprint_file
+from services.image_loader import reduce_on_load
+from services.disk_cache import atomic_path
+
+# Register HEIF opener so HEIC metadata can be read in pool workers
+pillow_heif.register_heif_opener()
+
+logger = logging.getLogger(__name__)
+
+# Per-file ingest work for the scanner pipeline. These are module-level functions
+# on plain values so they can run inside ProcessPoolExecutor workers; results are
+# returned as small dicts for the scanner's single DB writer.
+
+# Files up to this size are kept in memory while they are hashed, so MIME
+# sniffing, EXIF and the preview below need no further reads
+INGEST_BUFFER_LIMIT = int(os.getenv('INGEST_BUFFER_LIMIT', str(32 * 1024 * 1024)))  # 32 MiB
+# For larger files only this much of the head is kept for MIME sniffing
+INGEST_HEADER_BYTES = int(os.getenv('INGEST_HEADER_BYTES', str(1024 * 1024)))  # 1 MiB
+# Write a reduced copy of new JPEGs for the thumbnail worker to start from
+INGEST_PREVIEWS = os.getenv('INGEST_PREVIEWS', 'true').lower() == 'true'
+INGEST_PREVIEW_SIZE = int(os.getenv('INGEST_PREVIEW_SIZE', '1200'))  # Largest thumbnail size
+# Previews left this long were never consumed (thumbnail batch failed or never ran)
+INGEST_PREVIEW_MAX_AGE_HOURS = float(os.getenv('INGEST_PREVIEW_MAX_AGE_HOURS', '24'))
+
+def preview_path(file_hash: str) -> str:
+    """Where ingest leaves the reduced preview for a file, keyed by content hash"""
+    thumbnails_path = os.getenv("THUMBNAILS_PATH", "/app/thumbnails")
+    return os.path.join(thumbnails_path, "previews", f"{file_hash}.jpg")
+
+def ingest_file(filepath: str, file_size: int, known: Optional[Tuple[str, str]] = None,
+                preview: bool = True) -> Dict:
+    """
+    Hash, MIME-sniff and extract metadata for one file, reading it only once.
+
+    The hashing pass keeps the file's bytes (or its head, for large files) in
+    memory, and MIME detection and EXIF parsing run on that buffer. Large files
+    have their metadata read from disk again, which is served from the page
+    cache the hashing pass just filled.
+
+    known is the (fingerprint, file_hash) pair recorded in the manifest for this
+    path, if any. When the stat changed but the cheap fingerprint still matches
+    (touch, restore from backup, new inode), the recorded hash is reused instead
+    of reading the whole file again.
+    
+    preview is False when the scanner already knows the path as a photo, so
+    the content is almost certainly in the library and needs no preview.
+    """
+    result = {
+        'filepath': filepath,
+        'file_size': file_size,
+        'file_hash': None,
+        'fingerprint': None,
+        'hash_reused': False,
+        'preview': None,
+        'error': None
+    }
+
+    try:
+        keep = file_size if file_size <= INGEST_BUFFER_LIMIT else INGEST_HEADER_BYTES
+        data = None
+        if known and known[1]:
+            fingerprint = fingerprint_file(filepath, file_size)
+            if known[0] == fingerprint:
+                result['fingerprint'] = fingerprint
+                result['file_hash'] = known[1]
+                result['hash_reused'] = True
+                with open(filepath, "rb") as f:
+                    data = f.read(keep)
+        if data is None:
+            result['file_hash'], result['fingerprint'], data = hash_file_sampled(filepath, keep)
+
+        in_memory = len(data) >= file_size
+        result['mime_type'] = magic.from_buffer(data[:INGEST_HEADER_BYTES], mime=True)
+        result['metadata'], result['date_taken'] = extract_metadata(
+            io.BytesIO(data) if in_memory else filepath, filepath
+        )
+        # A reused hash means the content is already known, and so are its thumbnails
+        if INGEST_PREVIEWS and preview and in_memory and not result['hash_reused']:
+            result['preview'] = write_preview(data, result['file_hash'])
+    except Exception as e:
+        result['error'] = str(e)
+
+    return result
+
+def write_preview(data: bytes, file_hash: str) -> Optional[str]:
+    """
+    Save an upright JPEG no larger than INGEST_PREVIEW_SIZE from an in-memory
+    JPEG, or return None when that isn't cheap. draft() makes the decoder scale
+    by 1/2 to 1/8 while decoding, so large photos are never decoded in full.
+    """
+    path = preview_path(file_hash)
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            if img.format != 'JPEG' or max(img.size) <= INGEST_PREVIEW_SIZE:
+                return None
+            img = reduce_on_load(img, INGEST_PREVIEW_SIZE)
+            preview = ImageOps.exif_transpose(img) or img
+            if preview.mode not in ('RGB', 'L'):
+                preview = preview.convert('RGB')
+            preview.thumbnail((INGEST_PREVIEW_SIZE, INGEST_PREVIEW_SIZE), Image.Resampling.LANCZOS)
+
+            with atomic_path(path) as temp_path:
+                preview.save(temp_path, 'JPEG', quality=95)
+        return path
+    except Exception as e:
+        logger.warning(f"Could not write preview for {file_hash}: {str(e)}")
+        return None
+
+def sweep_previews(max_age_hours: float = INGEST_PREVIEW_MAX_AGE_HOURS) -> int:
+    """Delete previews (and partial writes) older than max_age_hours; returns how many"""
+    directory = os.path.dirname(preview_path('x'))
+    cutoff = time.time() - max_age_hours * 3600
+    removed = 0
+    try:
+        entries = list(os.scandir(directory))
+    except OSError:
+        return 0
+    for entry in entries:
+        try:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+                removed += 1
+        except OSError:
+            pass
+    if removed:
+        logger.info(f"Removed {removed} unused ingest previews")
+    return removed
+
+# EXIF orientations 5-8 are rotated a quarter turn, so displayed width/height swap
+TRANSPOSED_ORIENTATIONS = {5, 6, 7, 8}
+
+def extract_metadata(source: Union[str, BinaryIO], filepath: str = None) -> Tuple[Dict, datetime]:
+    """
+    Read dimensions and EXIF from the file headers only. Image.open is lazy and
+    nothing here calls load(), so pixel data is never decoded. source is a path
+    or an in-memory copy of the file; filepath names it in log messages.
+    """
+    metadata = {}
+    date_taken = None
+    filepath = filepath or source
+
+    try:
+        with Image.open(source) as img:
+            # Get original dimensions before any rotation
+            metadata["width"] = img.width
+            metadata["height"] = img.height
+            metadata["format"] = img.format
+
+            # Extract EXIF data
+            exifdata = read_exif(img)
+            if exifdata:
+                # Check for orientation tag (0x0112)
+                orientation = exifdata.get(0x0112, 1)
+                metadata["original_orientation"] = orientation
+
+                # Derive the displayed dimensions from the orientation tag
+                # instead of transposing the decoded image
+                if orientation in (2, 3, 4, 5, 6, 7, 8):
+                    if orientation in TRANSPOSED_ORIENTATIONS:
+                        metadata["width"], metadata["height"] = img.height, img.width
+                    metadata["orientation_corrected"] = True
+
+                    # Calculate rotation applied
+                    rotation_map = {
+                        3: 180,  # Rotate 180
+                        6: 270,  # Rotate 270 CW (or 90 CCW)
+                        8: 90    # Rotate 90 CW (or 270 CCW)
+                    }
+                    metadata["rotation_applied"] = rotation_map.get(orientation, 0)
+
+                for tag_id, value in exifdata.items():
+                    tag = TAGS.get(tag_id, tag_id)
+                    # Convert all values to strings for JSON serialization
+                    # Limit string length to prevent huge metadata
+                    if value:
+                        str_value = str(value)
+                        # Remove NUL characters that PostgreSQL can't handle
+                        str_value = str_value.replace('\x00', '')
+                        if len(str_value) > 1000:
+                            str_value = str_value[:1000] + "..."
+                        metadata[tag] = str_value
+                    else:
+                        metadata[tag] = None
+
+                # Parse date taken separately (not stored in metadata_json)
+                date_str = metadata.get("DateTimeOriginal") or metadata.get("DateTime")
+                if date_str:
+                    try:
+                        date_taken = datetime.strptime(date_str, "%Y:%m:%d %H:%M:%S")
+                        metadata["date_taken"] = date_str  # Keep string version in metadata
+                    except:
+                        pass
+
+                # Extract camera info (ensure no NUL characters)
+                make = metadata.get("Make")
+                model = metadata.get("Model")
+                metadata["make"] = make.replace('\x00', '') if make else None
+                metadata["model"] = model.replace('\x00', '') if model else None
+
+    except Exception as e:
+        logger.error(f"Error extracting metadata from {filepath}: {str(e)}")
+
+    # Return metadata dict and separate date_taken
+    return metadata, date_taken
+
+def read_exif(img: Image.Image) -> Image.Exif:
+    if img.format == 'PNG':
+        # PngImageFile.getexif() loads the whole image when there is no eXIf
+        # chunk before the pixel data; only use EXIF that is already parsed
+        exif = Image.Exif()
+        if img.info.get("exif"):
+            exif.load(img.info["exif"])
+        return exif
+    return img.getexif()
\ No newline at end of file
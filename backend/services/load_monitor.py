@@ -0,0 +1,182 @@
+import os
+import json
+import time
+import asyncio
+import logging
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+# Redis hash holding one snapshot per API process, keyed by pid
+API_LOAD_KEY = 'bokeh:api_load'
+API_LOAD_PUBLISH_SECONDS = float(os.getenv('API_LOAD_PUBLISH_SECONDS', '1'))
+# Polled by the UI regardless of whether anyone is browsing, so not interactive load
+UNTRACKED_PATH_PREFIXES = ('/api/v1/jobs', '/api/v1/system')
+
+# Thumbnail throttling: the pause before each photo at full pressure
+THROTTLE_MAX_DELAY_SECONDS = float(os.getenv('THROTTLE_MAX_DELAY_SECONDS', '2'))
+# Mean API latency that counts as fully loaded
+THROTTLE_API_LATENCY_MS = float(os.getenv('THROTTLE_API_LATENCY_MS', '250'))
+# Concurrent API requests that count as fully loaded
+THROTTLE_API_IN_FLIGHT = int(os.getenv('THROTTLE_API_IN_FLIGHT', '8'))
+# Any interactive request at all means someone is browsing: back off at least this much
+THROTTLE_API_ACTIVE_PRESSURE = float(os.getenv('THROTTLE_API_ACTIVE_PRESSURE', '0.25'))
+# 1-minute load per CPU above which the host counts as busy
+THROTTLE_HOST_LOAD = float(os.getenv('THROTTLE_HOST_LOAD', '1.0'))
+# Host load only counts while someone has used the API this recently; otherwise
+# it is mostly the import's own workers, which shouldn't slow themselves down
+THROTTLE_ACTIVITY_WINDOW_SECONDS = float(os.getenv('THROTTLE_ACTIVITY_WINDOW_SECONDS', '60'))
+# Queued Celery tasks that count as a bulk backlog; shallow queues throttle at most half
+THROTTLE_QUEUE_DEPTH = int(os.getenv('THROTTLE_QUEUE_DEPTH', '10'))
+
+# Celery's Redis transport keeps one list per priority step
+CELERY_QUEUE_KEYS = ['celery'] + [f'celery\x06\x16{step}' for step in (3, 6, 9)]
+
+class RequestStats:
+    """In-process API request counters, reset each time they are published"""
+
+    def __init__(self):
+        self.in_flight = 0
+        self._reset()
+
+    def _reset(self):
+        self.peak_in_flight = self.in_flight
+        self.requests = 0
+        self.total_latency = 0.0
+
+    def tracks(self, path: str) -> bool:
+        return not path.startswith(UNTRACKED_PATH_PREFIXES)
+
+    def started(self) -> float:
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        return time.monotonic()
+
+    def finished(self, started: float):
+        self.in_flight -= 1
+        self.requests += 1
+        self.total_latency += time.monotonic() - started
+
+    def snapshot(self) -> Dict:
+        """Counters since the previous snapshot"""
+        snapshot = {
+            'ts': time.time(),
+            'requests': self.requests,
+            'in_flight': self.peak_in_flight,
+            'latency_ms': self.total_latency / self.requests * 1000 if self.requests else 0.0
+        }
+        self._reset()
+        return snapshot
+
+request_stats = RequestStats()
+
+async def publish_request_stats():
+    """Run in the API process: publish request_stats to Redis until cancelled"""
+    import redis.asyncio as aioredis
+
+    client = aioredis.from_url(REDIS_URL)
+    field = str(os.getpid())
+    try:
+        while True:
+            await asyncio.sleep(API_LOAD_PUBLISH_SECONDS)
+            try:
+                await client.hset(API_LOAD_KEY, field, json.dumps(request_stats.snapshot()))
+                await client.expire(API_LOAD_KEY, int(API_LOAD_PUBLISH_SECONDS * 5) + 1)
+            except Exception as e:
+                logger.debug(f"Could not publish API load: {e}")
+    finally:
+        await client.close()
+
+class LoadThrottle:
+    """
+    Paces bulk thumbnail work against interactive use. Pressure (0-1) is the
+    highest of the API signal published by the API processes and host load,
+    scaled down when the Celery queue is shallow (a handful of new imports
+    should appear promptly). Host load only counts while the API has seen
+    interactive requests recently. The per-photo delay follows pressure
+    smoothly, so workers run flat-out when nobody is browsing.
+    """
+
+    def __init__(self):
+        self._redis = None
+        self._signals = {}
+        self._signals_at = 0.0
+        self._active_at = None  # Monotonic time interactive requests were last seen
+        self.delay = 0.0
+
+    def _client(self):
+        if self._redis is None:
+            import redis
+            self._redis = redis.Redis.from_url(REDIS_URL, socket_timeout=0.5, socket_connect_timeout=0.5)
+        return self._redis
+
+    def signals(self) -> Dict:
+        """Current load signals, re-read at most once per publish interval"""
+        now = time.monotonic()
+        if now - self._signals_at < API_LOAD_PUBLISH_SECONDS:
+            return self._signals
+        self._signals_at = now
+
+        # interactive stays None when Redis can't be read: activity is unknown
+        signals = {'requests': 0, 'in_flight': 0, 'latency_ms': 0.0, 'queue_depth': None, 'interactive': None}
+        try:
+            signals['load_per_cpu'] = os.getloadavg()[0] / (os.cpu_count() or 1)
+        except OSError:
+            signals['load_per_cpu'] = 0.0
+
+        try:
+            pipe = self._client().pipeline()
+            pipe.hvals(API_LOAD_KEY)
+            for key in CELERY_QUEUE_KEYS:
+                pipe.llen(key)
+            snapshots, *queue_lengths = pipe.execute()
+            signals['queue_depth'] = sum(queue_lengths)
+
+            # Snapshots from API processes that stopped publishing are ignored
+            fresh_after = time.time() - API_LOAD_PUBLISH_SECONDS * 3
+            for raw in snapshots:
+                snapshot = json.loads(raw)
+                if snapshot['ts'] < fresh_after:
+                    continue
+                signals['requests'] += snapshot['requests']
+                signals['in_flight'] += snapshot['in_flight']
+                signals['latency_ms'] = max(signals['latency_ms'], snapshot['latency_ms'])
+            
+            if signals['requests'] or signals['in_flight']:
+                self._active_at = now
+            signals['interactive'] = self._active_at is not None \
+                and now - self._active_at < THROTTLE_ACTIVITY_WINDOW_SECONDS
+        except Exception as e:
+            # Without Redis, host load alone still applies
+            logger.debug(f"Could not read load signals: {e}")
+
+        self._signals = signals
+        return signals
+
+    def pressure(self, signals: Dict) -> float:
+        api = 0.0
+        if signals['requests'] or signals['in_flight']:
+            api = max(
+                THROTTLE_API_ACTIVE_PRESSURE,
+                signals['latency_ms'] / THROTTLE_API_LATENCY_MS,
+                signals['in_flight'] / THROTTLE_API_IN_FLIGHT
+            )
+        # Without recent API use, busy CPUs are the bulk work itself, not contention
+        host = signals['load_per_cpu'] - THROTTLE_HOST_LOAD if signals['interactive'] is not False else 0.0
+        pressure = min(max(api, host, 0.0), 1.0)
+
+        if signals['queue_depth'] is not None:
+            backlog = min(signals['queue_depth'] / THROTTLE_QUEUE_DEPTH, 1.0)
+            pressure *= 0.5 + 0.5 * backlog
+        return pressure
+
+    def pause(self):
+        """Sleep before starting the next photo; returns at once when idle"""
+        target = self.pressure(self.signals()) * THROTTLE_MAX_DELAY_SECONDS
+        # Ease towards the target so a single slow request doesn't stall the batch
+        self.delay = target if target < 0.01 and self.delay < 0.01 else (self.delay + target) / 2
+        if self.delay >= 0.01:
+            time.sleep(self.delay)
+
+throttle = LoadThrottle()
\ No newline at end of file
@@ -1,26 +1,67 @@
 import os
-import hashlib
 import logging
+import queue
+import threading
+import time
+from concurrent.futures import Executor, wait, FIRST_COMPLETED
+from contextlib import nullcontext
 from datetime import datetime
-from sqlalchemy.orm import Session
-from models import Photo, Job, JobType, JobStatus, Folder
-from PIL import Image
-from PIL.ExifTags import TAGS
-import magic
-from typing import Optional, List
+from sqlalchemy import select, update, case, func, literal, or_
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from models import Photo, Job, JobType, JobStatus, Folder, FileState, Thumbnail
+from services.ingest import ingest_file, sweep_previews
+from services.hashing import HASH_ALGORITHM
+from services.worker_pools import create_pool
+from typing import Optional, List, Dict, Tuple, Iterator
 
 logger = logging.getLogger(__name__)
 
+# Ingest pipeline configuration
+SCAN_WORKERS = int(os.getenv('SCAN_WORKERS', str(os.cpu_count() or 4)))  # Hash/MIME/EXIF workers
+SCAN_QUEUE_SIZE = int(os.getenv('SCAN_QUEUE_SIZE', '1000'))  # Walker -> pool queue bound
+SCAN_MAX_IN_FLIGHT = int(os.getenv('SCAN_MAX_IN_FLIGHT', str(SCAN_WORKERS * 4)))  # Files submitted but not collected
+SCAN_BATCH_SIZE = int(os.getenv('SCAN_BATCH_SIZE', '100'))  # Results per writer transaction
+
+# Thumbnail work is handed to Celery in batches of this many photos...
+THUMBNAIL_BATCH_SIZE = int(os.getenv('THUMBNAIL_BATCH_SIZE', '40'))
+# ...or whatever has accumulated after this many seconds, so a slow scan still shows thumbnails
+THUMBNAIL_FLUSH_SECONDS = float(os.getenv('THUMBNAIL_FLUSH_SECONDS', '5'))
+
+# Directory mtimes newer than this at scan time are not recorded (racy-mtime guard)
+DIR_MTIME_SETTLE_NS = int(os.getenv('DIR_MTIME_SETTLE_SECONDS', '2')) * 1_000_000_000
+
+def create_scan_pool() -> Executor:
+    """Worker pool for the ingest stage (hash, MIME, EXIF)"""
+    return create_pool('scan', SCAN_WORKERS)
+
+SUPPORTED_EXTENSIONS = {
+    '.jpg', '.jpeg', '.png', '.gif', '.bmp', 
+    '.tiff', '.tif', '.webp', '.heic', '.heif',
+    '.cr3', '.cr2', '.nef', '.arw', '.dng', '.raf', '.orf'
+}
+
 class DirectoryScanner:
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, pool: Optional[Executor] = None):
         self.db = db
+        self.pool = pool  # Long-lived worker pool to reuse instead of starting one per scan
         self.photos_path = os.getenv("PHOTOS_PATH", "/photos")
-        self.supported_extensions = {
-            '.jpg', '.jpeg', '.png', '.gif', '.bmp', 
-            '.tiff', '.tif', '.webp', '.heic', '.heif',
-            '.cr3', '.cr2', '.nef', '.arw', '.dng', '.raf', '.orf'
-        }
+        self.supported_extensions = SUPPORTED_EXTENSIONS
         self.thumbnail_job_id = None  # Track thumbnail job
+        self._thumbnail_buffer = []  # Photo IDs waiting to be dispatched
+        self._thumbnail_flushed_at = time.monotonic()
+        self._pending_file_states = []  # Manifest rows waiting to be written
+        self._pending_folder_states = []  # (relative_path, dir_state) waiting to be written
+        self._folder_ids = {}  # relative_path -> Folder.id, loaded once per run
+        self._new_folders = set()  # relative_paths seen this run with no Folder row yet
+        self._photos_added = 0
+        self._folders_added = 0
+        self._library_max_photo_id = 0  # Highest photo id when the scan started
+        self._pruned_directories = 0
+        self._directories = {}  # relative_path -> in-progress directory state
+        self._stats = {'skipped': 0, 'reprocessed': 0, 'failed': 0, 'hashes_reused': 0}
+        self._current_file = None
+        self._walk_progress = {'listed_dirs': 0, 'files': 0, 'backlog': 0, 'finished': False}
     
     def create_scan_job(self, scan_type: str) -> int:
         job = Job(
@@ -32,7 +73,27 @@ class DirectoryScanner:
         self.db.commit()
         return job.id
     
-    def scan_directory(self, job_id: int, scan_type: str = "incremental"):
+    def reset_scan_job(self, job_id: int, scan_type: str) -> Optional[int]:
+        """Make a finished scan job pending again to run another scan; None if it is gone or active"""
+        job = self.db.query(Job).filter(
+            Job.id == job_id,
+            Job.status.in_([JobStatus.COMPLETED, JobStatus.FAILED])
+        ).first()
+        if not job:
+            return None
+        job.status = JobStatus.PENDING
+        job.progress = 0
+        job.processed_items = 0
+        job.total_items = 0
+        job.error_message = None
+        job.result = None
+        job.completed_at = None
+        job.payload = {"scan_type": scan_type}
+        self.db.commit()
+        return job.id
+    
+    def scan_directory(self, job_id: int, scan_type: str = "incremental", paths: Optional[List[str]] = None):
+        """Run a scan job. With paths, only those files are checked (used by the file watcher)."""
         job = self.db.query(Job).filter(Job.id == job_id).first()
         if not job:
             logger.error(f"Job {job_id} not found")
@@ -43,10 +104,9 @@ class DirectoryScanner:
             job.started_at = datetime.utcnow()
             self.db.commit()
             
-            # Create thumbnail job at the start
-            self._create_thumbnail_job()
-            
-            if scan_type == "full":
+            if paths is not None:
+                self._scan_paths(job, paths)
+            elif scan_type == "full":
                 self._full_scan(job)
             else:
                 self._incremental_scan(job)
@@ -56,224 +116,756 @@ class DirectoryScanner:
             job.progress = 100
             self.db.commit()
             
-            # Mark thumbnail job as completed if it exists
+            # Batches complete the thumbnail job as they finish; only close it
+            # here if they already have, or there was nothing to generate
             if self.thumbnail_job_id:
-                thumb_job = self.db.query(Job).filter(Job.id == self.thumbnail_job_id).first()
-                if thumb_job and thumb_job.status != JobStatus.COMPLETED:
-                    thumb_job.status = JobStatus.COMPLETED
-                    thumb_job.completed_at = datetime.utcnow()
-                    thumb_job.progress = 100
-                    self.db.commit()
+                from tasks.thumbnails import complete_job_if_done
+                complete_job_if_done(self.db, self.thumbnail_job_id)
+                self.db.commit()
             
         except Exception as e:
             logger.error(f"Scan failed: {str(e)}")
+            self.db.rollback()
+            # Photos written before the failure still need their thumbnails
+            self._flush_thumbnails()
             job.status = JobStatus.FAILED
             job.error_message = str(e)
             job.completed_at = datetime.utcnow()
             self.db.commit()
     
-    def _full_scan(self, job: Job):
-        logger.info(f"Starting full scan of {self.photos_path}")
+    def _full_scan(self, job: Job, incremental: bool = False):
+        logger.info(f"Starting {'incremental' if incremental else 'full'} scan of {self.photos_path}")
         
-        # Count total files first
-        total_files = 0
-        for root, dirs, files in os.walk(self.photos_path):
-            total_files += len([f for f in files if self._is_supported_file(f)])
+        # Incremental scans prune directories whose mtime is unchanged and skip
+        # files whose stat matches the manifest
+        folder_states = self._load_folder_states() if incremental else {}
+        manifest = self._load_manifest() if incremental else {}
         
-        job.total_items = total_files
+        self._run_scan(job, self._walk(folder_states), manifest)
+    
+    def _scan_paths(self, job: Job, paths: List[str]):
+        logger.info(f"Checking {len(paths)} changed files")
+        self._run_scan(job, self._group_paths(paths), self._load_manifest(paths), scan_paths=paths)
+    
+    def _run_scan(self, job: Job, directories: Iterator[Tuple[str, str, List[str], Optional[Dict], int]],
+                  manifest: Dict[str, Tuple], scan_paths: Optional[List[str]] = None):
+        # The walk streams straight into processing; total_items starts as an
+        # estimate and becomes exact once the walker has finished
+        job.total_items = 0
+        job.payload = {**(job.payload or {}), 'total_estimated': True}
         self.db.commit()
+        self._load_folder_index()
+        photo_paths = self._load_photo_paths(scan_paths)
+        self._library_max_photo_id = self.db.query(func.max(Photo.id)).scalar() or 0
         
-        processed = 0
-        for root, dirs, files in os.walk(self.photos_path):
-            # Update or create folder
-            relative_path = os.path.relpath(root, self.photos_path)
-            folder = self._update_folder(root, relative_path)
-            
-            for filename in files:
-                if not self._is_supported_file(filename):
+        # Walker thread -> bounded queue -> worker pool -> single DB writer (this thread)
+        work_queue = queue.Queue(maxsize=SCAN_QUEUE_SIZE)
+        stop = threading.Event()
+        walker = threading.Thread(
+            target=self._feed_candidates,
+            args=(directories, manifest, photo_paths, work_queue, stop),
+            name="scan-walker",
+            daemon=True
+        )
+        walker.start()
+        try:
+            self._run_pipeline(job, work_queue)
+        finally:
+            stop.set()
+            walker.join()
+        
+        self._flush_thumbnails()
+        self._flush_file_states()
+        try:
+            self._create_folders()
+        except Exception as e:
+            logger.error(f"Failed to create folders: {str(e)}")
+            self.db.rollback()
+        # A watcher batch that added no photos can't have changed any folder totals,
+        # but folders it created still need theirs (possibly zero) filled in
+        if self._photos_added or self._folders_added or scan_paths is None:
+            self._refresh_folder_stats()
+        sweep_previews()
+        
+        summary = {
+            'skipped': self._stats['skipped'],
+            'reprocessed': self._stats['reprocessed'],
+            'failed': self._stats['failed'],
+            'hashes_reused': self._stats['hashes_reused'],
+            'pruned_directories': self._pruned_directories,
+            'workers': SCAN_WORKERS,
+            'hash_algorithm': HASH_ALGORITHM
+        }
+        job.payload = {**(job.payload or {}), **summary}
+        job.result = summary
+        self.db.commit()
+        logger.info(
+            f"Scan finished: {summary['reprocessed']} files processed, {summary['skipped']} unchanged files skipped, "
+            f"{summary['failed']} failed, {summary['pruned_directories']} unchanged directories pruned"
+        )
+    
+    def _feed_candidates(self, directories: Iterator[Tuple[str, str, List[str], Optional[Dict], int]],
+                         manifest: Dict[str, Tuple], photo_paths: set, work_queue: queue.Queue,
+                         stop: threading.Event):
+        """Walker stage: walk the tree, stat files and queue the ones that need ingesting. Never touches the DB."""
+        def put(item) -> bool:
+            # Block while the queue is full (backpressure) unless the scan is aborted
+            while not stop.is_set():
+                try:
+                    work_queue.put(item, timeout=0.5)
+                    return True
+                except queue.Full:
                     continue
+            return False
+        
+        try:
+            for root, relative_path, files, dir_state, backlog in directories:
+                files = [f for f in files if self._is_supported_file(f)]
+                if not put(('dir', root, relative_path, dir_state, len(files), backlog)):
+                    return
                 
-                filepath = os.path.join(root, filename)
+                skipped = 0
+                vanished = 0
+                for filename in files:
+                    filepath = os.path.join(root, filename)
+                    try:
+                        stat = os.stat(filepath)
+                    except OSError as e:
+                        logger.warning(f"Could not stat {filepath}: {e}")
+                        vanished += 1
+                        continue
+                    
+                    file_state = (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+                    known = manifest.get(filepath)
+                    if known and known[:3] == file_state:
+                        skipped += 1
+                        continue
+                    
+                    # Recorded (fingerprint, file_hash) lets the worker skip the full hash
+                    known_content = known[3:] if known else None
+                    # Only content new to the library needs a preview for its thumbnails;
+                    # a path already recorded or already a photo is existing content
+                    preview = known is None and filepath not in photo_paths
+                    if not put(('file', filepath, filename, relative_path, file_state, known_content, preview)):
+                        return
                 
-                # Update job payload with current file
-                if not job.payload:
-                    job.payload = {}
-                job.payload['current_file'] = filename
+                if not put(('dir_done', relative_path, skipped, vanished)):
+                    return
+        except Exception as e:
+            logger.error(f"Scan walker failed: {str(e)}")
+        finally:
+            put(None)
+    
+    def _run_pipeline(self, job: Job, work_queue: queue.Queue):
+        """Feed queued files to the worker pool and write results in batches"""
+        in_flight = {}
+        batch = []
+        walker_done = False
+        
+        with self._create_pool() as pool:
+            while not walker_done or in_flight or batch:
+                # Pull work while the pool has room; block only when it is idle
+                while not walker_done and len(in_flight) < SCAN_MAX_IN_FLIGHT:
+                    try:
+                        item = work_queue.get(block=not in_flight)
+                    except queue.Empty:
+                        break
+                    
+                    if item is None:
+                        walker_done = True
+                        self._walk_progress['finished'] = True
+                        self._update_progress(job)
+                    elif item[0] == 'dir':
+                        _, root, relative_path, dir_state, file_count, backlog = item
+                        self._open_directory(root, relative_path, dir_state)
+                        self._walk_progress['listed_dirs'] += 1
+                        self._walk_progress['files'] += file_count
+                        self._walk_progress['backlog'] = backlog
+                    elif item[0] == 'dir_done':
+                        _, relative_path, skipped, vanished = item
+                        self._directories[relative_path]['walked'] = True
+                        self._stats['skipped'] += skipped
+                        # Files that disappeared before they could be stat'ed don't count
+                        self._walk_progress['files'] -= vanished
+                        self._update_progress(job)
+                    else:
+                        _, filepath, filename, relative_path, file_state, known_content, preview = item
+                        future = pool.submit(ingest_file, filepath, file_state[0], known_content, preview)
+                        in_flight[future] = (filepath, filename, relative_path, file_state)
+                        self._directories[relative_path]['pending'] += 1
                 
-                self._process_photo(filepath, filename, relative_path, folder)
+                if in_flight:
+                    done, _ = wait(in_flight, timeout=0.5, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        filepath, filename, relative_path, file_state = in_flight.pop(future)
+                        try:
+                            result = future.result()
+                        except Exception as e:
+                            result = {'filepath': filepath, 'file_hash': None, 'error': str(e)}
+                        result.update(filename=filename, relative_path=relative_path, file_state=file_state)
+                        batch.append(result)
+                        self._current_file = filename
                 
-                processed += 1
-                job.processed_items = processed
-                job.progress = (processed / total_files) * 100 if total_files > 0 else 0
+                # Write when a batch is full or the pool has drained
+                if batch and (len(batch) >= SCAN_BATCH_SIZE or not in_flight):
+                    self._write_batch(batch)
+                    batch = []
+                    self._update_progress(job)
                 
-                if processed % 10 == 0:  # Update progress every 10 files
-                    self.db.commit()
-                else:
-                    # Still update current file in DB more frequently
-                    self.db.flush()
+                self._close_finished_directories()
+                if time.monotonic() - self._thumbnail_flushed_at >= THUMBNAIL_FLUSH_SECONDS:
+                    self._flush_thumbnails()
     
-    def _incremental_scan(self, job: Job):
-        logger.info(f"Starting incremental scan of {self.photos_path}")
-        # TODO: Implement incremental scan that only processes new/changed files
-        self._full_scan(job)  # For now, just do a full scan
+    def _create_pool(self):
+        if self.pool is not None:
+            return nullcontext(self.pool)
+        return create_scan_pool()
     
-    def _is_supported_file(self, filename: str) -> bool:
-        return any(filename.lower().endswith(ext) for ext in self.supported_extensions)
+    def _update_progress(self, job: Job):
+        processed = self._stats['skipped'] + self._stats['reprocessed'] + self._stats['failed']
+        job.total_items = self._estimate_total(processed)
+        job.processed_items = processed
+        job.progress = (processed / job.total_items) * 100 if job.total_items else 0
+        job.payload = {
+            **(job.payload or {}),
+            'total_estimated': not self._walk_progress['finished'],
+            'skipped': self._stats['skipped'],
+            'reprocessed': self._stats['reprocessed'],
+            'failed': self._stats['failed'],
+            'current_file': self._current_file
+        }
+        self.db.commit()
     
-    def _update_folder(self, path: str, relative_path: str) -> Optional[Folder]:
-        folder = self.db.query(Folder).filter(Folder.path == relative_path).first()
-        if not folder:
-            folder = Folder(
-                path=relative_path,
-                name=os.path.basename(path) or "root"
-            )
-            self.db.add(folder)
-            self.db.commit()
-        return folder
+    def _estimate_total(self, processed: int) -> int:
+        """
+        Files discovered so far, plus the directories still waiting on the walk
+        stack times the average number of files per listed directory. Exact
+        once the walk has finished.
+        """
+        walk = self._walk_progress
+        estimate = walk['files']
+        if not walk['finished'] and walk['backlog'] and walk['listed_dirs']:
+            estimate += round(walk['backlog'] * walk['files'] / walk['listed_dirs'])
+        return max(estimate, processed)
     
-    def _process_photo(self, filepath: str, filename: str, relative_path: str, folder: Optional[Folder]):
+    def _incremental_scan(self, job: Job):
+        self._full_scan(job, incremental=True)
+    
+    def has_changes(self) -> bool:
+        """
+        Whether an incremental scan would list any directory, i.e. something
+        changed since the last one. Stops at the first such directory, so with
+        nothing to do it costs one stat per directory.
+        """
+        pruned = self._pruned_directories
         try:
-            # Generate file hash
-            file_hash = self._generate_file_hash(filepath)
+            return next(self._walk(self._load_folder_states()), None) is not None
+        finally:
+            self._pruned_directories = pruned
+    
+    def _walk(self, folder_states: Dict) -> Iterator[Tuple[str, str, List[str], Dict, int]]:
+        """
+        Walk the photo library, yielding (root, relative_path, files, dir_state,
+        backlog) for every directory that has to be examined, where backlog is
+        the number of directories still waiting to be visited.
+        
+        A directory whose mtime matches the one recorded in folder_states (see
+        _load_folder_states; pass {} to disable pruning) is not listed at all:
+        its remembered subdirectories are visited directly and its files are
+        treated as unchanged. Adding, removing or renaming an entry always bumps
+        the directory mtime, so only files rewritten in place are missed; a full
+        scan picks those up.
+        """
+        # Don't trust mtimes too close to the scan start; a change landing in
+        # the same timestamp tick would otherwise go unnoticed next time
+        settle_before_ns = time.time_ns() - DIR_MTIME_SETTLE_NS
+        
+        stack = [self.photos_path]
+        while stack:
+            root = stack.pop()
+            relative_path = os.path.relpath(root, self.photos_path)
+            
+            try:
+                dir_stat = os.stat(root)
+            except OSError as e:
+                logger.warning(f"Could not stat directory {root}: {e}")
+                continue
             
-            # Check if photo already exists
-            existing = self.db.query(Photo).filter(Photo.file_hash == file_hash).first()
-            if existing:
-                logger.debug(f"Photo already exists: {filename}")
-                # Check if it needs thumbnails
-                from models import Thumbnail
-                has_thumbnails = self.db.query(Thumbnail).filter(Thumbnail.photo_id == existing.id).first()
-                if not has_thumbnails:
-                    logger.info(f"Photo {filename} missing thumbnails, queueing generation")
-                    self._queue_single_thumbnail(existing.id)
-                return
+            known = folder_states.get(relative_path)
+            if known and known[0] == dir_stat.st_mtime_ns and known[1] is not None:
+                self._pruned_directories += 1
+                stack.extend(os.path.join(root, name) for name in reversed(known[1]))
+                continue
             
-            # Get file info
-            file_size = os.path.getsize(filepath)
-            mime_type = magic.from_file(filepath, mime=True)
+            files, subdirs = [], []
+            try:
+                with os.scandir(root) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.append(entry.name)
+                        elif entry.is_file():
+                            files.append(entry.name)
+            except OSError as e:
+                logger.warning(f"Could not list directory {root}: {e}")
+                continue
             
-            # Extract metadata
-            metadata, date_taken = self._extract_metadata(filepath)
+            files.sort()
+            subdirs.sort()
+            stack.extend(os.path.join(root, name) for name in reversed(subdirs))
             
-            # Create photo record
-            photo = Photo(
-                filename=filename,
-                filepath=filepath,
-                relative_path=os.path.join(relative_path, filename),
-                file_hash=file_hash,
-                file_size=file_size,
-                mime_type=mime_type,
-                width=metadata.get("width"),
-                height=metadata.get("height"),
-                metadata_json=metadata,
-                date_taken=date_taken,  # Use the datetime object
-                camera_make=metadata.get("make"),
-                camera_model=metadata.get("model"),
-                original_orientation=metadata.get("original_orientation", 1),
-                rotation_applied=metadata.get("rotation_applied", 0),
-                orientation_corrected=metadata.get("orientation_corrected", False)
+            dir_state = {
+                'mtime_ns': dir_stat.st_mtime_ns if dir_stat.st_mtime_ns < settle_before_ns else None,
+                'subdirs': subdirs
+            }
+            yield root, relative_path, files, dir_state, len(stack)
+    
+    def _group_paths(self, paths: List[str]) -> Iterator[Tuple[str, str, List[str], None, int]]:
+        """
+        Shape an explicit file list like _walk output. dir_state is None because
+        the directories weren't listed, so their recorded state is left alone.
+        """
+        by_directory = {}
+        for path in paths:
+            by_directory.setdefault(os.path.dirname(path), []).append(os.path.basename(path))
+        
+        remaining = len(by_directory)
+        for root, files in sorted(by_directory.items()):
+            remaining -= 1
+            yield root, os.path.relpath(root, self.photos_path), sorted(set(files)), None, remaining
+    
+    def _load_folder_states(self) -> Dict[str, Tuple[Optional[int], Optional[List[str]]]]:
+        """Load recorded directory state as {relative_path: (mtime_ns, subdirs)}"""
+        rows = self.db.query(Folder.path, Folder.dir_mtime_ns, Folder.subdirs).all()
+        return {path: (mtime_ns, subdirs) for path, mtime_ns, subdirs in rows}
+    
+    def _flush_folder_states(self):
+        """
+        Record the state of finished directories with one bulk UPDATE. Runs after
+        the manifest flush so a directory is never marked clean ahead of its files.
+        """
+        if not self._pending_folder_states:
+            return
+        files_recorded = self._flush_file_states()
+        try:
+            self._create_folders()
+            self.db.execute(update(Folder), [
+                {
+                    'id': self._folder_ids[relative_path],
+                    'dir_mtime_ns': dir_state['mtime_ns'] if files_recorded else None,
+                    'subdirs': dir_state['subdirs']
+                }
+                for relative_path, dir_state in self._pending_folder_states
+            ])
+            self.db.commit()
+        except Exception as e:
+            # Unrecorded directories are listed again on the next incremental scan
+            logger.error(f"Failed to record directory state: {str(e)}")
+            self.db.rollback()
+        finally:
+            self._pending_folder_states = []
+    
+    def _load_manifest(self, paths: Optional[List[str]] = None) -> Dict[str, Tuple[int, int, int, Optional[str], Optional[str]]]:
+        """
+        Load the file-state manifest as {path: (size, mtime_ns, inode, fingerprint, file_hash)},
+        either whole or for the given paths only
+        """
+        query = self.db.query(
+            FileState.path, FileState.size, FileState.mtime_ns, FileState.inode,
+            FileState.fingerprint, FileState.file_hash
+        )
+        if paths is None:
+            rows = query.all()
+        else:
+            rows = []
+            for i in range(0, len(paths), 1000):
+                rows.extend(query.filter(FileState.path.in_(paths[i:i + 1000])).all())
+        return {row[0]: tuple(row[1:]) for row in rows}
+    
+    def _load_photo_paths(self, paths: Optional[List[str]] = None) -> set:
+        """Filepaths of existing photos, either all or among the given paths"""
+        query = self.db.query(Photo.filepath)
+        if paths is None:
+            return {path for (path,) in query}
+        photo_paths = set()
+        for i in range(0, len(paths), 1000):
+            photo_paths.update(path for (path,) in query.filter(Photo.filepath.in_(paths[i:i + 1000])))
+        return photo_paths
+    
+    def _flush_file_states(self) -> bool:
+        """Upsert buffered manifest rows in one statement. Returns False if the write failed."""
+        if not self._pending_file_states:
+            return True
+        try:
+            stmt = pg_insert(FileState).values(self._pending_file_states)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[FileState.path],
+                set_={
+                    'size': stmt.excluded.size,
+                    'mtime_ns': stmt.excluded.mtime_ns,
+                    'inode': stmt.excluded.inode,
+                    'fingerprint': stmt.excluded.fingerprint,
+                    'file_hash': stmt.excluded.file_hash,
+                    'photo_id': stmt.excluded.photo_id
+                }
             )
+            self.db.execute(stmt)
+            self.db.commit()
+            return True
+        except Exception as e:
+            # Unrecorded files are simply re-hashed on the next incremental scan
+            logger.error(f"Failed to update file-state manifest: {str(e)}")
+            self.db.rollback()
+            return False
+        finally:
+            self._pending_file_states = []
+    
+    def _is_supported_file(self, filename: str) -> bool:
+        return any(filename.lower().endswith(ext) for ext in self.supported_extensions)
+    
+    def _load_folder_index(self):
+        """
+        Load every folder as {relative_path: id} and repair parent links on rows
+        created before parent_id was maintained
+        """
+        rows = self.db.query(Folder.path, Folder.id, Folder.parent_id).all()
+        self._folder_ids = {path: folder_id for path, folder_id, _ in rows}
+        
+        relinks = []
+        for path, folder_id, parent_id in rows:
+            parent_path = self._parent_folder_path(path)
+            expected = self._folder_ids.get(parent_path) if parent_path else None
+            if expected is not None and expected != parent_id:
+                relinks.append({'id': folder_id, 'parent_id': expected})
+        if relinks:
+            self.db.execute(update(Folder), relinks)
+            self.db.commit()
+            logger.info(f"Linked {len(relinks)} folders to their parents")
+    
+    def _parent_folder_path(self, relative_path: str) -> Optional[str]:
+        if relative_path == '.':
+            return None
+        return os.path.dirname(relative_path) or '.'
+    
+    def _require_folder(self, relative_path: str):
+        """Note a folder (and any missing ancestors) for the next bulk create"""
+        while relative_path is not None and relative_path not in self._folder_ids \
+                and relative_path not in self._new_folders:
+            self._new_folders.add(relative_path)
+            relative_path = self._parent_folder_path(relative_path)
+    
+    def _create_folders(self):
+        """
+        Insert pending folders with one statement per tree depth, shallowest
+        first, so every row can be given its parent's id
+        """
+        if not self._new_folders:
+            return
+        
+        by_depth = {}
+        for relative_path in self._new_folders:
+            depth = 0 if relative_path == '.' else relative_path.count('/') + 1
+            by_depth.setdefault(depth, []).append(relative_path)
+        
+        for depth in sorted(by_depth):
+            paths = by_depth[depth]
+            rows = [
+                {
+                    'path': relative_path,
+                    'name': (os.path.basename(os.path.normpath(self.photos_path)) or "root")
+                            if relative_path == '.' else os.path.basename(relative_path),
+                    'parent_id': self._folder_ids.get(self._parent_folder_path(relative_path))
+                }
+                for relative_path in paths
+            ]
+            stmt = pg_insert(Folder).values(rows)
+            stmt = stmt.on_conflict_do_nothing(index_elements=[Folder.path])
+            stmt = stmt.returning(Folder.path, Folder.id)
+            inserted = {path: folder_id for path, folder_id in self.db.execute(stmt)}
+            self._folder_ids.update(inserted)
+            self._folders_added += len(inserted)
             
-            self.db.add(photo)
-            self.db.commit()  # Commit to get photo ID
+            # Rows skipped by ON CONFLICT were created concurrently
+            missing = [path for path in paths if path not in self._folder_ids]
+            if missing:
+                self._folder_ids.update(
+                    self.db.query(Folder.path, Folder.id).filter(Folder.path.in_(missing)).all()
+                )
+        
+        self.db.commit()
+        self._new_folders = set()
+    
+    def _refresh_folder_stats(self):
+        """
+        Recompute photo_count/total_size and their recursive totals for every
+        folder in one set-based UPDATE ... FROM an aggregate over photos,
+        touching only folders whose numbers changed
+        """
+        # Directory part of Photo.relative_path, which is how Folder.path is stored
+        photo_folder = func.substr(
+            Photo.relative_path, 1,
+            func.length(Photo.relative_path) - func.length(Photo.filename) - 1
+        )
+        direct = (
+            select(
+                Folder.id.label('folder_id'),
+                func.count(Photo.id).label('photo_count'),
+                func.sum(Photo.file_size).label('total_size')
+            )
+            .join(Photo, photo_folder == Folder.path)
+            .where(Photo.is_deleted == False)
+            .group_by(Folder.id)
+            .cte('direct')
+        )
+        
+        # Every (folder, ancestor-or-self) pair, following parent_id
+        ancestors = select(
+            Folder.id.label('folder_id'), Folder.id.label('ancestor_id')
+        ).cte('ancestors', recursive=True)
+        parent = aliased(Folder)
+        ancestors = ancestors.union_all(
+            select(ancestors.c.folder_id, parent.parent_id)
+            .join(parent, parent.id == ancestors.c.ancestor_id)
+            .where(parent.parent_id.isnot(None))
+        )
+        
+        recursive = (
+            select(
+                ancestors.c.ancestor_id.label('folder_id'),
+                func.sum(direct.c.photo_count).label('photo_count'),
+                func.sum(direct.c.total_size).label('total_size')
+            )
+            .join(direct, direct.c.folder_id == ancestors.c.folder_id)
+            .group_by(ancestors.c.ancestor_id)
+            .subquery()
+        )
+        
+        # One row per folder, zeros for folders without photos
+        folder = aliased(Folder)
+        stats = (
+            select(
+                folder.id.label('folder_id'),
+                func.coalesce(direct.c.photo_count, 0).label('photo_count'),
+                func.coalesce(direct.c.total_size, 0).label('total_size'),
+                func.coalesce(recursive.c.photo_count, 0).label('recursive_photo_count'),
+                func.coalesce(recursive.c.total_size, 0).label('recursive_total_size')
+            )
+            .outerjoin(direct, direct.c.folder_id == folder.id)
+            .outerjoin(recursive, recursive.c.folder_id == folder.id)
+            .subquery('stats')
+        )
+        
+        columns = ('photo_count', 'total_size', 'recursive_photo_count', 'recursive_total_size')
+        statement = (
+            update(Folder)
+            .where(Folder.id == stats.c.folder_id)
+            .where(or_(*(getattr(Folder, column).is_distinct_from(stats.c[column]) for column in columns)))
+            .values({column: stats.c[column] for column in columns})
+            .execution_options(synchronize_session=False)
+        )
+        
+        try:
+            result = self.db.execute(statement)
+            self.db.commit()
+            logger.debug(f"Refreshed statistics for {result.rowcount} folders")
+        except Exception as e:
+            logger.error(f"Failed to refresh folder statistics: {str(e)}")
+            self.db.rollback()
+    
+    def _open_directory(self, root: str, relative_path: str, dir_state: Dict):
+        self._require_folder(relative_path)
+        self._directories[relative_path] = {
+            'state': dir_state,
+            'pending': 0,      # Files submitted but not yet written
+            'complete': True,  # False once any file in it fails
+            'walked': False
+        }
+    
+    def _close_finished_directories(self):
+        """Record directory state once every file in it has been written"""
+        for relative_path in list(self._directories):
+            entry = self._directories[relative_path]
+            if not entry['walked'] or entry['pending']:
+                continue
+            if entry['state'] is not None:
+                dir_state = entry['state']
+                # Failed files must be retried, so never mark their directory clean
+                if not entry['complete']:
+                    dir_state = {**dir_state, 'mtime_ns': None}
+                self._pending_folder_states.append((relative_path, dir_state))
+            del self._directories[relative_path]
+        self._flush_folder_states()
+    
+    def _write_batch(self, results: List[Dict]):
+        """
+        Writer stage: resolve a batch of ingest results against the DB with one
+        IN (...) lookup, bulk-insert the new photos and commit once per batch.
+        """
+        valid = []
+        for result in results:
+            if result.get('error') or not result.get('file_hash'):
+                logger.error(f"Error processing {result['filepath']}: {result.get('error')}")
+                self._fail_result(result)
+            else:
+                valid.append(result)
+        if not valid:
+            return
+        
+        try:
+            photo_ids = self._lookup_hashes({result['file_hash'] for result in valid})
+            existing_ids = set(photo_ids.values())
             
-            # Queue thumbnail generation immediately for this photo
-            self._queue_single_thumbnail(photo.id)
+            # The first file seen for an unknown hash becomes the photo; later
+            # copies in the same batch resolve to it
+            new_results = {}
+            for result in valid:
+                if result['file_hash'] not in photo_ids:
+                    new_results.setdefault(result['file_hash'], result)
             
-            # Update folder stats
-            if folder:
-                folder.photo_count += 1
-                folder.total_size += file_size
+            inserted, failed_hashes = self._insert_photos(list(new_results.values()))
+            photo_ids.update(inserted)
             
-            logger.info(f"Added photo: {filename}")
+            # Rows skipped by ON CONFLICT were added concurrently (another scan or the watcher)
+            conflicted = new_results.keys() - inserted.keys() - failed_hashes
+            if conflicted:
+                concurrent = self._lookup_hashes(conflicted)
+                photo_ids.update(concurrent)
+                existing_ids.update(concurrent.values())
             
+            self.db.commit()
         except Exception as e:
-            logger.error(f"Error processing {filepath}: {str(e)}")
-            self.db.rollback()  # Rollback on error to continue processing
-    
-    def _generate_file_hash(self, filepath: str) -> str:
-        hash_sha256 = hashlib.sha256()
-        with open(filepath, "rb") as f:
-            for chunk in iter(lambda: f.read(4096), b""):
-                hash_sha256.update(chunk)
-        return hash_sha256.hexdigest()
-    
-    def _extract_metadata(self, filepath: str) -> dict:
-        metadata = {}
-        date_taken = None
+            logger.error(f"Failed to write scan batch: {str(e)}")
+            self.db.rollback()
+            # Previews stay: their hashes may belong to earlier batches' inserts,
+            # and sweep_previews() removes any that nobody consumes
+            for result in valid:
+                self._fail_result(result)
+            return
         
-        try:
-            from PIL import ImageOps
-            with Image.open(filepath) as img:
-                # Get original dimensions before any rotation
-                metadata["width"] = img.width
-                metadata["height"] = img.height
-                metadata["format"] = img.format
-                
-                # Extract EXIF data
-                exifdata = img.getexif()
-                if exifdata:
-                    # Check for orientation tag (0x0112)
-                    orientation = exifdata.get(0x0112, 1)
-                    metadata["original_orientation"] = orientation
-                    
-                    # Apply EXIF transpose if needed
-                    if orientation != 1:
-                        try:
-                            img_corrected = ImageOps.exif_transpose(img)
-                            if img_corrected:
-                                # Update dimensions after rotation
-                                metadata["width"] = img_corrected.width
-                                metadata["height"] = img_corrected.height
-                                metadata["orientation_corrected"] = True
-                                
-                                # Calculate rotation applied
-                                rotation_map = {
-                                    3: 180,  # Rotate 180
-                                    6: 270,  # Rotate 270 CW (or 90 CCW)
-                                    8: 90    # Rotate 90 CW (or 270 CCW)
-                                }
-                                metadata["rotation_applied"] = rotation_map.get(orientation, 0)
-                        except Exception as e:
-                            logger.warning(f"Could not apply EXIF rotation: {e}")
-                    
-                    for tag_id, value in exifdata.items():
-                        tag = TAGS.get(tag_id, tag_id)
-                        # Convert all values to strings for JSON serialization
-                        # Limit string length to prevent huge metadata
-                        if value:
-                            str_value = str(value)
-                            # Remove NUL characters that PostgreSQL can't handle
-                            str_value = str_value.replace('\x00', '')
-                            if len(str_value) > 1000:
-                                str_value = str_value[:1000] + "..."
-                            metadata[tag] = str_value
-                        else:
-                            metadata[tag] = None
-                    
-                    # Parse date taken separately (not stored in metadata_json)
-                    date_str = metadata.get("DateTimeOriginal") or metadata.get("DateTime")
-                    if date_str:
-                        try:
-                            date_taken = datetime.strptime(date_str, "%Y:%m:%d %H:%M:%S")
-                            metadata["date_taken"] = date_str  # Keep string version in metadata
-                        except:
-                            pass
-                    
-                    # Extract camera info (ensure no NUL characters)
-                    make = metadata.get("Make")
-                    model = metadata.get("Model")
-                    metadata["make"] = make.replace('\x00', '') if make else None
-                    metadata["model"] = model.replace('\x00', '') if model else None
+        self._photos_added += len(inserted)
+        # Previews are keyed by hash, so a duplicate of a photo added since the
+        # scan started (earlier batch, concurrent scan) shares that photo's
+        # preview, which its thumbnail batch still needs
+        self._discard_previews(
+            result for result in valid
+            if photo_ids.get(result['file_hash'], self._library_max_photo_id + 1) <= self._library_max_photo_id
+        )
+        for file_hash, photo_id in inserted.items():
+            logger.info(f"Added photo: {new_results[file_hash]['filename']}")
+        self._queue_thumbnails(inserted.values())
+        
+        self._queue_missing_thumbnails(existing_ids)
+        
+        for result in valid:
+            photo_id = photo_ids.get(result['file_hash'])
+            if photo_id is None:
+                self._fail_result(result)
+                continue
+            size, mtime_ns, inode = result['file_state']
+            self._pending_file_states.append({
+                'path': result['filepath'],
+                'size': size,
+                'mtime_ns': mtime_ns,
+                'inode': inode,
+                'fingerprint': result['fingerprint'],
+                'file_hash': result['file_hash'],
+                'photo_id': photo_id
+            })
+            self._directories[result['relative_path']]['pending'] -= 1
+            self._stats['reprocessed'] += 1
+            if result['hash_reused']:
+                self._stats['hashes_reused'] += 1
+        self._flush_file_states()
+    
+    def _lookup_hashes(self, file_hashes) -> Dict[str, int]:
+        """Map content hashes to existing photo IDs in a single query"""
+        if not file_hashes:
+            return {}
+        rows = self.db.query(Photo.file_hash, Photo.id).filter(Photo.file_hash.in_(list(file_hashes))).all()
+        return {file_hash: photo_id for file_hash, photo_id in rows}
+    
+    def _insert_photos(self, results: List[Dict]) -> Tuple[Dict[str, int], set]:
+        """
+        Insert new photos with one INSERT ... RETURNING. If that statement fails,
+        retry row by row, each in its own savepoint, so one bad file doesn't roll
+        back the rest of the batch. Returns ({file_hash: photo_id}, failed_hashes).
+        """
+        if not results:
+            return {}, set()
         
+        rows = [self._photo_row(result) for result in results]
+        try:
+            with self.db.begin_nested():
+                return self._execute_photo_insert(rows), set()
         except Exception as e:
-            logger.error(f"Error extracting metadata from {filepath}: {str(e)}")
+            logger.warning(f"Bulk photo insert failed, retrying row by row: {str(e)}")
         
-        # Return metadata dict and separate date_taken
-        return metadata, date_taken
+        inserted = {}
+        failed_hashes = set()
+        for result, row in zip(results, rows):
+            try:
+                with self.db.begin_nested():
+                    inserted.update(self._execute_photo_insert([row]))
+            except Exception as e:
+                logger.error(f"Error adding {result['filepath']}: {str(e)}")
+                failed_hashes.add(result['file_hash'])
+        return inserted, failed_hashes
+    
+    def _execute_photo_insert(self, rows: List[Dict]) -> Dict[str, int]:
+        stmt = pg_insert(Photo).values(rows)
+        stmt = stmt.on_conflict_do_nothing(index_elements=[Photo.file_hash])
+        stmt = stmt.returning(Photo.file_hash, Photo.id)
+        return {file_hash: photo_id for file_hash, photo_id in self.db.execute(stmt)}
+    
+    def _discard_previews(self, results):
+        """Remove ingest previews nobody will consume: the content was in the library before this scan"""
+        for result in results:
+            if result.get('preview'):
+                try:
+                    os.remove(result['preview'])
+                except OSError:
+                    pass
+    
+    def _fail_result(self, result: Dict):
+        entry = self._directories[result['relative_path']]
+        entry['pending'] -= 1
+        entry['complete'] = False
+        self._stats['failed'] += 1
+    
+    def _photo_row(self, result: Dict) -> Dict:
+        metadata = result['metadata']
+        return {
+            'filename': result['filename'],
+            'filepath': result['filepath'],
+            'relative_path': os.path.join(result['relative_path'], result['filename']),
+            'file_hash': result['file_hash'],
+            'file_size': result['file_size'],
+            'mime_type': result['mime_type'],
+            'width': metadata.get("width"),
+            'height': metadata.get("height"),
+            'metadata_json': metadata,
+            'date_taken': result['date_taken'],  # Use the datetime object
+            'camera_make': metadata.get("make"),
+            'camera_model': metadata.get("model"),
+            'original_orientation': metadata.get("original_orientation", 1),
+            'rotation_applied': metadata.get("rotation_applied", 0),
+            'orientation_corrected': metadata.get("orientation_corrected", False)
+        }
+    
+    def _queue_missing_thumbnails(self, photo_ids: set):
+        """Queue thumbnails for already-known photos that have none, with one lookup"""
+        if not photo_ids:
+            return
+        with_thumbnails = {
+            photo_id for (photo_id,) in
+            self.db.query(Thumbnail.photo_id).filter(Thumbnail.photo_id.in_(list(photo_ids))).distinct()
+        }
+        missing = photo_ids - with_thumbnails
+        for photo_id in missing:
+            logger.info(f"Photo {photo_id} missing thumbnails, queueing generation")
+        self._queue_thumbnails(missing)
     
     def _create_thumbnail_job(self):
-        """Create a thumbnail generation job at the start of scanning"""
+        """Create (or join) the thumbnail generation job once the scan has photos to queue"""
         try:
             # Check if there's already an active thumbnail job
             existing = self.db.query(Job).filter(
@@ -304,26 +896,53 @@ class DirectoryScanner:
         except Exception as e:
             logger.error(f"Failed to create thumbnail job: {str(e)}")
             
-    def _queue_single_thumbnail(self, photo_id: int):
-        """Queue thumbnail generation for a single photo immediately"""
+    def _queue_thumbnails(self, photo_ids):
+        """Buffer photos for thumbnail generation, dispatching once a full batch is waiting"""
+        self._thumbnail_buffer.extend(photo_ids)
+        if len(self._thumbnail_buffer) >= THUMBNAIL_BATCH_SIZE:
+            self._flush_thumbnails()
+    
+    def _flush_thumbnails(self):
+        """
+        Send buffered photos to Celery as process_thumbnail_batch tasks and add
+        them to the thumbnail job's total with one update
+        """
+        self._thumbnail_flushed_at = time.monotonic()
+        if not self._thumbnail_buffer:
+            return
+        photo_ids, self._thumbnail_buffer = self._thumbnail_buffer, []
+        # Only now, so a scan that finds nothing new leaves no empty job behind
+        if self.thumbnail_job_id is None:
+            self._create_thumbnail_job()
+        
         try:
             # Import here to avoid circular dependency
-            from tasks.thumbnails import generate_photo_thumbnails
+            from tasks.thumbnails import process_thumbnail_batch
             
-            # Queue the single photo thumbnail generation
-            generate_photo_thumbnails.delay(photo_id)
-            
-            # Update thumbnail job stats if we have one
+            # Count the photos against the job before any batch can report
+            # progress, in one statement as batches update the same row
             if self.thumbnail_job_id:
-                thumb_job = self.db.query(Job).filter(Job.id == self.thumbnail_job_id).first()
-                if thumb_job:
-                    thumb_job.total_items = (thumb_job.total_items or 0) + 1
-                    if thumb_job.payload is None:
-                        thumb_job.payload = {}
-                    thumb_job.payload['photo_count'] = thumb_job.total_items
-                    self.db.commit()
+                reopen = Job.status == JobStatus.COMPLETED  # Earlier batches may already have caught up
+                row = self.db.execute(
+                    update(Job).where(Job.id == self.thumbnail_job_id).values(
+                        total_items=func.coalesce(Job.total_items, 0) + len(photo_ids),
+                        status=case((reopen, literal(JobStatus.RUNNING, Job.status.type)), else_=Job.status),
+                        completed_at=case((reopen, None), else_=Job.completed_at)
+                    ).returning(Job.total_items).execution_options(synchronize_session=False)
+                ).first()
+                if row:
+                    thumb_job = self.db.query(Job).filter(Job.id == self.thumbnail_job_id).first()
+                    thumb_job.payload = {**(thumb_job.payload or {}), 'photo_count': row.total_items}
+                self.db.commit()
+            
+            for i in range(0, len(photo_ids), THUMBNAIL_BATCH_SIZE):
+                process_thumbnail_batch.apply_async(
+                    args=[photo_ids[i:i + THUMBNAIL_BATCH_SIZE], self.thumbnail_job_id],
+                    priority=1
+                )
             
-            logger.debug(f"Queued thumbnail generation for photo {photo_id}")
+            logger.debug(f"Queued thumbnail generation for {len(photo_ids)} photos")
             
         except Exception as e:
-            logger.error(f"Failed to queue thumbnail for photo {photo_id}: {str(e)}")
\ No newline at end of file
+            logger.error(f"Failed to queue thumbnails for {len(photo_ids)} photos: {str(e)}")
+            self.db.rollback()
\ No newline at end of file
@@ -0,0 +1,131 @@
+import os
+import logging
+from typing import Dict, List, Optional
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# Formats written for every thumbnail size. JPEG is always written as the
+# fallback; AVIF is roughly half the bytes of WebP but ~3x slower to encode,
+# so it is opt-in: THUMBNAIL_FORMATS=jpeg,webp,avif
+THUMBNAIL_FORMATS = [
+    fmt.strip() for fmt in os.getenv('THUMBNAIL_FORMATS', 'jpeg,webp').lower().split(',') if fmt.strip()
+]
+
+# name -> file extension, media type and Pillow format
+FORMATS = {
+    'jpeg': {'extension': 'jpg', 'media_type': 'image/jpeg', 'pil_format': 'JPEG'},
+    'webp': {'extension': 'webp', 'media_type': 'image/webp', 'pil_format': 'WEBP'},
+    'avif': {'extension': 'avif', 'media_type': 'image/avif', 'pil_format': 'AVIF'}
+}
+
+# Named encoder settings per format; compare them with `python -m benchmarks.encoders`.
+# JPEG subsampling: 0 = 4:4:4, 2 = 4:2:0 (4:4:4 doubled the bytes for less
+# SSIM than a higher quality at 4:2:0). Progressive already builds optimised
+# Huffman tables, so optimize is only set without it. WebP method: 0 (fast)
+# to 6 (small).
+ENCODER_PROFILES = {
+    # 150px grid tiles: many per page, never inspected closely, encoded fastest
+    'tile': {
+        'jpeg': {'quality': 80, 'subsampling': 2, 'optimize': False, 'progressive': False},
+        'webp': {'quality': 75, 'method': 2},
+        'avif': {'quality': 55}
+    },
+    # 400px grid and timeline views, the most requested size
+    'grid': {
+        'jpeg': {'quality': 85, 'subsampling': 2, 'optimize': True, 'progressive': False},
+        'webp': {'quality': 80, 'method': 4},
+        'avif': {'quality': 60}
+    },
+    # 1200px viewer previews: looked at full screen, progressive so they sharpen while loading
+    'detail': {
+        'jpeg': {'quality': 88, 'subsampling': 2, 'optimize': False, 'progressive': True},
+        'webp': {'quality': 85, 'method': 4},
+        'avif': {'quality': 65}
+    }
+}
+
+# Thumbnail size -> encoder profile
+SIZE_PROFILES = {'150': 'tile', '400': 'grid', '1200': 'detail'}
+
+# Best first; used to pick a variant for a client that accepts several
+PREFERENCE = ['avif', 'webp', 'jpeg']
+
+if 'avif' in THUMBNAIL_FORMATS:
+    try:
+        # pillow_heif ships the AV1 encoder; this registers AVIF save with Pillow
+        import pillow_heif
+        pillow_heif.register_avif_opener()
+    except (ImportError, AttributeError) as e:
+        logger.warning(f"AVIF thumbnails disabled, pillow_heif has no AVIF support: {e}")
+        THUMBNAIL_FORMATS.remove('avif')
+
+ENABLED_FORMATS = ['jpeg'] + [fmt for fmt in THUMBNAIL_FORMATS if fmt in FORMATS and fmt != 'jpeg']
+
+def thumbnail_filename(photo_id: int, size: str, rotation_version: int, fmt: str = 'jpeg') -> str:
+    return f"{photo_id}_{size}_v{rotation_version or 0}.{FORMATS[fmt]['extension']}"
+
+def thumbnail_urls(photo_id: int, rotation_version: int) -> Dict[str, str]:
+    """Versioned thumbnail URLs for list payloads; served without a database lookup"""
+    return {
+        size: f"/api/v1/thumbnails/{photo_id}/{size}?v={rotation_version or 0}"
+        for size in SIZE_PROFILES
+    }
+
+def encoder_options(size: str, fmt: str) -> Dict:
+    """Pillow save() options for one size and format"""
+    return ENCODER_PROFILES[SIZE_PROFILES.get(size, 'detail')][fmt]
+
+def save_variants(thumbnail: Image.Image, thumbnails_path: str, photo_id: int, size: str,
+                  rotation_version: int, formats: List[str] = None) -> Dict[str, Dict]:
+    """Encode one rendition in every enabled format; returns format -> file info"""
+    variants = {}
+    for fmt in formats or ENABLED_FORMATS:
+        spec = FORMATS[fmt]
+        filepath = os.path.join(thumbnails_path, thumbnail_filename(photo_id, size, rotation_version, fmt))
+        thumbnail.save(filepath, spec['pil_format'], **encoder_options(size, fmt))
+        variants[fmt] = {
+            'filepath': filepath,
+            'file_size': os.path.getsize(filepath),
+            'width': thumbnail.width,
+            'height': thumbnail.height
+        }
+    return variants
+
+def _accepted_types(accept: Optional[str]) -> Dict[str, float]:
+    """Media type -> q value from an Accept header"""
+    accepted = {}
+    for part in (accept or '').split(','):
+        fields = [field.strip() for field in part.split(';')]
+        if not fields[0]:
+            continue
+        q = 1.0
+        for param in fields[1:]:
+            if param.startswith('q='):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    pass
+        accepted[fields[0].lower()] = q
+    return accepted
+
+def negotiate_formats(accept: Optional[str], requested: Optional[str] = None) -> List[str]:
+    """
+    Enabled formats the client can take, best first, always ending in JPEG.
+    WebP and AVIF are only offered when the Accept header names them (browsers
+    send */* for images even when they can't decode either); an explicit
+    ?format= is honoured first unless the header refuses it with q=0.
+    """
+    accepted = _accepted_types(accept)
+    candidates = []
+    for fmt in PREFERENCE:
+        if fmt not in ENABLED_FORMATS or fmt == 'jpeg':
+            continue
+        if accepted.get(FORMATS[fmt]['media_type'], 0) > 0:
+            candidates.append(fmt)
+
+    if requested in ENABLED_FORMATS and accepted.get(FORMATS[requested]['media_type']) != 0:
+        candidates = [requested] + [fmt for fmt in candidates if fmt != requested]
+    if 'jpeg' not in candidates:
+        candidates.append('jpeg')
+    return candidates
\ No newline at end of file
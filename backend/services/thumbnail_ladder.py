@@ -0,0 +1,40 @@
+import math
+from typing import Dict, Iterator, Optional, Tuple
+from PIL import Image
+
+# Thumbnails are rendered as a ladder, largest first, each rung resized from
+# the one above it (1200 from the source, 400 from 1200, 150 from 400) so the
+# source is resampled only once and never copied.
+
+def thumbnail_size(size: Tuple[int, int], box: Tuple[int, int]) -> Optional[Tuple[int, int]]:
+    """
+    Size Image.thumbnail would produce for an image of `size` in `box`, or None
+    if it already fits (thumbnail never enlarges)
+    """
+    width, height = size
+    x, y = box
+    if x >= width and y >= height:
+        return None
+
+    def round_aspect(number, key):
+        return max(min(math.floor(number), math.ceil(number), key=key), 1)
+
+    aspect = width / height
+    if x / y >= aspect:
+        x = round_aspect(y * aspect, key=lambda n: abs(aspect - n / y))
+    else:
+        y = round_aspect(x / aspect, key=lambda n: 0 if n == 0 else abs(aspect - x / n))
+    return x, y
+
+def render_ladder(img: Image.Image, sizes: Dict[str, Tuple[int, int]]) -> Iterator[Tuple[str, Image.Image]]:
+    """
+    Yield (size_name, rendition) for every size, largest first. A rendition
+    that already fits its box is passed down unchanged rather than copied.
+    """
+    current = img
+    for size_name, box in sorted(sizes.items(), key=lambda item: max(item[1]), reverse=True):
+        # Dimensions come from the source so rounding doesn't drift down the ladder
+        target = thumbnail_size(img.size, box)
+        if target and target != current.size:
+            current = current.resize(target, Image.Resampling.LANCZOS, reducing_gap=2.0)
+        yield size_name, current
\ No newline at end of file
@@ -0,0 +1,134 @@
+import os
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from typing import Callable, Dict, Tuple
+from PIL import Image
+from services.ingest import preview_path
+from services.image_loader import open_image
+from services.thumbnail_ladder import render_ladder
+from services.thumbnail_formats import save_variants
+from services.worker_pools import SharedPool
+
+logger = logging.getLogger(__name__)
+
+# 'thread' renders in a thread pool inside the task; 'process' uses a long-lived
+# process pool so LANCZOS and JPEG encoding aren't serialised by the GIL
+THUMBNAIL_EXECUTOR = os.getenv('THUMBNAIL_EXECUTOR', 'thread')
+MAX_THUMBNAIL_WORKERS = int(os.getenv('MAX_THUMBNAIL_WORKERS', '4'))  # Reduced from 8 to prioritize user requests
+
+class ThumbnailWorker:
+    """Worker class for generating thumbnails in parallel"""
+    
+    def __init__(self, thumbnails_path: str = None):
+        self.thumbnails_path = thumbnails_path or os.getenv("THUMBNAILS_PATH", "/app/thumbnails")
+        self.sizes = {
+            '150': (150, 150),
+            '400': (400, 400),
+            '1200': (1200, 1200)
+        }
+        os.makedirs(self.thumbnails_path, exist_ok=True)
+    
+    def process_photo(self, photo_data: Tuple) -> Dict:
+        """
+        Process a single photo and generate all thumbnail sizes. photo_data is
+        (id, filepath[, user_rotation[, file_hash[, rotation_version]]]), as
+        prefetched by process_thumbnail_batch; this runs in pool threads and
+        never touches the database.
+        """
+        photo_id, filepath = photo_data[0], photo_data[1]
+        user_rotation = photo_data[2] if len(photo_data) > 2 else 0
+        file_hash = photo_data[3] if len(photo_data) > 3 else None
+        rotation_version = (photo_data[4] if len(photo_data) > 4 else 0) or 0
+        
+        preview = None
+        if file_hash:
+            # Reduced, already upright copy left by the scan's ingest stage
+            preview = preview_path(file_hash)
+            if not os.path.exists(preview):
+                preview = None
+            
+        result = {
+            'photo_id': photo_id,
+            'success': False,
+            'thumbnails': {},
+            'error': None
+        }
+        
+        try:
+            # Decode at the smallest scale that still covers the largest size
+            max_size = max(max(dimensions) for dimensions in self.sizes.values())
+            img = open_image(preview or filepath, max_size, file_hash)
+            
+            # Open and process the image
+            from PIL import ImageOps
+            with img:
+                # Apply EXIF orientation if present
+                try:
+                    img = ImageOps.exif_transpose(img) or img
+                except Exception:
+                    # If EXIF transpose fails, continue with original
+                    pass
+                
+                # Apply user rotation if present
+                if user_rotation and user_rotation != 0:
+                    # Rotate the image (negative because PIL rotates counter-clockwise)
+                    img = img.rotate(-user_rotation, expand=True)
+                # Convert RGBA to RGB if necessary
+                if img.mode in ('RGBA', 'LA'):
+                    background = Image.new('RGB', img.size, (255, 255, 255))
+                    background.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
+                    img = background
+                elif img.mode not in ('RGB', 'L'):
+                    img = img.convert('RGB')
+                
+                # Generate each thumbnail size
+                # 1200 from the source, then 400 from 1200 and 150 from 400
+                for size_name, thumbnail in render_ladder(img, self.sizes):
+                    # Save every enabled format (JPEG, WebP, ...) with versioned naming
+                    result['thumbnails'][size_name] = save_variants(
+                        thumbnail, self.thumbnails_path, photo_id, size_name, rotation_version
+                    )
+                
+                result['success'] = True
+                
+        except Exception as e:
+            result['error'] = str(e)
+            logger.error(f"Error processing photo {photo_id}: {e}")
+        finally:
+            # Used once either way; a retry reads the original file
+            if preview:
+                try:
+                    os.remove(preview)
+                except OSError:
+                    pass
+        
+        return result
+
+# Process-pool engine. Each process builds one ThumbnailWorker up front and
+# keeps it, along with the imported codecs, for the life of the pool.
+
+_process_worker = None
+
+def _init_render_process():
+    # Importing this module has already loaded PIL, pillow_heif and rawpy here
+    global _process_worker
+    _process_worker = ThumbnailWorker()
+
+def _render_in_process(photo_data: Tuple) -> Dict:
+    # Only the small result dict travels back; the images stay in this process
+    return _process_worker.process_photo(photo_data)
+
+_process_pool = SharedPool('thumbnail', MAX_THUMBNAIL_WORKERS, initializer=_init_render_process)
+
+def thumbnail_executor() -> Tuple[Callable, object]:
+    """
+    Return (render function, executor context) for one batch. The process pool
+    is shared by every batch in this process and is not shut down by the context.
+    """
+    if THUMBNAIL_EXECUTOR == 'process':
+        # In a daemonic Celery child this is a shared thread pool instead
+        return _render_in_process, nullcontext(_process_pool.get())
+
+    worker = ThumbnailWorker()
+    return worker.process_photo, ThreadPoolExecutor(max_workers=MAX_THUMBNAIL_WORKERS)
@@ -2,22 +2,51 @@ import os
 import logging
 from PIL import Image
 from sqlalchemy.orm import Session
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from models import Photo, Thumbnail
 from typing import Dict, List
-import pillow_heif
-import numpy as np
+from services.image_loader import open_image
+from services.thumbnail_ladder import render_ladder
+from services.thumbnail_formats import save_variants
 
-# Register HEIF opener with PIL
-pillow_heif.register_heif_opener()
+logger = logging.getLogger(__name__)
 
-# Try to import rawpy for RAW file support
-try:
-    import rawpy
-    RAWPY_AVAILABLE = True
-except ImportError:
-    RAWPY_AVAILABLE = False
+def thumbnail_rows(photo_id: int, thumbnails: Dict[str, Dict[str, Dict]]) -> List[Dict]:
+    """Flatten {size: {format: file info}} into Thumbnail row dicts"""
+    return [
+        {
+            'photo_id': photo_id,
+            'size': size,
+            'format': fmt,
+            'filepath': info['filepath'],
+            'file_size': info['file_size'],
+            'width': info['width'],
+            'height': info['height']
+        }
+        for size, variants in thumbnails.items()
+        for fmt, info in variants.items()
+    ]
 
-logger = logging.getLogger(__name__)
+def upsert_thumbnails(db: Session, rows: List[Dict]):
+    """
+    Insert or update Thumbnail rows in one statement, keyed on the unique
+    (photo_id, size, format) index. The caller commits.
+    """
+    # Postgres refuses to touch the same row twice in one statement; last one wins
+    rows = list({(row['photo_id'], row['size'], row['format']): row for row in rows}.values())
+    if not rows:
+        return
+    stmt = pg_insert(Thumbnail).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Thumbnail.photo_id, Thumbnail.size, Thumbnail.format],
+        set_={
+            'filepath': stmt.excluded.filepath,
+            'file_size': stmt.excluded.file_size,
+            'width': stmt.excluded.width,
+            'height': stmt.excluded.height
+        }
+    )
+    db.execute(stmt)
 
 class ThumbnailService:
     def __init__(self, db: Session):
@@ -39,39 +68,12 @@ class ThumbnailService:
             return {}
         
         generated = {}
+        variants_by_size = {}
         
         try:
-            # Check if it's a RAW file that needs special handling
-            file_ext = os.path.splitext(photo.filepath)[1].lower()
-            
-            if file_ext in ['.cr3', '.cr2', '.nef', '.arw', '.dng', '.raf', '.orf'] and RAWPY_AVAILABLE:
-                # Handle RAW files with rawpy - use embedded thumbnail for performance
-                try:
-                    with rawpy.imread(photo.filepath) as raw:
-                        # Try to extract the embedded JPEG thumbnail first (much faster)
-                        try:
-                            thumb = raw.extract_thumb()
-                            if thumb.format == rawpy.ThumbFormat.JPEG:
-                                # Use the embedded JPEG thumbnail
-                                import io
-                                img = Image.open(io.BytesIO(thumb.data))
-                                logger.debug(f"Using embedded JPEG thumbnail for {photo.filename}")
-                            else:
-                                # No JPEG thumbnail, process the RAW data
-                                rgb = raw.postprocess(use_camera_wb=True, half_size=True)
-                                img = Image.fromarray(rgb)
-                                logger.debug(f"Processing RAW data for {photo.filename}")
-                        except Exception as e:
-                            # Fallback to full RAW processing
-                            logger.debug(f"No embedded thumbnail, processing RAW: {e}")
-                            rgb = raw.postprocess(use_camera_wb=True, half_size=True)
-                            img = Image.fromarray(rgb)
-                except Exception as e:
-                    logger.warning(f"Failed to process RAW file with rawpy: {e}, falling back to PIL")
-                    img = Image.open(photo.filepath)
-            else:
-                # Open regular image files or fall back to PIL
-                img = Image.open(photo.filepath)
+            # Decode at the smallest scale that still covers the largest size
+            max_size = max(max(dimensions) for dimensions in self.sizes.values())
+            img = open_image(photo.filepath, max_size, photo.file_hash)
             
             with img:
                 # Apply rotation if needed
@@ -88,49 +90,19 @@ class ThumbnailService:
                 elif img.mode not in ('RGB', 'L'):
                     img = img.convert('RGB')
                 
-                for size_name, dimensions in self.sizes.items():
-                    # Create thumbnail
-                    thumbnail = img.copy()
-                    thumbnail.thumbnail(dimensions, Image.Resampling.LANCZOS)
-                    
-                    # Save with versioned filename for cache busting
-                    rotation_version = photo.rotation_version or 0
-                    filename = f"{photo_id}_{size_name}_v{rotation_version}.jpg"
-                    filepath = os.path.join(self.thumbnails_path, filename)
-                    thumbnail.save(filepath, 'JPEG', quality=85, optimize=True)
-                    
-                    # Get file size
-                    file_size = os.path.getsize(filepath)
+                # Each size is resized from the one above it, never from the source again
+                for size_name, thumbnail in render_ladder(img, self.sizes):
                     
-                    # Check if thumbnail record exists
-                    existing = self.db.query(Thumbnail).filter(
-                        Thumbnail.photo_id == photo_id,
-                        Thumbnail.size == size_name,
-                        Thumbnail.format == 'jpeg'
-                    ).first()
-                    
-                    if existing:
-                        # Update existing record
-                        existing.filepath = filepath
-                        existing.file_size = file_size
-                        existing.width = thumbnail.width
-                        existing.height = thumbnail.height
-                    else:
-                        # Create new thumbnail record
-                        thumb_record = Thumbnail(
-                            photo_id=photo_id,
-                            size=size_name,
-                            format='jpeg',
-                            filepath=filepath,
-                            file_size=file_size,
-                            width=thumbnail.width,
-                            height=thumbnail.height
-                        )
-                        self.db.add(thumb_record)
+                    # Save every enabled format with versioned filenames for cache busting
+                    variants_by_size[size_name] = save_variants(
+                        thumbnail, self.thumbnails_path, photo_id, size_name, photo.rotation_version
+                    )
                     
-                    generated[size_name] = filepath
+                    generated[size_name] = variants_by_size[size_name]['jpeg']['filepath']
                     logger.info(f"Generated {size_name} thumbnail for photo {photo_id}")
                 
+                # Every size and format in one statement
+                upsert_thumbnails(self.db, thumbnail_rows(photo_id, variants_by_size))
                 self.db.commit()
                 
         except Exception as e:
@@ -153,29 +125,7 @@ class ThumbnailService:
         generated = {}
         
         try:
-            # Check if it's a RAW file that needs special handling
-            file_ext = os.path.splitext(photo.filepath)[1].lower()
-            
-            if file_ext in ['.cr3', '.cr2', '.nef', '.arw', '.dng', '.raf', '.orf'] and RAWPY_AVAILABLE:
-                # Handle RAW files with rawpy
-                try:
-                    import io
-                    with rawpy.imread(photo.filepath) as raw:
-                        try:
-                            thumb = raw.extract_thumb()
-                            if thumb.format == rawpy.ThumbFormat.JPEG:
-                                img = Image.open(io.BytesIO(thumb.data))
-                            else:
-                                rgb = raw.postprocess(use_camera_wb=True, half_size=True)
-                                img = Image.fromarray(rgb)
-                        except:
-                            rgb = raw.postprocess(use_camera_wb=True, half_size=True)
-                            img = Image.fromarray(rgb)
-                except Exception as e:
-                    logger.warning(f"Failed to process RAW file with rawpy: {e}")
-                    img = Image.open(photo.filepath)
-            else:
-                img = Image.open(photo.filepath)
+            img = open_image(photo.filepath, max(self.sizes[size]), photo.file_hash)
             
             from PIL import ImageOps
             with img:
@@ -199,46 +149,15 @@ class ThumbnailService:
                     img = img.convert('RGB')
                 
                 # Generate just the requested size
-                thumbnail = img.copy()
-                dimensions = self.sizes[size]
-                thumbnail.thumbnail(dimensions, Image.Resampling.LANCZOS)
+                _, thumbnail = next(render_ladder(img, {size: self.sizes[size]}))
                 
-                # Save with versioned filename
-                rotation_version = photo.rotation_version or 0
-                filename = f"{photo_id}_{size}_v{rotation_version}.jpg"
-                filepath = os.path.join(self.thumbnails_path, filename)
-                thumbnail.save(filepath, 'JPEG', quality=95, optimize=True, progressive=True)
-                
-                generated[size] = {
-                    'filepath': filepath,
-                    'file_size': os.path.getsize(filepath),
-                    'width': thumbnail.width,
-                    'height': thumbnail.height
-                }
+                # Save with versioned filenames, one file per enabled format
+                generated[size] = save_variants(
+                    thumbnail, self.thumbnails_path, photo_id, size, photo.rotation_version
+                )
                 
                 # Save to database
-                existing = self.db.query(Thumbnail).filter(
-                    Thumbnail.photo_id == photo_id,
-                    Thumbnail.size == size,
-                    Thumbnail.format == 'jpeg'
-                ).first()
-                
-                if existing:
-                    existing.filepath = filepath
-                    existing.file_size = generated[size]['file_size']
-                    existing.width = thumbnail.width
-                    existing.height = thumbnail.height
-                else:
-                    thumb_record = Thumbnail(
-                        photo_id=photo_id,
-                        size=size,
-                        format='jpeg',
-                        filepath=filepath,
-                        file_size=generated[size]['file_size'],
-                        width=thumbnail.width,
-                        height=thumbnail.height
-                    )
-                    self.db.add(thumb_record)
+                upsert_thumbnails(self.db, thumbnail_rows(photo_id, generated))
                 
                 self.db.commit()
                 logger.info(f"Generated {size} thumbnail on-demand for photo {photo_id}")
@@ -0,0 +1,62 @@
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Executors for CPU-bound work (scan ingest, thumbnail rendering, API image
+# conversion). Every pool in the app is built here so the process/thread
+# choice and the recovery from a dead worker behave the same everywhere.
+
+def can_start_processes() -> bool:
+    # Celery prefork children are daemonic and may not start child processes;
+    # run the worker with --pool=threads to get process pools there
+    return not multiprocessing.current_process().daemon
+
+def create_pool(name: str, max_workers: int, processes: bool = True,
+                initializer: Optional[Callable] = None) -> Executor:
+    """
+    A spawn-context process pool, or a thread pool when processes is False or
+    this process may not start children. initializer runs once per worker
+    either way.
+    """
+    if processes and not can_start_processes():
+        logger.info(f"{name} pool can't start processes in a daemonic worker, using threads")
+        processes = False
+    if processes:
+        executor = ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=initializer
+        )
+    else:
+        executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name, initializer=initializer)
+    logger.info(f"Started {name} {'process' if processes else 'thread'} pool with {max_workers} workers")
+    return executor
+
+class SharedPool:
+    """A pool shared by every caller in this process, started on first use and replaced if a worker process died"""
+
+    def __init__(self, name: str, max_workers: int, processes: bool = True,
+                 initializer: Optional[Callable] = None):
+        self.name = name
+        self.max_workers = max_workers
+        self.processes = processes
+        self.initializer = initializer
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def get(self) -> Executor:
+        with self._lock:
+            # A worker killed mid-task (e.g. out of memory) breaks the whole pool
+            if self._executor is None or getattr(self._executor, '_broken', False):
+                self._executor = create_pool(self.name, self.max_workers, self.processes, self.initializer)
+            return self._executor
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
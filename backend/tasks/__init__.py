@@ -11,10 +11,12 @@ from .thumbnails import (
     regenerate_all_thumbnails,
     generate_photo_thumbnails
 )
+from .scan import rescan_library
 
 __all__ = [
     'celery_app',
     'process_thumbnail_batch',
     'regenerate_all_thumbnails',
-    'generate_photo_thumbnails'
+    'generate_photo_thumbnails',
+    'rescan_library'
 ]
\ No newline at end of file
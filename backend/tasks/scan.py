@@ -0,0 +1,39 @@
+import logging
+from worker import celery_app
+from models import get_db, Job, JobType, JobStatus
+
+logger = logging.getLogger(__name__)
+
+@celery_app.task(name='tasks.rescan_library', priority=0)  # Lowest priority
+def rescan_library(scan_type: str = "incremental"):
+    """Periodic library rescan - unchanged directories are pruned by the scanner"""
+    from services.scanner import DirectoryScanner
+    db = next(get_db())
+    
+    try:
+        # Don't stack scans on top of one that is still running
+        active_scan = db.query(Job).filter(
+            Job.type == JobType.DIRECTORY_SCAN,
+            Job.status.in_([JobStatus.PENDING, JobStatus.RUNNING])
+        ).first()
+        
+        if active_scan:
+            logger.info(f"Directory scan job {active_scan.id} is still active, skipping rescan")
+            return {
+                'error': 'Directory scan already running',
+                'existing_job_id': active_scan.id
+            }
+        
+        scanner = DirectoryScanner(db)
+        job_id = scanner.create_scan_job(scan_type)
+        scanner.scan_directory(job_id, scan_type)
+        
+        job = db.query(Job).filter(Job.id == job_id).first()
+        return {
+            'job_id': job_id,
+            'status': job.status.value if job else None,
+            'result': job.result if job else None
+        }
+        
+    finally:
+        db.close()
\ No newline at end of file
@@ -1,152 +1,79 @@
 import os
 import logging
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import List, Dict, Tuple
+from concurrent.futures import wait, FIRST_COMPLETED
+from typing import Callable, Iterator, List, Dict, Tuple
 from datetime import datetime
 from celery import Task
 from worker import celery_app
+from sqlalchemy import update, case, func
 from sqlalchemy.orm import Session
 from models import get_db, Photo, Job, JobType, JobStatus, Thumbnail
-from PIL import Image
-import pillow_heif
-import numpy as np
-
-# Register HEIF opener
-pillow_heif.register_heif_opener()
-
-# Try to import rawpy for RAW file support
-try:
-    import rawpy
-    RAWPY_AVAILABLE = True
-except ImportError:
-    RAWPY_AVAILABLE = False
-    logger = logging.getLogger(__name__)
-    logger.warning("rawpy not available - RAW file support disabled")
+from services.thumbnail_render import ThumbnailWorker, thumbnail_executor, MAX_THUMBNAIL_WORKERS
+from services.thumbnail_service import thumbnail_rows, upsert_thumbnails
+from services.load_monitor import throttle
 
 logger = logging.getLogger(__name__)
 
 # Configuration - Reduced concurrency to prioritize user requests
-MAX_THUMBNAIL_WORKERS = int(os.getenv('MAX_THUMBNAIL_WORKERS', '4'))  # Reduced from 8
 THUMBNAIL_BATCH_SIZE = int(os.getenv('THUMBNAIL_BATCH_SIZE', '40'))  # Reduced from 80
 DB_COMMIT_BATCH_SIZE = int(os.getenv('DB_COMMIT_BATCH_SIZE', '10'))
 PROGRESS_UPDATE_INTERVAL = int(os.getenv('PROGRESS_UPDATE_INTERVAL', '5'))
 
-class ThumbnailWorker:
-    """Worker class for generating thumbnails in parallel"""
-    
-    def __init__(self, thumbnails_path: str = None):
-        self.thumbnails_path = thumbnails_path or os.getenv("THUMBNAILS_PATH", "/app/thumbnails")
-        self.sizes = {
-            '150': (150, 150),
-            '400': (400, 400),
-            '1200': (1200, 1200)
-        }
-        os.makedirs(self.thumbnails_path, exist_ok=True)
-    
-    def process_photo(self, photo_data: Tuple[int, str], user_rotation: int = 0) -> Dict:
-        """Process a single photo and generate all thumbnail sizes"""
-        if len(photo_data) == 3:
-            photo_id, filepath, user_rotation = photo_data
-        else:
-            photo_id, filepath = photo_data
-            user_rotation = 0
-            
-        result = {
-            'photo_id': photo_id,
-            'success': False,
-            'thumbnails': {},
-            'error': None
-        }
-        
-        try:
-            # Check if it's a RAW file that needs special handling
-            file_ext = os.path.splitext(filepath)[1].lower()
-            
-            if file_ext in ['.cr3', '.cr2', '.nef', '.arw', '.dng', '.raf', '.orf'] and RAWPY_AVAILABLE:
-                # Handle RAW files with rawpy - use embedded thumbnail for performance
-                try:
-                    import io
-                    with rawpy.imread(filepath) as raw:
-                        # Try to extract the embedded JPEG thumbnail first (much faster)
-                        try:
-                            thumb = raw.extract_thumb()
-                            if thumb.format == rawpy.ThumbFormat.JPEG:
-                                # Use the embedded JPEG thumbnail
-                                img = Image.open(io.BytesIO(thumb.data))
-                                logger.debug(f"Using embedded JPEG thumbnail for {filepath}")
-                            else:
-                                # No JPEG thumbnail, process the RAW data
-                                rgb = raw.postprocess(use_camera_wb=True, half_size=True)
-                                img = Image.fromarray(rgb)
-                                logger.debug(f"Processing RAW data for {filepath}")
-                        except Exception as e:
-                            # Fallback to full RAW processing
-                            logger.debug(f"No embedded thumbnail, processing RAW: {e}")
-                            rgb = raw.postprocess(use_camera_wb=True, half_size=True)
-                            img = Image.fromarray(rgb)
-                except Exception as e:
-                    logger.warning(f"Failed to process RAW file {filepath} with rawpy: {e}")
-                    # Try to fall back to PIL (though it likely won't work)
-                    img = Image.open(filepath)
-            else:
-                # Open regular image files
-                img = Image.open(filepath)
-            
-            # Open and process the image
-            from PIL import ImageOps
-            with img:
-                # Apply EXIF orientation if present
-                try:
-                    img = ImageOps.exif_transpose(img) or img
-                except Exception:
-                    # If EXIF transpose fails, continue with original
-                    pass
-                
-                # Apply user rotation if present
-                if user_rotation and user_rotation != 0:
-                    # Rotate the image (negative because PIL rotates counter-clockwise)
-                    img = img.rotate(-user_rotation, expand=True)
-                # Convert RGBA to RGB if necessary
-                if img.mode in ('RGBA', 'LA'):
-                    background = Image.new('RGB', img.size, (255, 255, 255))
-                    background.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
-                    img = background
-                elif img.mode not in ('RGB', 'L'):
-                    img = img.convert('RGB')
-                
-                # Generate each thumbnail size
-                for size_name, dimensions in self.sizes.items():
-                    thumbnail = img.copy()
-                    # Use high-quality resampling
-                    thumbnail.thumbnail(dimensions, Image.Resampling.LANCZOS)
-                    
-                    # Get rotation version from database
-                    from models import get_db, Photo
-                    db = next(get_db())
-                    photo = db.query(Photo).filter(Photo.id == photo_id).first()
-                    rotation_version = photo.rotation_version if photo else 0
-                    db.close()
-                    
-                    # Save thumbnail with versioned naming
-                    filename = f"{photo_id}_{size_name}_v{rotation_version}.jpg"
-                    filepath = os.path.join(self.thumbnails_path, filename)
-                    # Increase quality to 95 for better appearance
-                    thumbnail.save(filepath, 'JPEG', quality=95, optimize=True, progressive=True)
-                    
-                    result['thumbnails'][size_name] = {
-                        'filepath': filepath,
-                        'file_size': os.path.getsize(filepath),
-                        'width': thumbnail.width,
-                        'height': thumbnail.height
-                    }
-                
-                result['success'] = True
-                
-        except Exception as e:
-            result['error'] = str(e)
-            logger.error(f"Error processing photo {photo_id}: {e}")
-        
-        return result
+def add_job_progress(db: Session, job_id: int, count: int) -> Tuple[int, int]:
+    """
+    Add count to a job's processed_items in one statement and return
+    (processed_items, total_items). Batches for the same job run in several
+    workers at once; reading the value and writing it back would lose some of
+    their increments. The caller commits.
+    """
+    processed = func.coalesce(Job.processed_items, 0) + count
+    row = db.execute(
+        update(Job).where(Job.id == job_id).values(
+            processed_items=processed,
+            progress=case((Job.total_items > 0, processed * 100.0 / Job.total_items), else_=Job.progress)
+        ).returning(Job.processed_items, Job.total_items).execution_options(synchronize_session=False)
+    ).first()
+    return (row.processed_items, row.total_items) if row else (0, 0)
+
+def complete_job_if_done(db: Session, job_id: int) -> bool:
+    """
+    Mark an active job completed once processed_items has reached total_items,
+    deciding on the row as it is in the database. The caller commits.
+    """
+    result = db.execute(
+        update(Job).where(
+            Job.id == job_id,
+            Job.status.in_([JobStatus.PENDING, JobStatus.RUNNING]),
+            func.coalesce(Job.processed_items, 0) >= func.coalesce(Job.total_items, 0)
+        ).values(
+            status=JobStatus.COMPLETED,
+            completed_at=datetime.utcnow(),
+            progress=100
+        ).execution_options(synchronize_session=False)
+    )
+    return result.rowcount > 0
+
+def _paced_results(executor, render: Callable, photos: List) -> Iterator[Tuple]:
+    """
+    Yield (future, photo_id) as renders complete. Photos are submitted one at a
+    time, each after throttle.pause(), with only one more in flight than there
+    are workers, so a rise in interactive load slows the batch within a photo
+    or two instead of after everything already queued.
+    """
+    pending = iter(photos)
+    in_flight = {}
+    while True:
+        while len(in_flight) <= MAX_THUMBNAIL_WORKERS:
+            photo = next(pending, None)
+            if photo is None:
+                break
+            throttle.pause()
+            in_flight[executor.submit(render, tuple(photo))] = photo[0]
+        if not in_flight:
+            return
+        done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+        for future in done:
+            yield future, in_flight.pop(future)
 
 @celery_app.task(bind=True, name='tasks.process_thumbnail_batch', priority=1)  # Low priority
 def process_thumbnail_batch(self: Task, photo_ids: List[int], job_id: int = None, 
@@ -157,8 +84,12 @@ def process_thumbnail_batch(self: Task, photo_ids: List[int], job_id: int = None
     Args:
         photo_ids: List of photo IDs to process
         job_id: Optional job ID for progress tracking
-        batch_index: Index of this batch for progress calculation
-        total_photos: Total number of photos across all batches
+        batch_index: Index of this batch, for logging
+        total_photos: Total number of photos across all batches, if the job
+            doesn't have a total yet
+
+    Progress is only ever added to the job, never set: batches from a scan and
+    from regenerate-all may share it and run concurrently.
     """
     db = next(get_db())
     
@@ -177,8 +108,11 @@ def process_thumbnail_batch(self: Task, photo_ids: List[int], job_id: int = None
                     job.total_items = total_photos
                 db.commit()
         
-        # Fetch photo data including user_rotation
-        photos = db.query(Photo.id, Photo.filepath, Photo.user_rotation).filter(
+        # Fetch everything the worker threads need in one query: user_rotation,
+        # file_hash to find ingest previews and rotation_version for file names
+        photos = db.query(
+            Photo.id, Photo.filepath, Photo.user_rotation, Photo.file_hash, Photo.rotation_version
+        ).filter(
             Photo.id.in_(photo_ids)
         ).all()
         
@@ -186,81 +120,47 @@ def process_thumbnail_batch(self: Task, photo_ids: List[int], job_id: int = None
             logger.warning(f"No photos found for IDs: {photo_ids}")
             return {'processed': 0, 'failed': 0}
         
-        # Initialize worker and results
-        worker = ThumbnailWorker()
+        # Initialize results
         processed = 0
         failed = 0
-        results_buffer = []
+        reported = 0  # Items already added to job.processed_items by progress updates
+        results_buffer = []  # Thumbnail rows not yet written
+        buffered_photos = 0
         
-        # Add delay to reduce CPU load and prioritize user requests
-        import time
-        time.sleep(0.5)  # 500ms delay between batches to prioritize UI
-        
-        # Process photos in parallel
-        with ThreadPoolExecutor(max_workers=MAX_THUMBNAIL_WORKERS) as executor:
-            # Submit all tasks - pass all three values (id, filepath, user_rotation)
-            future_to_photo = {
-                executor.submit(worker.process_photo, photo): photo[0]
-                for photo in photos
-            }
-            
-            # Process completed tasks
-            for future in as_completed(future_to_photo):
-                photo_id = future_to_photo[future]
+        # Process photos in parallel (threads or the shared process pool, see THUMBNAIL_EXECUTOR),
+        # paced by API activity, host load and queue depth to prioritize user requests
+        render, executor_context = thumbnail_executor()
+        with executor_context as executor:
+            # Process completed tasks; photos are submitted as prefetched rows in plain tuples
+            for future, photo_id in _paced_results(executor, render, photos):
                 
                 try:
                     result = future.result()
                     
                     if result['success']:
-                        # Save thumbnail records
-                        for size_name, thumb_data in result['thumbnails'].items():
-                            # Check if thumbnail exists
-                            existing = db.query(Thumbnail).filter(
-                                Thumbnail.photo_id == photo_id,
-                                Thumbnail.size == size_name,
-                                Thumbnail.format == 'jpeg'
-                            ).first()
-                            
-                            if existing:
-                                # Update existing
-                                existing.filepath = thumb_data['filepath']
-                                existing.file_size = thumb_data['file_size']
-                                existing.width = thumb_data['width']
-                                existing.height = thumb_data['height']
-                            else:
-                                # Create new
-                                thumb_record = Thumbnail(
-                                    photo_id=photo_id,
-                                    size=size_name,
-                                    format='jpeg',
-                                    filepath=thumb_data['filepath'],
-                                    file_size=thumb_data['file_size'],
-                                    width=thumb_data['width'],
-                                    height=thumb_data['height']
-                                )
-                                db.add(thumb_record)
-                        
+                        # Buffer thumbnail records, one per size and format
+                        results_buffer.extend(thumbnail_rows(photo_id, result['thumbnails']))
+                        buffered_photos += 1
                         processed += 1
-                        results_buffer.append(photo_id)
                         
                     else:
                         failed += 1
                         logger.error(f"Failed to process photo {photo_id}: {result['error']}")
                     
-                    # Batch commit to database
-                    if len(results_buffer) >= DB_COMMIT_BATCH_SIZE:
+                    # Batch upsert to database: one statement per DB_COMMIT_BATCH_SIZE photos
+                    if buffered_photos >= DB_COMMIT_BATCH_SIZE:
+                        upsert_thumbnails(db, results_buffer)
                         db.commit()
                         results_buffer.clear()
+                        buffered_photos = 0
                     
                     # Update job progress (accumulate across all batches)
                     if job and (processed + failed) % PROGRESS_UPDATE_INTERVAL == 0:
+                        # Increment processed items (and progress) in the database
+                        add_job_progress(db, job_id, PROGRESS_UPDATE_INTERVAL)
+                        reported += PROGRESS_UPDATE_INTERVAL
                         # Refresh job to get current state
                         job = db.query(Job).filter(Job.id == job_id).first()
-                        # Increment processed items
-                        job.processed_items = (job.processed_items or 0) + PROGRESS_UPDATE_INTERVAL
-                        # Calculate progress based on total photos
-                        if job.total_items:
-                            job.progress = (job.processed_items / job.total_items) * 100
                         if job.payload is None:
                             job.payload = {}
                         job.payload['workers'] = MAX_THUMBNAIL_WORKERS
@@ -275,41 +175,20 @@ def process_thumbnail_batch(self: Task, photo_ids: List[int], job_id: int = None
         
         # Final commit
         if results_buffer:
+            upsert_thumbnails(db, results_buffer)
             db.commit()
         
         # Update job completion
         if job:
-            # Refresh job to get current state
-            job = db.query(Job).filter(Job.id == job_id).first()
-            # The batch is complete, add all processed items from this batch
-            # (not just the remainder from progress updates)
-            batch_total = processed + failed
-            if batch_index is not None and total_photos is not None:
-                # We know exactly which batch this is, calculate expected items processed
-                expected_processed = min((batch_index + 1) * THUMBNAIL_BATCH_SIZE, total_photos)
-                job.processed_items = expected_processed
-            else:
-                # Fallback: increment by batch size
-                job.processed_items = (job.processed_items or 0) + batch_total
-            
-            # Check if all photos are processed
-            if job.total_items and job.processed_items and job.processed_items >= job.total_items:
-                job.status = JobStatus.COMPLETED
-                job.completed_at = datetime.utcnow()
-                job.progress = 100
-            elif job.total_items and job.processed_items:
-                # Still more batches to process
-                job.progress = (job.processed_items / job.total_items) * 100
-            else:
-                # No total items set, can't calculate progress accurately
-                job.progress = 0
-            
-            if job.payload is None:
-                job.payload = {}
-            job.payload['workers'] = MAX_THUMBNAIL_WORKERS
+            # The batch is complete: add what progress updates haven't yet, then
+            # complete the job if this was the last batch outstanding
+            processed_items, total_items = add_job_progress(db, job_id, processed + failed - reported)
+            if total_items and processed_items >= total_items:
+                complete_job_if_done(db, job_id)
             db.commit()
         
-        logger.info(f"Thumbnail batch completed: {processed} processed, {failed} failed")
+        logger.info(f"Thumbnail batch {batch_index} completed: {processed} processed, {failed} failed "
+                    f"(throttle delay {throttle.delay:.2f}s)")
         
         return {
             'processed': processed,
@@ -0,0 +1,15 @@
+#!/usr/bin/env python3
+"""Continuous ingestion: watch PHOTOS_PATH and import new photos as they appear."""
+import signal
+import logging
+from services.file_watcher import LibraryWatcher
+
+logging.basicConfig(level=logging.INFO)
+
+if __name__ == "__main__":
+    watcher = LibraryWatcher()
+    signal.signal(signal.SIGTERM, lambda *_: watcher.stop())
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        pass
\ No newline at end of file
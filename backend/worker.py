@@ -20,6 +20,17 @@ celery_app.conf.update(
     task_soft_time_limit=3300,  # 55 minutes
 )
 
+# Periodic incremental rescan (run `celery -A worker beat` alongside the worker)
+RESCAN_INTERVAL_SECONDS = int(os.getenv('RESCAN_INTERVAL_SECONDS', '900'))
+if RESCAN_INTERVAL_SECONDS > 0:
+    celery_app.conf.beat_schedule = {
+        'rescan-library': {
+            'task': 'tasks.rescan_library',
+            'schedule': RESCAN_INTERVAL_SECONDS,
+            'args': ('incremental',),
+        },
+    }
+
 # Import tasks after celery_app is created
 import sys
 import os
@@ -28,6 +39,7 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 # Import tasks to register them with Celery
 try:
     from tasks.thumbnails import process_thumbnail_batch, generate_photo_thumbnails, regenerate_all_thumbnails
+    from tasks.scan import rescan_library
     print("Tasks imported successfully")
 except ImportError as e:
     print(f"Warning: Could not import tasks: {e}")
\ No newline at end of file
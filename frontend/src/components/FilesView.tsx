@@ -3,6 +3,7 @@ import { useQuery } from '@tanstack/react-query'
 import Image from 'next/image'
 import { FolderIcon, FolderOpenIcon, ChevronRightIcon, LoadingIcon } from './ViewModeSelector'
 import ZoomControl from './ZoomControl'
+import { useThumbnailBatch } from '@/hooks/useThumbnailBatch'
 
 interface Photo {
   id: number
@@ -81,7 +82,14 @@ const FilesView: React.FC<FilesViewProps> = ({ onPhotoClick }) => {
   const getThumbnailUrl = (photo: Photo) => {
     const baseUrl = `http://localhost:8000/api/v1/thumbnails/${photo.id}/400`
     const version = photo.rotation_version || 0
-    return version ? `${baseUrl}?v=${version}` : baseUrl
+    // Always versioned: the API serves ?v= URLs straight from disk as immutable
+    return `${baseUrl}?v=${version}`
+  }
+  
+  // Batched page thumbnail when there is one; null while its batch loads
+  const getTileSrc = (photo: Photo) => {
+    const batched = batchedThumbnail(photo.id, photo.rotation_version || 0)
+    return batched === undefined ? getThumbnailUrl(photo) : batched
   }
   
   const renderTreeNode = (node: FileTreeNode, depth: number = 0) => {
@@ -157,6 +165,8 @@ const FilesView: React.FC<FilesViewProps> = ({ onPhotoClick }) => {
   }, [isDragging])
   
   const photos = folderPhotos?.photos || []
+  // Folders load recursively, so batch only the first screenful
+  const batchedThumbnail = useThumbnailBatch(photos, '400', 100)
   const breadcrumbs = selectedFolder?.split('/').filter(Boolean) || []
   
   return (
@@ -258,13 +268,15 @@ const FilesView: React.FC<FilesViewProps> = ({ onPhotoClick }) => {
                   className="relative aspect-square bg-gray-800 rounded overflow-hidden cursor-pointer hover:ring-2 hover:ring-blue-500 transition-all"
                   onClick={() => onPhotoClick?.(photo, photos, idx)}
                 >
-                  <Image
-                    src={getThumbnailUrl(photo)}
-                    alt={photo.filename}
-                    fill
-                    sizes="(max-width: 640px) 50vw, (max-width: 768px) 33vw, (max-width: 1024px) 25vw, 16.66vw"
-                    className="object-cover"
-                  />
+                  {getTileSrc(photo) && (
+                    <Image
+                      src={getTileSrc(photo)!}
+                      alt={photo.filename}
+                      fill
+                      sizes="(max-width: 640px) 50vw, (max-width: 768px) 33vw, (max-width: 1024px) 25vw, 16.66vw"
+                      className="object-cover"
+                    />
+                  )}
                   <div className="absolute bottom-0 left-0 right-0 bg-gradient-to-t from-black/60 to-transparent p-2">
                     <p className="text-xs text-white truncate">{photo.filename}</p>
                   </div>
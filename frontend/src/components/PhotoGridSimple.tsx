@@ -3,6 +3,7 @@ import { Photo } from '@/lib/api'
 import { Loader2 } from 'lucide-react'
 import ImageViewer from './ImageViewerNew'
 import ZoomControl from './ZoomControl'
+import { useThumbnailBatch } from '@/hooks/useThumbnailBatch'
 
 interface PhotoGridProps {
   photos: Photo[]
@@ -25,6 +26,7 @@ export default function PhotoGridSimple({ photos, onLoadMore, hasMore, isLoading
   const [zoomLevel, setZoomLevel] = useState(5) // Default zoom level
   const [visiblePhotos, setVisiblePhotos] = useState<Set<number>>(new Set())
   const animationDebounceRef = useRef<NodeJS.Timeout>()
+  const batchedThumbnail = useThumbnailBatch(photos)
   
   // Update local versions when prop changes
   useEffect(() => {
@@ -70,7 +72,8 @@ export default function PhotoGridSimple({ photos, onLoadMore, hasMore, isLoading
     const cacheBust = sessionStorage.getItem('cacheBust')
     
     const params = new URLSearchParams()
-    if (version) params.append('v', version.toString())
+    // Always versioned: the API serves ?v= URLs straight from disk as immutable
+    params.append('v', version.toString())
     if (rotationTimestamp) params.append('_t', rotationTimestamp.toString())
     if (cacheBust) params.append('cb', cacheBust)
     
@@ -78,6 +81,13 @@ export default function PhotoGridSimple({ photos, onLoadMore, hasMore, isLoading
     return queryString ? `${baseUrl}?${queryString}` : baseUrl
   }
   
+  // Batched page thumbnail when there is one; null while its batch loads
+  const getTileSrc = (photo: Photo) => {
+    const version = localThumbnailVersions.get(photo.id) || photo.rotation_version || 0
+    const batched = recentlyRotated.has(photo.id) ? undefined : batchedThumbnail(photo.id, version)
+    return batched === undefined ? getThumbnailUrl(photo) : batched
+  }
+  
   const handlePhotoClick = (photoIndex: number) => {
     console.log('Photo clicked:', { photoIndex, hasOnPhotoClick: !!onPhotoClick })
     if (onPhotoClick) {
@@ -131,9 +141,10 @@ export default function PhotoGridSimple({ photos, onLoadMore, hasMore, isLoading
       
       // Preload images
       for (let i = startIndex; i < endIndex; i++) {
-        if (photos[i]) {
+        const src = photos[i] && getTileSrc(photos[i])
+        if (src) {
           const img = new Image()
-          img.src = getThumbnailUrl(photos[i])
+          img.src = src
         }
       }
     }
@@ -156,7 +167,7 @@ export default function PhotoGridSimple({ photos, onLoadMore, hasMore, isLoading
       window.removeEventListener('scroll', handleScroll)
       clearTimeout(timeoutId)
     }
-  }, [photos, columns])
+  }, [photos, columns, batchedThumbnail])
   
   // Calculate columns based on zoom level
   const getGridColumns = () => {
@@ -232,7 +243,7 @@ export default function PhotoGridSimple({ photos, onLoadMore, hasMore, isLoading
                 )}
                 
                 <img
-                  src={getThumbnailUrl(photo)}
+                  src={getTileSrc(photo) || undefined}
                   alt={photo.filename}
                   className="w-full h-auto block"
                   loading="lazy"
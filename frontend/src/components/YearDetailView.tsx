@@ -4,6 +4,7 @@ import Image from 'next/image'
 import ZoomControl from './ZoomControl'
 import ImageViewer from './ImageViewer'
 import SortSelector from './SortSelector'
+import { useThumbnailBatch } from '@/hooks/useThumbnailBatch'
 
 interface Photo {
   id: number
@@ -58,6 +59,8 @@ const YearDetailView: React.FC<YearDetailViewProps> = ({ year, onPhotoClick, onB
     const diff = aDate.getTime() - bDate.getTime()
     return sortOrder === 'desc' ? -diff : diff
   })
+  // Only the first screenful is batched; later tiles load lazily on their own
+  const batchedThumbnail = useThumbnailBatch(photos, '400', 100)
   
   // Group photos by month
   const photosByMonth = photos.reduce((acc, photo) => {
@@ -74,7 +77,14 @@ const YearDetailView: React.FC<YearDetailViewProps> = ({ year, onPhotoClick, onB
   const getThumbnailUrl = (photo: Photo) => {
     const baseUrl = `http://localhost:8000/api/v1/thumbnails/${photo.id}/400`
     const version = photo.rotation_version || 0
-    return version ? `${baseUrl}?v=${version}` : baseUrl
+    // Always versioned: the API serves ?v= URLs straight from disk as immutable
+    return `${baseUrl}?v=${version}`
+  }
+  
+  // Batched page thumbnail when there is one; null while its batch loads
+  const getTileSrc = (photo: Photo) => {
+    const batched = batchedThumbnail(photo.id, photo.rotation_version || 0)
+    return batched === undefined ? getThumbnailUrl(photo) : batched
   }
   
   const getGridCols = () => {
@@ -166,13 +176,15 @@ const YearDetailView: React.FC<YearDetailViewProps> = ({ year, onPhotoClick, onB
                         className="relative aspect-square bg-gray-800 rounded-lg overflow-hidden cursor-pointer hover:ring-2 hover:ring-blue-500 transition-all"
                         onClick={() => handlePhotoClick(photo)}
                       >
-                        <Image
-                          src={getThumbnailUrl(photo)}
-                          alt={photo.filename}
-                          fill
-                          sizes="(max-width: 768px) 50vw, (max-width: 1024px) 33vw, 20vw"
-                          className="object-cover"
-                        />
+                        {getTileSrc(photo) && (
+                          <Image
+                            src={getTileSrc(photo)!}
+                            alt={photo.filename}
+                            fill
+                            sizes="(max-width: 768px) 50vw, (max-width: 1024px) 33vw, 20vw"
+                            className="object-cover"
+                          />
+                        )}
                         {photo.is_favorite && (
                           <div className="absolute top-2 right-2 text-red-500 bg-black bg-opacity-50 rounded-full p-1">
                             <svg className="w-4 h-4" fill="currentColor" viewBox="0 0 20 20">
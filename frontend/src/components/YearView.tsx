@@ -3,6 +3,7 @@ import { useQuery } from '@tanstack/react-query'
 import Image from 'next/image'
 import ZoomControl from './ZoomControl'
 import YearDetailView from './YearDetailView'
+import { useThumbnailBatch } from '@/hooks/useThumbnailBatch'
 
 interface Photo {
   id: number
@@ -63,11 +64,21 @@ const YearView: React.FC<YearViewProps> = ({ onPhotoClick }) => {
   const getThumbnailUrl = (photo: Photo) => {
     const baseUrl = `http://localhost:8000/api/v1/thumbnails/${photo.id}/400`
     const version = photo.rotation_version || 0
-    return version ? `${baseUrl}?v=${version}` : baseUrl
+    // Always versioned: the API serves ?v= URLs straight from disk as immutable
+    return `${baseUrl}?v=${version}`
+  }
+  
+  // Batched page thumbnail when there is one; null while its batch loads
+  const getTileSrc = (photo: Photo) => {
+    const batched = batchedThumbnail(photo.id, photo.rotation_version || 0)
+    return batched === undefined ? getThumbnailUrl(photo) : batched
   }
   
   // Extract years from the data
   const years: YearData[] = yearsData?.years || []
+  // Every year's cover in one request
+  const previewPhotos = years.flatMap(yearData => yearData.preview_photo ? [yearData.preview_photo] : [])
+  const batchedThumbnail = useThumbnailBatch(previewPhotos)
   
   // Calculate grid columns based on zoom level
   const getGridCols = () => {
@@ -122,13 +133,15 @@ const YearView: React.FC<YearViewProps> = ({ onPhotoClick }) => {
               {/* Year Card */}
               <div className="relative aspect-square bg-gray-800 rounded-lg overflow-hidden">
                 {yearData.preview_photo ? (
-                  <Image
-                    src={getThumbnailUrl(yearData.preview_photo)}
-                    alt={`${yearData.year} preview`}
-                    fill
-                    sizes="(max-width: 640px) 50vw, (max-width: 768px) 33vw, (max-width: 1024px) 25vw, 20vw"
-                    className="object-cover"
-                  />
+                  getTileSrc(yearData.preview_photo) && (
+                    <Image
+                      src={getTileSrc(yearData.preview_photo)!}
+                      alt={`${yearData.year} preview`}
+                      fill
+                      sizes="(max-width: 640px) 50vw, (max-width: 768px) 33vw, (max-width: 1024px) 25vw, 20vw"
+                      className="object-cover"
+                    />
+                  )
                 ) : (
                   <div className="w-full h-full bg-gradient-to-br from-gray-700 to-gray-800" />
                 )}
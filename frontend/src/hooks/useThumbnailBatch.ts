@@ -0,0 +1,123 @@
+import { useState, useEffect, useRef, useCallback } from 'react'
+import { Photo, fetchThumbnailBatch } from '@/lib/api'
+
+const BATCH_PAGE = 100  // Photos per batch request, one grid page
+
+type Size = '150' | '400' | '1200'
+
+interface BatchedThumbnail {
+  version: number
+  url: string | null  // null while its batch is in flight
+}
+
+// Thumbnails for a grid through the batch endpoint, a page per request
+// instead of a request per tile. Each photo is requested once per rotation
+// version, and only the first maxPhotos are batched; the rest, and anything
+// the batch doesn't have, load from their per-tile URLs. Object URLs are
+// revoked when their photo leaves the list and on unmount.
+//
+// Returns a lookup: the object URL for a photo at a version, null while its
+// batch is loading (render nothing yet), or undefined to use the tile URL.
+export function useThumbnailBatch(photos: Pick<Photo, 'id' | 'rotation_version'>[], size: Size = '400', maxPhotos: number = Infinity) {
+  const [batched, setBatched] = useState<Map<number, BatchedThumbnail>>(new Map())
+  const requested = useRef<Map<number, number>>(new Map())  // Photo id -> version requested
+  const objectUrls = useRef<Set<string>>(new Set())
+  const mounted = useRef(true)
+
+  useEffect(() => {
+    mounted.current = true
+    return () => {
+      mounted.current = false
+      objectUrls.current.forEach(url => URL.revokeObjectURL(url))
+      objectUrls.current.clear()
+    }
+  }, [])
+
+  useEffect(() => {
+    const wanted = photos.slice(0, maxPhotos)
+    const wantedIds = new Set(wanted.map(photo => photo.id))
+    // Release thumbnails that left the list (e.g. another folder was opened)
+    const dropped = Array.from(requested.current.keys()).filter(photoId => !wantedIds.has(photoId))
+    if (dropped.length > 0) {
+      dropped.forEach(photoId => requested.current.delete(photoId))
+      setBatched(prev => {
+        const next = new Map(prev)
+        dropped.forEach(photoId => {
+          const url = next.get(photoId)?.url
+          if (url) {
+            URL.revokeObjectURL(url)
+            objectUrls.current.delete(url)
+          }
+          next.delete(photoId)
+        })
+        return next
+      })
+    }
+
+    const pending = wanted.filter(
+      photo => requested.current.get(photo.id) !== (photo.rotation_version || 0)
+    )
+    if (pending.length === 0) return
+
+    pending.forEach(photo => requested.current.set(photo.id, photo.rotation_version || 0))
+    setBatched(prev => {
+      const next = new Map(prev)
+      pending.forEach(photo => next.set(photo.id, { version: photo.rotation_version || 0, url: null }))
+      return next
+    })
+
+    for (let i = 0; i < pending.length; i += BATCH_PAGE) {
+      const page = pending.slice(i, i + BATCH_PAGE)
+      fetchThumbnailBatch(page, size)
+        .then(({ urls }) => {
+          if (!mounted.current) {
+            urls.forEach(url => URL.revokeObjectURL(url))
+            return
+          }
+          urls.forEach(url => objectUrls.current.add(url))
+          setBatched(prev => {
+            const next = new Map(prev)
+            page.forEach(photo => {
+              const version = photo.rotation_version || 0
+              const previous = next.get(photo.id)
+              const url = urls.get(photo.id)
+              // A newer version was requested meanwhile; this result is stale
+              if (requested.current.get(photo.id) !== version) {
+                if (url) {
+                  URL.revokeObjectURL(url)
+                  objectUrls.current.delete(url)
+                }
+                return
+              }
+              if (previous?.url && previous.url !== url) {
+                URL.revokeObjectURL(previous.url)
+                objectUrls.current.delete(previous.url)
+              }
+              if (url) {
+                next.set(photo.id, { version, url })
+              } else {
+                next.delete(photo.id)  // Not generated yet: the tile URL will render it
+              }
+            })
+            return next
+          })
+        })
+        .catch(error => {
+          console.error('Thumbnail batch failed, loading tiles individually:', error)
+          if (!mounted.current) return
+          setBatched(prev => {
+            const next = new Map(prev)
+            page.forEach(photo => {
+              if (next.get(photo.id)?.url === null) next.delete(photo.id)
+            })
+            return next
+          })
+        })
+    }
+  }, [photos, size, maxPhotos])
+
+  return useCallback((photoId: number, version: number): string | null | undefined => {
+    const entry = batched.get(photoId)
+    return entry && entry.version === version ? entry.url : undefined
+  }, [batched])
+}
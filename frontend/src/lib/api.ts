@@ -79,4 +79,36 @@ export async function fetchRecentPhotos(since?: string, limit: number = 50): Pro
 export async function fetchSystemStats() {
   const response = await axios.get(`${API_URL}/api/v1/system/stats`)
   return response.data
+}
+export interface ThumbnailBatch {
+  urls: Map<number, string>  // photo id -> object URL; revoke with URL.revokeObjectURL when done
+  missing: number[]          // Not generated yet: use the per-tile thumbnail URL
+}
+
+// Fetch a page of thumbnails in one request. The response is a 4-byte
+// big-endian index length, a JSON index of {id, type, offset, length} and
+// then the images back to back.
+export async function fetchThumbnailBatch(photos: Pick<Photo, 'id' | 'rotation_version'>[], size: '150' | '400' | '1200' = '400'): Promise<ThumbnailBatch> {
+  const params = new URLSearchParams({
+    ids: photos.map(photo => photo.id).join(','),
+    v: photos.map(photo => photo.rotation_version || 0).join(',')
+  })
+  // Same global cache bust as the per-tile URLs, after thumbnails are regenerated
+  const cacheBust = typeof window !== 'undefined' ? sessionStorage.getItem('cacheBust') : null
+  if (cacheBust) params.append('cb', cacheBust)
+  const response = await fetch(`${API_URL}/api/v1/thumbnails/batch/${size}?${params}`)
+  if (!response.ok) {
+    throw new Error(`Thumbnail batch failed: ${response.status}`)
+  }
+  const buffer = await response.arrayBuffer()
+  const indexLength = new DataView(buffer).getUint32(0)
+  const index = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, 4, indexLength)))
+  const dataStart = 4 + indexLength
+
+  const urls = new Map<number, string>()
+  for (const item of index.items) {
+    const blob = new Blob([new Uint8Array(buffer, dataStart + item.offset, item.length)], { type: item.type })
+    urls.set(item.id, URL.createObjectURL(blob))
+  }
+  return { urls, missing: index.missing }
 }
\ No newline at end of file